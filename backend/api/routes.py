@@ -1,18 +1,121 @@
-from flask import request, jsonify
+from flask import Response, current_app, request, jsonify, stream_with_context
 from . import api_bp
 import json
+import logging
 import os
-import subprocess
 import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from security_analyzer import SecurityAnalyzer
+from budget import TIME_BUDGET, Budget, SourceTooLarge
+from security_analyzer import SecurityAnalyzer, UnknownRule, needs_parse, select_rules
+from node_pool import NodeHelperError, NodeHelperTimeout, PoolBusy, get_parser, node_helper_entry
+from result_cache import get_cache
+from pipeline import analysis_json, cache_keys, function_json, function_summary, get_cfg_raw, try_get_cfg
+from layout import CFG_LAYOUT
+from dependencies import RemappingError, Resolver, parse_remappings, resolve_imports
+from batch import BatchInputError, analyze_in_pool, iter_batch, sources_from_archive, sources_from_json
+from jobs import LANES, QueueFull, get_job_queue
+from rule_engine import rule_catalog
+from vulnerability import group_by_node
+from metrics import profiling
+from sessions import SessionError, VersionConflict, get_session_store
+from wire import accepts_msgpack, choose_encoding, compact_analysis, encode_body, lean_analysis, lean_units
 
+logger = logging.getLogger(__name__)
 
-def _node_helper_path() -> str:
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.abspath(os.path.join(current_dir, os.pardir))
-    node_helper_dir = os.path.join(project_root, 'node_helper')
-    return node_helper_dir
+# Sources above this size default to the batch lane of the job queue
+JOB_INTERACTIVE_MAX_BYTES = int(os.environ.get('JOB_INTERACTIVE_MAX_BYTES', str(64 * 1024)))
+
+
+def _encoded_response(body: str) -> Response:
+    """JSON text as JSON or MessagePack, compressed as the client's Accept headers allow"""
+    data, mimetype, headers = encode_body(body, accepts_msgpack(request.accept_mimetypes),
+                                          choose_encoding(request.accept_encodings))
+    return Response(data, mimetype=mimetype, headers=headers)
+
+
+def _compact_format() -> bool:
+    """?format=compact selects the columnar CFG wire format (see wire.py)"""
+    return request.args.get('format', '').lower() == 'compact'
+
+
+def _blocks() -> bool:
+    """?blocks=1 merges straight-line statements into basic-block nodes"""
+    return request.args.get('blocks', '').lower() in ('1', 'true', 'yes')
+
+
+def _lean() -> bool:
+    """?findings=lean sends findings as rule references (see wire.lean_analysis and GET /rules)"""
+    return request.args.get('findings', '').lower() == 'lean'
+
+
+def _leaned(result):
+    """result in the lean shape when ?findings=lean, else as is"""
+    return lean_analysis(result, rule_catalog()['version']) if _lean() else result
+
+
+def _layered() -> bool:
+    """?layout=layered (or CFG_LAYOUT=layered) replaces the helper's positions with layout.layered_layout"""
+    return request.args.get('layout', CFG_LAYOUT).lower() == 'layered'
+
+
+def _rule_selection():
+    """?rules= / ?exclude= (comma-separated or repeated) as select_rules() ids; raises UnknownRule"""
+    def ids(name):
+        found = [r.strip() for value in request.args.getlist(name) for r in value.split(',') if r.strip()]
+        return found or None
+    return select_rules(ids('rules'), ids('exclude'))
+
+
+def _budget() -> Budget:
+    """
+    Budget for this request; ?budget=<seconds> can shorten the time limit
+    (not extend it)
+    """
+    seconds = TIME_BUDGET
+    try:
+        requested = float(request.args.get('budget', ''))
+    except ValueError:
+        requested = 0
+    if requested > 0:
+        seconds = min(seconds, requested) if seconds > 0 else requested
+    return Budget(seconds=seconds)
+
+
+def _too_large(e: SourceTooLarge) -> Response:
+    response = jsonify({"error": str(e)})
+    response.status_code = 413
+    return response
+
+
+def _import_resolver(data) -> Resolver:
+    """
+    ?imports=1: a Resolver over the body's optional 'sources' ({path: code},
+    for the other files of a project) and 'remappings' ("prefix=target"),
+    or None; raises RemappingError
+    """
+    if request.args.get('imports', '').lower() not in ('1', 'true', 'yes'):
+        return None
+    sources = data.get('sources') or {}
+    if not isinstance(sources, dict) or not all(isinstance(c, str) for c in sources.values()):
+        raise RemappingError("'sources' must map paths to Solidity code")
+    return Resolver(sources, parse_remappings(data.get('remappings') or []))
+
+
+def _profile_mode() -> str:
+    """'' (off), 'stages' for ?profile=1, or 'cprofile' for ?profile=cprofile"""
+    value = request.args.get('profile', '').lower()
+    if value == 'cprofile':
+        return value
+    return 'stages' if value in ('1', 'true', 'yes') else ''
+
+
+def _profiled_response(build, mode: str) -> Response:
+    """Run build(refresh) uncached under a profile and attach the breakdown to its JSON body"""
+    with profiling(cprofile=mode == 'cprofile') as profile:
+        body = build(True)
+    data = json.loads(body)
+    data['profile'] = profile.to_dict()
+    return jsonify(data)
 
 
 @api_bp.post('/cfg')
@@ -23,38 +126,163 @@ def build_cfg():
         if not code or not isinstance(code, str):
             return jsonify({"error": "Missing 'code' (Solidity source) in request body"}), 400
 
-        node_dir = _node_helper_path()
-        js_entry = os.path.join(node_dir, 'index.js')
-        if not os.path.exists(js_entry):
-            return jsonify({"error": "Node helper not installed. Run 'cd backend/node_helper && npm ci'"}), 500
+        budget = _budget()
+        try:
+            budget.check_source(code)
+        except SourceTooLarge as e:
+            return _too_large(e)
 
-        # Spawn node to process the code via stdin to avoid CLI length limits
-        proc = subprocess.Popen(
-            ['node', js_entry],
-            cwd=node_dir,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-        )
-
-        input_payload = json.dumps({"code": code})
-        stdout, stderr = proc.communicate(input=input_payload, timeout=30)
-        if proc.returncode != 0:
-            return jsonify({"error": "Node helper failed", "details": stderr.strip()}), 500
+        if not os.path.exists(node_helper_entry()):
+            return jsonify({"error": "Node helper not installed. Run 'cd backend/node_helper && npm ci'"}), 500
 
         try:
-            result = json.loads(stdout)
-        except json.JSONDecodeError:
-            return jsonify({"error": "Invalid JSON from node helper", "raw": stdout[:500]}), 500
+            # The parse is all /cfg does, so it may use the whole time budget
+            remaining = budget.remaining()
+            timeout = get_parser().timeout if remaining is None else min(get_parser().timeout, remaining)
+            profile = _profile_mode()
+            if profile:
+                return _profiled_response(
+                    lambda refresh: get_cfg_raw(code, refresh, _compact_format(), _blocks(), timeout, _layered()),
+                    profile)
+            # Forwarded as the helper wrote it; no decode/re-encode unless MessagePack is asked for
+            raw = get_cfg_raw(code, compact=_compact_format(), blocks=_blocks(), timeout=timeout, layered=_layered())
+        except json.JSONDecodeError as e:
+            return jsonify({"error": "Invalid JSON from node helper", "raw": e.doc[:500]}), 500
 
-        return jsonify(result)
-    except subprocess.TimeoutExpired:
+        return _encoded_response(raw)
+    except NodeHelperTimeout:
         return jsonify({"error": "Node helper timed out"}), 504
+    except PoolBusy:
+        return jsonify({"error": "All parser workers are busy, retry shortly"}), 503
+    except NodeHelperError as e:
+        logger.warning("Node helper failed: %s %s", e, e.details)
+        return jsonify({"error": str(e), "details": e.details}), 500
     except Exception as e:
+        logger.exception("CFG request failed")
         return jsonify({"error": str(e)}), 500
 
 
+@api_bp.post('/cfg/functions')
+def cfg_functions():
+    """
+    Function list with node/edge counts and findings per function
+    Each function's CFG is then fetched on its own from the cached parse.
+    """
+    try:
+        data = request.get_json(force=True) or {}
+        code = data.get('code', '')
+        if not code or not isinstance(code, str):
+            return jsonify({"error": "Missing 'code' (Solidity source) in request body"}), 400
+        try:
+            _budget().check_source(code)
+        except SourceTooLarge as e:
+            return _too_large(e)
+        return jsonify(function_summary(code, blocks=_blocks(), layered=_layered()))
+    except Exception as e:
+        logger.exception("Function summary failed")
+        return jsonify({"error": str(e), "type": "analysis_error"}), 500
+
+
+@api_bp.get('/cfg/functions/<source_id>/<int:index>')
+def cfg_function(source_id, index):
+    """One function's annotated CFG (positioned at the origin) and its findings"""
+    body = function_json(source_id, index)
+    if body is None:
+        return jsonify({"error": "Unknown or expired function; request the function list again"}), 404
+    if _compact_format() or _lean():
+        result = json.loads(body)
+        body = json.dumps(_leaned(compact_analysis(result) if _compact_format() else result), sort_keys=True)
+    return _encoded_response(body)
+
+
+@api_bp.get('/rules')
+def rules_catalog():
+    """
+    Rule catalog: id, title, severity, message template and recommendation
+    of every detector. Lean findings (?findings=lean) reference it by rule
+    id; the ETag is the catalog version they carry.
+    """
+    catalog = rule_catalog()
+    response = jsonify(catalog)
+    response.set_etag(catalog['version'])
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    return response.make_conditional(request)
+
+
+@api_bp.get('/parser/health')
+def parser_health():
+    return jsonify(get_parser().stats())
+
+
+@api_bp.get('/cache/stats')
+def cache_stats():
+    return jsonify(get_cache().stats())
+
+
+@api_bp.post('/cache/invalidate')
+def cache_invalidate():
+    """Drop cached results for one source ({"code": ...}) or everything (empty body)"""
+    data = request.get_json(force=True, silent=True) or {}
+    code = data.get('code')
+    if code is not None and not isinstance(code, str):
+        return jsonify({"error": "'code' must be a string"}), 400
+    keys = list(cache_keys(code).values()) if code else None
+    return jsonify({"removed": get_cache().invalidate(keys)})
+
+
+def _stream_mode() -> str:
+    """'ndjson' or 'sse' when the client asked for a streamed /analyze response"""
+    mode = request.args.get('stream', '').lower()
+    if mode in ('ndjson', 'sse'):
+        return mode
+    best = request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson', 'text/event-stream'])
+    return {'application/x-ndjson': 'ndjson', 'text/event-stream': 'sse'}.get(best, '')
+
+
+def _stream_analysis(code: str, mode: str, blocks: bool = False, rules=None, budget: Budget = None,
+                     layered: bool = False, lean: bool = False) -> Response:
+    """
+    Stream /analyze as events in a fixed order: 'cfg' (the unannotated
+    skeleton, null when the selected rules do not need it), one 'findings'
+    event per detector as it completes, then 'summary' with the score and
+    the highest severity per vulnerable node (plus partial/skipped when the
+    budget ran out). lean sends findings as rule references and the
+    catalog version in the summary.
+    """
+    def emit(event: str, payload: dict) -> str:
+        body = current_app.json.dumps({"event": event, **payload})
+        if mode == 'sse':
+            return f"event: {event}\ndata: {body}\n\n"
+        return body + '\n'
+
+    def generate():
+        cfg_result, cfg_error = (try_get_cfg(code, blocks=blocks, budget=budget, layered=layered)
+                                 if needs_parse(rules) else (None, None))
+        yield emit('cfg', {"cfg": cfg_result, "error": cfg_error})
+        try:
+            analyzer = SecurityAnalyzer()
+            for detector, found in analyzer.iter_analyze(code, cfg_data=cfg_result, rules=rules, budget=budget):
+                found = [v.to_record() if lean else v.to_dict() for v in found]
+                yield emit('findings', {"detector": detector, "vulnerabilities": found})
+            result = analyzer.result()
+        except Exception as e:
+            logger.exception("Streamed analysis failed")
+            yield emit('error', {"error": str(e), "type": "analysis_error"})
+            return
+
+        vulnerable_nodes = {node_id: severity for node_id, (severity, _) in group_by_node(result['vulnerabilities']).items()}
+        summary = {"summary": result['summary'], "score": result['score'], "vulnerableNodes": vulnerable_nodes}
+        if lean:
+            summary['catalog'] = rule_catalog()['version']
+        if budget is not None:
+            budget.annotate(summary)
+        yield emit('summary', summary)
+
+    mimetype = 'text/event-stream' if mode == 'sse' else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers={"Cache-Control": "no-cache"})
+
+
 @api_bp.post('/analyze')
 def analyze_security():
     """
@@ -67,82 +295,175 @@ def analyze_security():
         
         if not code or not isinstance(code, str):
             return jsonify({"error": "Missing 'code' in request body"}), 400
-        
-        # First, get CFG data
-        cfg_result = None
         try:
-            node_dir = _node_helper_path()
-            js_entry = os.path.join(node_dir, 'index.js')
-            
-            if os.path.exists(js_entry):
-                proc = subprocess.Popen(
-                    ['node', js_entry],
-                    cwd=node_dir,
-                    stdin=subprocess.PIPE,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                )
-                
-                input_payload = json.dumps({"code": code})
-                stdout, stderr = proc.communicate(input=input_payload, timeout=30)
-                
-                if proc.returncode == 0:
-                    cfg_result = json.loads(stdout)
-        except Exception as e:
-            # Continue without CFG if parsing fails
-            print(f"CFG generation failed: {e}")
-        
-        # Run security analysis
-        analyzer = SecurityAnalyzer()
-        analysis_result = analyzer.analyze(
-            code=code,
-            cfg_data=cfg_result
-        )
-        
-        # Combine CFG with vulnerability info
-        if cfg_result:
-            analysis_result['cfg'] = cfg_result
-            
-            # Mark vulnerable nodes
-            vuln_node_ids = {v['nodeId'] for v in analysis_result['vulnerabilities'] if v.get('nodeId')}
-            
-            for node in cfg_result.get('nodes', []):
-                if node['id'] in vuln_node_ids:
-                    # Find vulnerabilities for this node
-                    node_vulns = [v for v in analysis_result['vulnerabilities'] if v.get('nodeId') == node['id']]
-                    
-                    # Get highest severity
-                    severity_order = ['critical', 'high', 'medium', 'low', 'info']
-                    max_severity = 'info'
-                    for vuln in node_vulns:
-                        vuln_sev = vuln['severity']
-                        if severity_order.index(vuln_sev) < severity_order.index(max_severity):
-                            max_severity = vuln_sev
-                    
-                    # Add vulnerability styling
-                    node['data']['vulnerable'] = True
-                    node['data']['severity'] = max_severity
-                    node['data']['vulnerabilities'] = node_vulns
-                    
-                    # Update node style based on severity
-                    if 'style' not in node:
-                        node['style'] = {}
-                    
-                    severity_colors = {
-                        'critical': '#d32f2f',
-                        'high': '#f57c00',
-                        'medium': '#fbc02d',
-                        'low': '#7cb342',
-                        'info': '#0288d1'
-                    }
-                    
-                    node['style']['border'] = f"3px solid {severity_colors.get(max_severity, '#999')}"
-                    node['style']['boxShadow'] = f"0 0 10px {severity_colors.get(max_severity, '#999')}"
-        
-        return jsonify(analysis_result)
+            rules = _rule_selection()
+        except UnknownRule as e:
+            return jsonify({"error": str(e)}), 400
+        try:
+            resolver = _import_resolver(data)
+        except RemappingError as e:
+            return jsonify({"error": str(e)}), 400
+        budget = _budget()
+        try:
+            budget.check_source(code)
+        except SourceTooLarge as e:
+            return _too_large(e)
+
+        mode = _stream_mode()
+        if mode:
+            return _stream_analysis(code, mode, _blocks(), rules, budget, _layered(), _lean())
+
+        profile = _profile_mode()
+        if profile:
+            return _profiled_response(
+                lambda refresh: analysis_json(code, refresh=refresh, compact=_compact_format(), blocks=_blocks(),
+                                              rules=rules, layered=_layered(), lean=_lean(), budget=budget),
+                profile)
+
+        body = analysis_json(code, compact=_compact_format(), blocks=_blocks(), rules=rules, layered=_layered(),
+                             lean=_lean(), budget=budget)
+        if resolver is not None:
+            # Imported units are analyzed (or fetched from the store) after the file itself
+            result = json.loads(body)
+            path = data.get('path') if isinstance(data.get('path'), str) else None
+            resolved = resolve_imports(code, path, resolver, budget)
+            if _lean():
+                # The file's own findings are lean already; only the imported units still need it
+                resolved['imports'] = lean_units(resolved['imports'])
+            result.update(resolved)
+            budget.annotate(result)
+            body = json.dumps(result, sort_keys=True)
+        return _encoded_response(body)
         
     except Exception as e:
+        logger.exception("Analysis failed")
+        return jsonify({"error": str(e), "type": "analysis_error"}), 500
+
+
+@api_bp.post('/analyze/batch')
+def analyze_batch():
+    """
+    Analyze many sources in one request
+    Accepts JSON ({"files": [{"path", "code"}]}), a multipart 'archive'
+    upload, or a raw zip/tar body. Streams NDJSON: one line per file as it
+    completes, then a summary line. ?dedup=1 reuses per-function results
+    across files (see function_cache.py).
+    """
+    try:
+        upload = request.files.get('archive')
+        if upload is not None:
+            sources = sources_from_archive(upload.read())
+        elif request.is_json:
+            sources = sources_from_json(request.get_json(force=True) or {})
+        else:
+            sources = sources_from_archive(request.get_data())
+    except BatchInputError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def generate():
+        for record in iter_batch(sources, dedup=request.args.get('dedup', '').lower() in ('1', 'true', 'yes')):
+            yield current_app.json.dumps(record) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@api_bp.post('/analyze/jobs')
+def submit_analysis_job():
+    """
+    Queue an analysis and return its job id immediately
+    Optional 'priority' is 'interactive' or 'batch'; by default large
+    sources go to the batch lane, which analyzes on the process pool.
+    """
+    data = request.get_json(force=True, silent=True) or {}
+    code = data.get('code', '')
+    if not code or not isinstance(code, str):
+        return jsonify({"error": "Missing 'code' in request body"}), 400
+
+    lane = data.get('priority') or ('batch' if len(code.encode('utf-8')) > JOB_INTERACTIVE_MAX_BYTES else 'interactive')
+    if lane not in LANES:
+        return jsonify({"error": f"'priority' must be one of {', '.join(LANES)}"}), 400
+
+    run = analyze_in_pool if lane == 'batch' else None
+
+    def work(job):
+        return json.loads(analysis_json(code, checkpoint=job.checkpoint, run=run))
+
+    try:
+        job = get_job_queue().submit(work, lane)
+    except QueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    response = jsonify(job.to_dict(include_result=False))
+    response.status_code = 202
+    response.headers['Location'] = f"{request.path}/{job.id}"
+    return response
+
+
+@api_bp.get('/analyze/jobs/<job_id>')
+def get_analysis_job(job_id):
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(job.to_dict())
+
+
+@api_bp.delete('/analyze/jobs/<job_id>')
+def cancel_analysis_job(job_id):
+    job = get_job_queue().cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(job.to_dict(include_result=False))
+
+
+@api_bp.get('/analyze/jobs')
+def analysis_job_stats():
+    return jsonify(get_job_queue().stats())
+
+
+@api_bp.post('/sessions')
+def create_session():
+    """
+    Start an incremental editor session
+    With an optional {"code"}, the first analysis is returned right away;
+    later updates only re-parse and re-check the functions that changed.
+    """
+    data = request.get_json(force=True, silent=True) or {}
+    code = data.get('code')
+    if code is not None and not isinstance(code, str):
+        return jsonify({"error": "'code' must be a string"}), 400
+    session = get_session_store().create(layered=_layered())
+    with session.lock:
+        body = _leaned(session.update(code)) if code else {"sessionId": session.id, "version": session.version}
+    return jsonify(body), 201
+
+
+@api_bp.post('/sessions/<session_id>')
+def update_session(session_id):
+    """
+    Update a session with the full source ({"code"}) or with character
+    edits against its current version ({"version", "edits": [{"start", "end", "text"}]})
+    """
+    session = get_session_store().get(session_id)
+    if session is None:
+        return jsonify({"error": "Unknown or expired session"}), 404
+    data = request.get_json(force=True, silent=True) or {}
+    try:
+        with session.lock:
+            if isinstance(data.get('code'), str):
+                return jsonify(_leaned(session.update(data['code'])))
+            if isinstance(data.get('edits'), list):
+                return jsonify(_leaned(session.edit(data['edits'], data.get('version'))))
+        return jsonify({"error": "Expected 'code' or 'edits'"}), 400
+    except VersionConflict as e:
+        return jsonify({"error": str(e), "version": session.version}), 409
+    except SessionError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.exception("Session update failed")
         return jsonify({"error": str(e), "type": "analysis_error"}), 500
 
 
+@api_bp.delete('/sessions/<session_id>')
+def delete_session(session_id):
+    if not get_session_store().delete(session_id):
+        return jsonify({"error": "Unknown or expired session"}), 404
+    return jsonify({"deleted": session_id})
@@ -1,5 +1,25 @@
-from flask import Flask
+import logging
+import os
+import time
+from typing import Callable
+
+from flask import Flask, Response, g, request
 from flask_cors import CORS
+from flask_cors.core import get_cors_options, parse_resources
+from flask_cors.extension import make_after_request_function
+
+from metrics import INPUT_BYTES, REGISTRY, REQUEST_SECONDS, REQUESTS
+
+
+logger = logging.getLogger(__name__)
+
+
+def cors_hook(app: Flask) -> Callable[[Response], Response]:
+    """Flask-CORS's after-request hook for app's CORS policy, for responses built outside Flask"""
+    options = get_cors_options(app)
+    resources = [(pattern, get_cors_options(app, options, resource_options))
+                 for pattern, resource_options in parse_resources(options.get('resources'))]
+    return make_after_request_function(resources)
 
 
 def create_app() -> Flask:
@@ -11,17 +31,39 @@ def create_app() -> Flask:
     def health():
         return {"status": "ok"}
 
+    # Prometheus scrape endpoint
+    @app.get('/metrics')
+    def metrics():
+        return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        started = g.get('request_started')
+        if started is not None:
+            REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+        if request.content_length:
+            INPUT_BYTES.observe(request.content_length, endpoint=endpoint)
+        return response
+
     # Register API blueprint
     try:
         from api.routes import api_bp
         app.register_blueprint(api_bp, url_prefix='/api/v1')
-    except Exception as _e:
-        # Defer import errors to runtime logs; health still works
-        pass
+    except Exception:
+        # Keep serving /health and /metrics, but make the failure visible
+        logger.exception("Failed to register the API blueprint; /api/v1 is unavailable")
 
     return app
 
 
 if __name__ == '__main__':
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'),
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
     app = create_app()
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,265 @@
+"""
+ASGI entry point: /cfg and /analyze without a thread per parse
+    uvicorn asgi:app --workers 1 --port 5000
+POST /api/v1/cfg and /api/v1/analyze are served on the event loop: a
+parse awaits the pipelined Node workers (node_pool.AsyncNodeParser), and
+only CPU work (analysis, layout, encoding) goes to a bounded thread pool.
+At most ASYNC_MAX_INFLIGHT of these requests are read and processed at a
+time, and later ones wait for a slot before their bodies are read, which
+keeps memory bounded. Every other request, including streamed, profiled
+and ?imports=1 analyses, goes to the Flask app through asgiref's
+WSGI adapter when asgiref is installed.
+"""
+import asyncio
+import io
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from flask import request
+
+from api.routes import (_blocks, _budget, _compact_format, _layered, _lean, _profile_mode, _rule_selection,
+                        _stream_mode)
+from app import cors_hook, create_app
+from budget import MAX_SOURCE_BYTES, SourceTooLarge
+from metrics import INPUT_BYTES, REQUEST_SECONDS, REQUESTS
+from node_pool import NodeHelperError, NodeHelperTimeout, get_async_parser, node_helper_entry
+from pipeline import analysis_json, get_cfg_raw, get_cfg_raw_async
+from security_analyzer import UnknownRule, needs_parse
+from wire import accepts_msgpack, choose_encoding, encode_body
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError:  # optional: only needed for the routes served by Flask
+    WsgiToAsgi = None
+
+
+logger = logging.getLogger(__name__)
+
+ASYNC_MAX_INFLIGHT = int(os.environ.get('ASYNC_MAX_INFLIGHT', '512'))
+ASYNC_ANALYSIS_THREADS = int(os.environ.get('ASYNC_ANALYSIS_THREADS', '0')) or None
+# Largest request body read on the async path (JSON escaping can double a source)
+MAX_BODY_BYTES = MAX_SOURCE_BYTES * 2 + 4096
+
+ASYNC_ROUTES = ('/api/v1/cfg', '/api/v1/analyze')
+
+Result = Tuple[int, Any]
+
+flask_app = create_app()
+_wsgi = WsgiToAsgi(flask_app) if WsgiToAsgi is not None else None
+_cors = cors_hook(flask_app)
+_executor = ThreadPoolExecutor(max_workers=ASYNC_ANALYSIS_THREADS, thread_name_prefix='analysis')
+_slots: Optional[asyncio.Semaphore] = None
+
+
+def _environ(scope: Dict[str, Any], body: bytes = b'') -> Dict[str, Any]:
+    """Minimal WSGI environ for an ASGI HTTP scope, enough for a Flask request context"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope.get('headers', []):
+        name, value = raw_name.decode('latin-1').lower(), raw_value.decode('latin-1')
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'content-length':
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client goes away before its request body is complete"""
+
+
+async def _read_body(receive: Callable[[], Awaitable[Dict]]) -> Optional[bytes]:
+    """The request body, or None once it grows past MAX_BODY_BYTES; raises ClientDisconnected"""
+    chunks: List[bytes] = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise ClientDisconnected()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def _send(send, status: int, data: bytes, mimetype: str = 'application/json',
+                headers: Dict[str, str] = None):
+    header_list = [(b'content-type', mimetype.encode('latin-1')), (b'content-length', str(len(data)).encode())]
+    header_list.extend((name.lower().encode('latin-1'), value.encode('latin-1'))
+                       for name, value in (headers or {}).items())
+    await send({'type': 'http.response.start', 'status': status, 'headers': header_list})
+    await send({'type': 'http.response.body', 'body': data})
+
+
+def _cors_headers(status: int, mimetype: str, headers: Dict[str, str]) -> Dict[str, str]:
+    """headers plus the Access-Control-* (and Vary) headers Flask-CORS would add; needs a request context"""
+    response = _cors(flask_app.response_class(status=status, mimetype=mimetype))
+    merged = dict(headers)
+    for name, value in response.headers.items():
+        if name.lower() == 'vary' and 'Vary' in merged:
+            merged['Vary'] = f"{merged['Vary']}, {value}"
+        elif name.lower().startswith('access-control-') or name.lower() == 'vary':
+            merged[name] = value
+    return merged
+
+
+def _offload(fn: Callable, *args, **kwargs) -> Awaitable:
+    return asyncio.get_running_loop().run_in_executor(_executor, partial(fn, *args, **kwargs))
+
+
+async def _cfg(code: str) -> Result:
+    budget = _budget()
+    try:
+        budget.check_source(code)
+    except SourceTooLarge as e:
+        return 413, {"error": str(e)}
+    if not os.path.exists(node_helper_entry()):
+        return 500, {"error": "Node helper not installed. Run 'cd backend/node_helper && npm ci'"}
+    parser = get_async_parser()
+    remaining = budget.remaining()
+    timeout = parser.timeout if remaining is None else min(parser.timeout, remaining)
+    compact, blocks = _compact_format(), _blocks()
+    if _layered():
+        # Layout is CPU work on the cached parse
+        await get_cfg_raw_async(code, blocks=blocks, timeout=timeout)
+        return 200, await _offload(get_cfg_raw, code, compact=compact, blocks=blocks, layered=True)
+    return 200, await get_cfg_raw_async(code, compact=compact, blocks=blocks, timeout=timeout)
+
+
+async def _analyze(code: str) -> Result:
+    try:
+        rules = _rule_selection()
+    except UnknownRule as e:
+        return 400, {"error": str(e)}
+    budget = _budget()
+    try:
+        budget.check_source(code)
+    except SourceTooLarge as e:
+        return 413, {"error": str(e)}
+    options = dict(compact=_compact_format(), blocks=_blocks(), rules=rules, layered=_layered(), lean=_lean(),
+                   budget=budget)
+
+    if needs_parse(rules) and os.path.exists(node_helper_entry()):
+        # Parse on the loop so analysis_json finds the CFG in the cache; a failure is handed over as is
+        parser = get_async_parser()
+        try:
+            if budget.expired():
+                raise NodeHelperTimeout("Time budget exhausted before parsing")
+            await get_cfg_raw_async(code, blocks=options['blocks'], timeout=budget.parse_timeout(parser.timeout))
+        except NodeHelperError as e:
+            if isinstance(e, NodeHelperTimeout):
+                budget.skip('cfg')
+            options['parsed'] = (None, str(e))
+    return 200, await _offload(analysis_json, code, **options)
+
+
+async def _serve(scope: Dict[str, Any], receive, send, handler: Callable[[str], Awaitable[Result]]):
+    started = time.perf_counter()
+    async with _slots:
+        try:
+            body = await _read_body(receive)
+        except ClientDisconnected:
+            # A truncated body is not analyzed, and there is no one to answer
+            return
+        with flask_app.request_context(_environ(scope, body or b'')):
+            if body is None:
+                status, payload = 413, {"error": f"Request body is larger than {MAX_BODY_BYTES} bytes"}
+            else:
+                try:
+                    data = json.loads(body or b'{}')
+                    code = data.get('code', '') if isinstance(data, dict) else ''
+                except ValueError:
+                    code = ''
+                if not code or not isinstance(code, str):
+                    status, payload = 400, {"error": "Missing 'code' in request body"}
+                else:
+                    try:
+                        status, payload = await handler(code)
+                    except NodeHelperTimeout:
+                        status, payload = 504, {"error": "Node helper timed out"}
+                    except NodeHelperError as e:
+                        logger.warning("Node helper failed: %s %s", e, e.details)
+                        status, payload = 500, {"error": str(e), "details": e.details}
+                    except Exception as e:
+                        logger.exception("Async request failed")
+                        status, payload = 500, {"error": str(e)}
+            if status == 200:
+                # JSON text from the cache is forwarded without re-encoding
+                data, mimetype, headers = await _offload(encode_body, payload, accepts_msgpack(request.accept_mimetypes),
+                                                         choose_encoding(request.accept_encodings))
+            else:
+                data, mimetype, headers = json.dumps(payload).encode('utf-8'), 'application/json', {}
+            headers = _cors_headers(status, mimetype, headers)
+    await _send(send, status, data, mimetype, headers)
+    REQUESTS.inc(endpoint=scope['path'], method='POST', status=status)
+    REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=scope['path'])
+    if body:
+        INPUT_BYTES.observe(len(body), endpoint=scope['path'])
+
+
+def _async_route(scope: Dict[str, Any]) -> Optional[Callable[[str], Awaitable[Result]]]:
+    """Handler for requests served on the loop; None sends the request to Flask"""
+    if scope['method'] != 'POST' or scope['path'] not in ASYNC_ROUTES:
+        return None
+    with flask_app.request_context(_environ(scope)):
+        if _profile_mode() or _stream_mode() or request.args.get('imports'):
+            return None
+    return _cfg if scope['path'] == '/api/v1/cfg' else _analyze
+
+
+async def _lifespan(receive, send):
+    global _slots
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            _slots = asyncio.Semaphore(ASYNC_MAX_INFLIGHT)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await get_async_parser().close()
+            _executor.shutdown(wait=False, cancel_futures=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope: Dict[str, Any], receive, send):
+    global _slots
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+    if _slots is None:
+        _slots = asyncio.Semaphore(ASYNC_MAX_INFLIGHT)
+    handler = _async_route(scope)
+    if handler is not None:
+        await _serve(scope, receive, send, handler)
+    elif _wsgi is not None:
+        await _wsgi(scope, receive, send)
+    else:
+        await _send(send, 501, json.dumps({"error": "This route needs asgiref in ASGI mode"}).encode('utf-8'))
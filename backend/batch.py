@@ -0,0 +1,172 @@
+"""
+Bulk analysis of many sources or a whole project archive
+Sources are parsed in chunks through the Node helper, analyzed across a
+process pool and yielded one result per file as soon as it is ready.
+"""
+import io
+import os
+import tarfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from node_pool import NodeHelperError, get_parser
+from parallel import submit
+from pipeline import get_cfg_many
+from security_analyzer import SecurityAnalyzer
+from sessions import analyze_by_function, check_functions
+
+
+MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', '1000'))
+MAX_BYTES = int(os.environ.get('BATCH_MAX_BYTES', str(50 * 1024 * 1024)))
+PARSE_CHUNK = int(os.environ.get('BATCH_PARSE_CHUNK', '16'))
+
+Source = Tuple[str, str]
+
+
+class BatchInputError(ValueError):
+    """Raised when a batch request is malformed or over its limits"""
+
+
+class _Budget:
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+
+    def take(self, size: int):
+        self.files += 1
+        self.bytes += size
+        if self.files > MAX_FILES:
+            raise BatchInputError(f"Too many files (limit {MAX_FILES})")
+        if self.bytes > MAX_BYTES:
+            raise BatchInputError(f"Sources too large (limit {MAX_BYTES} bytes)")
+
+
+def sources_from_json(data: Dict[str, Any]) -> List[Source]:
+    """Accept {"files": [{"path", "code"}, ...]} or {"sources": {path: code}}"""
+    entries = data.get('files')
+    if entries is None and isinstance(data.get('sources'), dict):
+        entries = [{"path": p, "code": c} for p, c in data['sources'].items()]
+    if not isinstance(entries, list) or not entries:
+        raise BatchInputError("Expected a non-empty 'files' list or 'sources' object")
+
+    budget = _Budget()
+    sources = []
+    for i, entry in enumerate(entries):
+        if not isinstance(entry, dict) or not isinstance(entry.get('code'), str):
+            raise BatchInputError(f"File #{i} is missing 'code'")
+        budget.take(len(entry['code'].encode('utf-8')))
+        sources.append((str(entry.get('path') or f"file{i}.sol"), entry['code']))
+    return sources
+
+
+def sources_from_archive(data: bytes) -> List[Source]:
+    """Read every .sol file from a zip or (optionally compressed) tar archive"""
+    budget = _Budget()
+    sources = []
+    if zipfile.is_zipfile(io.BytesIO(data)):
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.endswith('.sol'):
+                    continue
+                budget.take(info.file_size)
+                sources.append((info.filename, archive.read(info).decode('utf-8', 'replace')))
+    else:
+        try:
+            archive = tarfile.open(fileobj=io.BytesIO(data), mode='r:*')
+        except tarfile.TarError:
+            raise BatchInputError("Upload is neither a zip nor a tar archive")
+        with archive:
+            for member in archive:
+                if not member.isfile() or not member.name.endswith('.sol'):
+                    continue
+                budget.take(member.size)
+                sources.append((member.name, archive.extractfile(member).read().decode('utf-8', 'replace')))
+    if not sources:
+        raise BatchInputError("Archive contains no .sol files")
+    return sources
+
+
+def _analyze_file(code: str, cfg: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Runs in a worker process"""
+    return SecurityAnalyzer().analyze(code=code, cfg_data=cfg)
+
+
+def _submit_analysis(code: str, cfg: Optional[Dict[str, Any]]):
+    return submit(_analyze_file, code, cfg)
+
+
+def _checks_in_pool(code: str, units) -> Dict[str, Any]:
+    """sessions.check_functions on the process pool; the parse and function cache stay here"""
+    return submit(check_functions, code, units).result()
+
+
+def analyze_in_pool(code: str, cfg: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Run the analyzer for one source on the process pool and wait for it"""
+    return _submit_analysis(code, cfg).result()
+
+
+def iter_batch(sources: List[Source], dedup: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Yield one record per source in completion order, then a final summary
+
+    A file whose parse fails is still pattern-analyzed (without CFG) and
+    carries a 'cfgError'; a file whose analysis fails yields an error
+    record. Neither affects the other files. With dedup, files are
+    analyzed per function so bodies seen in earlier files come from the
+    function cache (listed in each record's 'reused'). Their parses run on
+    threads and the checks of the remaining functions on the process pool.
+    """
+    started = time.monotonic()
+    pool = get_parser().pool
+    parse_threads = ThreadPoolExecutor(max_workers=pool.size if pool else 2)
+    pending = {}
+    failed = 0
+
+    def parse_chunk(chunk):
+        try:
+            return get_cfg_many(chunk)
+        except NodeHelperError as e:
+            return [{"error": f"{e}: {e.details}" if e.details else str(e)}] * len(chunk)
+
+    try:
+        if dedup:
+            for path, code in sources:
+                pending[parse_threads.submit(analyze_by_function, code, _checks_in_pool)] = ('analyze', (path, None))
+        else:
+            for start in range(0, len(sources), PARSE_CHUNK):
+                chunk = sources[start:start + PARSE_CHUNK]
+                pending[parse_threads.submit(parse_chunk, chunk)] = ('parse', chunk)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, item = pending.pop(future)
+                if kind == 'parse':
+                    for (path, code), parsed in zip(item, future.result()):
+                        cfg_error = parsed.get('error')
+                        analysis = _submit_analysis(code, parsed.get('cfg'))
+                        pending[analysis] = ('analyze', (path, cfg_error))
+                    continue
+
+                path, cfg_error = item
+                try:
+                    record = {"path": path, "status": "ok", **future.result()}
+                except Exception as e:
+                    failed += 1
+                    record = {"path": path, "status": "error", "error": str(e)}
+                if cfg_error:
+                    record["cfgError"] = cfg_error
+                yield record
+    finally:
+        for future in pending:
+            future.cancel()
+        parse_threads.shutdown(wait=False, cancel_futures=True)
+
+    yield {
+        "done": True,
+        "files": len(sources),
+        "failed": failed,
+        "elapsedMs": round((time.monotonic() - started) * 1000, 1),
+    }
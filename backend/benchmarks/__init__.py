@@ -0,0 +1,4 @@
+"""
+Benchmark suite for the CFG builder and security analyzer
+Run from the backend directory: python -m benchmarks.run --help
+"""
@@ -0,0 +1,137 @@
+"""
+Synthetic Solidity contract generator for benchmarks
+Contracts are deterministic for a given shape and seed, so timings from
+different versions are comparable.
+"""
+import argparse
+import random
+from typing import List
+
+
+_EXTERNAL_CALLS = (
+    '(bool ok{n}, ) = payable(msg.sender).call{{value: amount}}("");',
+    'payable(msg.sender).transfer(amount);',
+    'token.transfer(to, amount);',
+    'target.delegatecall(data);',
+)
+
+_STATEMENTS = (
+    'balances[msg.sender] += amount;',
+    'total = total + amount;',
+    'counter++;',
+    'uint256 tmp{n} = balances[to] * 2;',
+    'require(amount > 0, "zero");',
+    'lastUpdate = block.timestamp;',
+)
+
+
+class ContractShape:
+    """Size and density knobs for a generated contract"""
+
+    def __init__(self, functions: int = 10, statements: int = 6, depth: int = 2,
+                 loop_density: float = 0.2, call_density: float = 0.15, seed: int = 0):
+        self.functions = functions
+        self.statements = statements
+        self.depth = depth
+        self.loop_density = loop_density
+        self.call_density = call_density
+        self.seed = seed
+
+    def to_dict(self):
+        return {
+            "functions": self.functions,
+            "statements": self.statements,
+            "depth": self.depth,
+            "loopDensity": self.loop_density,
+            "callDensity": self.call_density,
+            "seed": self.seed,
+        }
+
+
+class _Writer:
+    def __init__(self, shape: ContractShape):
+        self.shape = shape
+        self.rng = random.Random(shape.seed)
+        self.lines: List[str] = []
+        self.counter = 0
+
+    def emit(self, indent: int, text: str):
+        self.lines.append('    ' * indent + text)
+
+    def fresh(self) -> int:
+        self.counter += 1
+        return self.counter
+
+    def statement(self, indent: int):
+        rng = self.rng
+        if rng.random() < self.shape.call_density:
+            self.emit(indent, rng.choice(_EXTERNAL_CALLS).format(n=self.fresh()))
+        else:
+            self.emit(indent, rng.choice(_STATEMENTS).format(n=self.fresh()))
+
+    def block(self, indent: int, depth: int, count: int):
+        rng = self.rng
+        for _ in range(count):
+            roll = rng.random()
+            if depth > 0 and roll < self.shape.loop_density:
+                n = self.fresh()
+                if rng.random() < 0.5:
+                    self.emit(indent, f'for (uint256 i{n} = 0; i{n} < users.length; i{n}++) {{')
+                else:
+                    self.emit(indent, f'while (counter < {rng.randint(2, 50)}) {{')
+                self.block(indent + 1, depth - 1, max(1, count // 2))
+                self.emit(indent, '}')
+            elif depth > 0 and roll < self.shape.loop_density + 0.2:
+                self.emit(indent, f'if (amount > {rng.randint(1, 1000)}) {{')
+                self.block(indent + 1, depth - 1, max(1, count // 2))
+                if rng.random() < 0.5:
+                    self.emit(indent, '} else {')
+                    self.block(indent + 1, depth - 1, max(1, count // 3))
+                self.emit(indent, '}')
+            else:
+                self.statement(indent)
+
+
+def generate_contract(shape: ContractShape) -> str:
+    """Return the source of one contract with the requested shape"""
+    w = _Writer(shape)
+    w.emit(0, '// SPDX-License-Identifier: MIT')
+    w.emit(0, 'pragma solidity ^0.8.0;')
+    w.emit(0, '')
+    w.emit(0, 'interface IToken { function transfer(address to, uint256 amount) external returns (bool); }')
+    w.emit(0, '')
+    w.emit(0, f'contract Generated{shape.seed} {{')
+    w.emit(1, 'mapping(address => uint256) public balances;')
+    w.emit(1, 'address[] public users;')
+    w.emit(1, 'uint256 public total;')
+    w.emit(1, 'uint256 public counter;')
+    w.emit(1, 'uint256 public lastUpdate;')
+    w.emit(1, 'IToken public token;')
+    w.emit(1, 'address public target;')
+    w.emit(1, 'bytes public data;')
+    w.emit(1, 'address public owner;')
+    for i in range(shape.functions):
+        w.emit(0, '')
+        visibility = 'internal' if w.rng.random() < 0.2 else 'public'
+        w.emit(1, f'function f{i}(address to, uint256 amount) {visibility} {{')
+        w.block(2, shape.depth, shape.statements)
+        w.emit(1, '}')
+    w.emit(0, '}')
+    return '\n'.join(w.lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print a synthetic Solidity contract")
+    parser.add_argument('--functions', type=int, default=10)
+    parser.add_argument('--statements', type=int, default=6, help="statements per block")
+    parser.add_argument('--depth', type=int, default=2, help="maximum if/loop nesting")
+    parser.add_argument('--loop-density', type=float, default=0.2)
+    parser.add_argument('--call-density', type=float, default=0.15)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    print(generate_contract(ContractShape(args.functions, args.statements, args.depth,
+                                          args.loop_density, args.call_density, args.seed)), end='')
+
+
+if __name__ == '__main__':
+    main()
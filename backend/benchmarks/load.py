@@ -0,0 +1,329 @@
+"""
+Concurrent load generator for a running backend
+Usage (from the backend directory):
+    python -m benchmarks.load --url http://127.0.0.1:5000 --concurrency 50 --duration 30
+    python -m benchmarks.load --serve --stub-latency 20 --concurrency 200 --rate 100
+Replays a mix of contracts against /api/v1/analyze and /api/v1/cfg from
+`--concurrency` clients, either back to back (closed loop) or at a Poisson
+arrival `--rate` (open loop, where latency counts from the scheduled
+arrival, so time spent queued at the client is included). The report has
+throughput, p50/p95/p99 latency, status/error/timeout counts and the
+number of helper processes sampled during the run. `--serve` starts a
+local instance, and `--stub-latency` puts benchmarks/stub_parser.py in place
+of the Node helper, so the Python-side overhead can be measured without
+the parse cost.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import queue
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generate import ContractShape, generate_contract
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_ROOT = os.path.dirname(BACKEND_DIR)
+STUB_PARSER = os.path.join(BACKEND_DIR, 'benchmarks', 'stub_parser.py')
+# Command-line fragments that identify helper processes (real or stub)
+HELPER_MARKERS = (os.path.join('node_helper', 'index.js'), 'index.js --worker', 'stub_parser.py')
+
+
+def percentile(samples: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile of samples, or None when there are none"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return round(ordered[int(rank) - 1], 3)
+
+
+def load_contracts(paths: List[str]) -> List[Tuple[str, str]]:
+    """(name, code) for the given files, or the fixed example plus two generated sizes"""
+    if paths:
+        contracts = []
+        for path in paths:
+            with open(path, encoding='utf-8') as f:
+                contracts.append((os.path.basename(path), f.read()))
+        return contracts
+    contracts = []
+    example = os.path.join(REPO_ROOT, 'vulnerable_contract_examples.sol')
+    if os.path.exists(example):
+        with open(example, encoding='utf-8') as f:
+            contracts.append(('vulnerable_contract_examples.sol', f.read()))
+    for functions in (10, 50):
+        contracts.append((f"generated-{functions}", generate_contract(ContractShape(functions=functions))))
+    return contracts
+
+
+def parse_mix(text: str) -> List[Tuple[str, float]]:
+    """'analyze=3,cfg=1' -> [(path, weight)]"""
+    mix = []
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        mix.append(('/api/v1/' + name.strip().strip('/'), float(weight or 1)))
+    return mix
+
+
+def helper_processes() -> Optional[int]:
+    """Running helper processes on this machine (Linux /proc only; None elsewhere)"""
+    if not os.path.isdir('/proc'):
+        return None
+    count = 0
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f'/proc/{pid}/cmdline', 'rb') as f:
+                cmdline = f.read().replace(b'\0', b' ').decode('utf-8', 'replace')
+        except OSError:
+            continue
+        if any(marker in cmdline for marker in HELPER_MARKERS):
+            count += 1
+    return count
+
+
+class Recorder:
+    """Thread-safe latency samples and outcome counters"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.statuses: Dict[str, int] = {}
+        self.timeouts = 0
+        self.errors = 0
+        self.processes: List[int] = []
+
+    def record(self, latency_ms: float, status: str):
+        with self.lock:
+            self.latencies.append(latency_ms)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if status == 'timeout':
+                self.timeouts += 1
+            elif not status.startswith('2'):
+                self.errors += 1
+
+
+def send(url: str, path: str, code: str, timeout: float) -> str:
+    """POST one source; returns the status code, 'timeout' or 'error'"""
+    request = urllib.request.Request(url + path, data=json.dumps({"code": code}).encode('utf-8'),
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return str(response.status)
+    except urllib.error.HTTPError as e:
+        e.read()
+        return str(e.code)
+    except (TimeoutError, OSError) as e:
+        # urllib wraps socket timeouts in URLError
+        reason = getattr(e, 'reason', e)
+        return 'timeout' if isinstance(reason, TimeoutError) or 'timed out' in str(reason) else 'error'
+
+
+def run_load(url: str, contracts: List[Tuple[str, str]], mix: List[Tuple[str, float]], concurrency: int,
+             rate: float, duration: float, max_requests: int, timeout: float, unique: bool,
+             seed: int = 0) -> Dict[str, Any]:
+    """Drive the load and return the report's 'results' section"""
+    recorder = Recorder()
+    rng = random.Random(seed)
+    paths = [path for path, _ in mix]
+    weights = [weight for _, weight in mix]
+    counter = itertools.count()
+    stop = threading.Event()
+    arrivals: "queue.Queue[Optional[float]]" = queue.Queue()
+    counts = {"arrived": 0, "taken": 0}
+
+    def next_request() -> Optional[Tuple[str, str]]:
+        n = next(counter)
+        if max_requests and n >= max_requests:
+            return None
+        with recorder.lock:
+            path = rng.choices(paths, weights)[0]
+            _, code = contracts[rng.randrange(len(contracts))]
+        # A unique trailer defeats the result cache so every request parses
+        return path, code + f"\n// load {n}\n" if unique else code
+
+    def client():
+        while not stop.is_set():
+            if rate > 0:
+                scheduled = arrivals.get()
+                if scheduled is None:
+                    return
+                with recorder.lock:
+                    counts['taken'] += 1
+            else:
+                scheduled = time.perf_counter()
+            item = next_request()
+            if item is None:
+                stop.set()
+                return
+            status = send(url, item[0], item[1], timeout)
+            recorder.record((time.perf_counter() - scheduled) * 1000, status)
+
+    def schedule():
+        # Poisson arrivals; a backlog builds in the queue when clients cannot keep up
+        gaps = random.Random(seed + 1)
+        arrival = time.perf_counter()
+        while not stop.is_set():
+            arrival += gaps.expovariate(rate)
+            delay = arrival - time.perf_counter()
+            if delay > 0:
+                stop.wait(delay)
+            with recorder.lock:
+                counts['arrived'] += 1
+            arrivals.put(arrival)
+        for _ in range(concurrency):
+            arrivals.put(None)
+
+    def sample_processes():
+        while not stop.wait(0.5):
+            count = helper_processes()
+            if count is not None:
+                with recorder.lock:
+                    recorder.processes.append(count)
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    if rate > 0:
+        threads.append(threading.Thread(target=schedule, daemon=True))
+    sampler = threading.Thread(target=sample_processes, daemon=True)
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    sampler.start()
+    stop.wait(duration)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout + 1)
+    elapsed = time.perf_counter() - started
+
+    completed = len(recorder.latencies)
+    return {
+        "requests": completed,
+        "elapsedS": round(elapsed, 3),
+        "throughput": round(completed / elapsed, 2) if elapsed else 0,
+        "latencyMs": {
+            "p50": percentile(recorder.latencies, 50),
+            "p95": percentile(recorder.latencies, 95),
+            "p99": percentile(recorder.latencies, 99),
+            "max": round(max(recorder.latencies), 3) if recorder.latencies else None,
+        },
+        "statuses": recorder.statuses,
+        "errorRate": round(recorder.errors / completed, 4) if completed else 0,
+        "timeoutRate": round(recorder.timeouts / completed, 4) if completed else 0,
+        # Arrivals still waiting for a free client when the run ended (open loop only)
+        "backlog": counts['arrived'] - counts['taken'],
+        "helperProcesses": {
+            "max": max(recorder.processes) if recorder.processes else None,
+            "mean": round(sum(recorder.processes) / len(recorder.processes), 2) if recorder.processes else None,
+        },
+    }
+
+
+def start_server(port: int, stub_latency: Optional[float], env_overrides: Dict[str, str]) -> subprocess.Popen:
+    """Run the app without the reloader on port, optionally with the stub parser, and wait for /health"""
+    env = dict(os.environ, **env_overrides)
+    if stub_latency is not None:
+        env['NODE_HELPER_COMMAND'] = f'"{sys.executable}" "{STUB_PARSER}" --latency {stub_latency}'
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', str(port), '--no-reload', '--no-debugger'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited with status {proc.returncode}")
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/health', timeout=1):
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("Server did not become healthy within 30 s")
+
+
+def fetch_json(url: str) -> Optional[Dict[str, Any]]:
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return json.loads(response.read())
+    except (OSError, ValueError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay contracts against the backend at a given concurrency")
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help="base URL of a running instance")
+    parser.add_argument('--serve', action='store_true', help="start a local instance for the run")
+    parser.add_argument('--port', type=int, default=5055, help="port for --serve")
+    parser.add_argument('--stub-latency', type=float,
+                        help="with --serve: replace the Node helper by the stub parser with this latency (ms)")
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE',
+                        help="with --serve: extra server environment (repeatable)")
+    parser.add_argument('--contracts', nargs='*', default=[], help="Solidity files to replay")
+    parser.add_argument('--mix', default='analyze=3,cfg=1', help="endpoint weights, e.g. analyze=3,cfg=1")
+    parser.add_argument('--concurrency', type=int, default=50, help="concurrent clients")
+    parser.add_argument('--rate', type=float, default=0,
+                        help="arrivals per second (Poisson, open loop); 0 sends back to back")
+    parser.add_argument('--duration', type=float, default=30, help="seconds to run")
+    parser.add_argument('--requests', type=int, default=0, help="stop after this many requests (0 = no limit)")
+    parser.add_argument('--timeout', type=float, default=60, help="client timeout per request (s)")
+    parser.add_argument('--repeat-sources', action='store_true',
+                        help="send sources unchanged so repeats are served from the result cache")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    server = None
+    url = args.url.rstrip('/')
+    if args.serve:
+        server = start_server(args.port, args.stub_latency, dict(e.split('=', 1) for e in args.env))
+        url = f'http://127.0.0.1:{args.port}'
+    try:
+        contracts = load_contracts(args.contracts)
+        results = run_load(url, contracts, parse_mix(args.mix), args.concurrency, args.rate, args.duration,
+                           args.requests, args.timeout, not args.repeat_sources, args.seed)
+        report = {
+            "meta": {
+                "url": url,
+                "concurrency": args.concurrency,
+                "rate": args.rate,
+                "mix": args.mix,
+                "contracts": [name for name, _ in contracts],
+                "stubLatencyMs": args.stub_latency if args.serve else None,
+                "uniqueSources": not args.repeat_sources,
+                "python": platform.python_version(),
+                "timestamp": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            },
+            "results": results,
+            "parser": fetch_json(url + '/api/v1/parser/health'),
+        }
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    latency = results['latencyMs']
+    print(f"{results['requests']} requests, {results['throughput']}/s, p50 {latency['p50']} ms, "
+          f"p95 {latency['p95']} ms, p99 {latency['p99']} ms, errors {results['errorRate']:.2%}, "
+          f"timeouts {results['timeoutRate']:.2%}", file=sys.stderr)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
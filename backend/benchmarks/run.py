@@ -0,0 +1,201 @@
+"""
+Stage-by-stage timings for /cfg and /analyze on fixed and generated contracts
+Usage (from the backend directory):
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --functions 10,100,500 --repeat 5 --compare old.json
+Every stage is timed separately (Node spawn, parse, CFG build, helper round
+trip, each pattern rule, each CFG pass, annotation, JSON serialization) and
+reported as min/median/max milliseconds.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generate import ContractShape, generate_contract
+from node_pool import NodeWorker, parser_version
+from pipeline import annotate_cfg
+from rule_engine import PATTERN_RULES, RuleEngine
+from security_analyzer import ANALYZER_VERSION, CFG_RULES, SecurityAnalyzer
+from source_index import SourceIndex
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+FIXED_CASES = ('vulnerable_contract_examples.sol',)
+
+
+def _summary(samples: List[float]) -> Dict[str, float]:
+    return {
+        "min": round(min(samples), 3),
+        "median": round(statistics.median(samples), 3),
+        "max": round(max(samples), 3),
+    }
+
+
+def _timed(fn: Callable[[], Any], repeat: int) -> Tuple[Dict[str, float], Any]:
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return _summary(samples), result
+
+
+def bench_spawn(repeat: int) -> Dict[str, float]:
+    """Cold start of a Node worker up to its first answered ping"""
+    samples = []
+    for _ in range(repeat):
+        worker = NodeWorker()
+        start = time.perf_counter()
+        worker.start()
+        worker.ping(timeout=30)
+        samples.append((time.perf_counter() - start) * 1000)
+        worker.stop()
+    return _summary(samples)
+
+
+def bench_case(name: str, code: str, worker: NodeWorker, repeat: int, blocks: bool = False) -> Dict[str, Any]:
+    stages: Dict[str, Dict[str, float]] = {}
+    payload = {"code": code, "blocks": True} if blocks else {"code": code}
+
+    # Node side: parse and CFG build as measured inside the helper
+    profiles = [json.loads(worker.request(payload, timeout=300, op='profile')) for _ in range(repeat)]
+    if 'error' in profiles[0]:
+        raise RuntimeError(f"{name}: {profiles[0]['error']}")
+    stages["node.parse"] = _summary([p['parseMs'] for p in profiles])
+    stages["node.cfg"] = _summary([p['cfgMs'] for p in profiles])
+    stages["node.roundtrip"], raw = _timed(lambda: worker.request(payload, timeout=300), repeat)
+    stages["cfg.decode"], cfg = _timed(lambda: json.loads(raw), repeat)
+    nodes, edges = cfg.get('nodes', []), cfg.get('edges', [])
+
+    # Pattern rules, one engine per rule so each is timed on its own
+    stages["source.index"], index = _timed(lambda: SourceIndex(code), repeat)
+    for pattern_rule in PATTERN_RULES:
+        engine = RuleEngine([pattern_rule])
+        stages[f"rule.{pattern_rule.id}"], _ = _timed(lambda: engine.run_grouped(index), repeat)
+    stages["rules.all"], _ = _timed(lambda: RuleEngine(PATTERN_RULES).run_grouped(index), repeat)
+
+    # CFG passes
+    analyzer = SecurityAnalyzer()
+    analyzer.source_index = index
+    stages["cfg.unreachable-code"], _ = _timed(lambda: analyzer._check_unreachable_code(nodes, edges), repeat)
+    stages["cfg.infinite-loop"], _ = _timed(lambda: analyzer._check_infinite_loops(nodes, edges), repeat)
+    for rule_id in CFG_RULES:
+        def flow_pass(rule_id=rule_id):
+            # Fresh analyzer so the per-node line facts are rebuilt every sample
+            flow = SecurityAnalyzer()
+            flow.source_index = index
+            return flow.cfg_rule_checks()[rule_id](nodes, edges)
+        stages[f"cfg.{rule_id}"], _ = _timed(flow_pass, repeat)
+
+    stages["analyze.total"], result = _timed(lambda: SecurityAnalyzer().analyze(code, cfg_data=cfg), repeat)
+    stages["annotate"], _ = _timed(lambda: annotate_cfg(json.loads(raw), result['vulnerabilities']), repeat)
+    response = dict(result, cfg=cfg)
+    annotate_cfg(cfg, result['vulnerabilities'])
+    stages["json.serialize"], body = _timed(lambda: json.dumps(response, sort_keys=True), repeat)
+
+    return {
+        "name": name,
+        "lines": code.count('\n') + 1,
+        "bytes": len(code.encode('utf-8')),
+        "nodes": len(nodes),
+        "edges": len(edges),
+        "findings": len(result['vulnerabilities']),
+        "responseBytes": len(body),
+        "stages": stages,
+    }
+
+
+def build_cases(functions: List[int], args) -> List[Tuple[str, str, Dict[str, Any]]]:
+    cases = []
+    for filename in FIXED_CASES:
+        with open(os.path.join(REPO_ROOT, filename), encoding='utf-8') as f:
+            cases.append((filename, f.read(), {}))
+    for count in functions:
+        shape = ContractShape(count, args.statements, args.depth, args.loop_density,
+                              args.call_density, args.seed)
+        cases.append((f"generated-{count}", generate_contract(shape), shape.to_dict()))
+    return cases
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """Median ratio current/baseline for every stage present in both runs"""
+    old_cases = {case['name']: case for case in baseline.get('cases', [])}
+    lines = []
+    for case in current['cases']:
+        old = old_cases.get(case['name'])
+        if old is None:
+            continue
+        for stage, timing in case['stages'].items():
+            before = old['stages'].get(stage, {}).get('median')
+            if before:
+                lines.append(f"{case['name']:<36} {stage:<28} {before:>10.3f} -> {timing['median']:>10.3f} ms"
+                             f"  x{timing['median'] / before:.2f}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the CFG builder and security analyzer")
+    parser.add_argument('--functions', default='10,100,500',
+                        help="comma-separated function counts for generated contracts")
+    parser.add_argument('--statements', type=int, default=6, help="statements per block")
+    parser.add_argument('--depth', type=int, default=2, help="maximum if/loop nesting")
+    parser.add_argument('--loop-density', type=float, default=0.2)
+    parser.add_argument('--call-density', type=float, default=0.15)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5, help="samples per stage")
+    parser.add_argument('--blocks', action='store_true', help="build basic-block CFGs")
+    parser.add_argument('--output', help="write JSON results here instead of stdout")
+    parser.add_argument('--compare', help="earlier results file to print median ratios against")
+    args = parser.parse_args()
+
+    functions = [int(n) for n in args.functions.split(',') if n.strip()]
+    report: Dict[str, Any] = {
+        "meta": {
+            "analyzerVersion": ANALYZER_VERSION,
+            "parserVersion": parser_version(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "blocks": args.blocks,
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        },
+        "stages": {"node.spawn": bench_spawn(args.repeat)},
+        "cases": [],
+    }
+
+    worker = NodeWorker()
+    try:
+        for name, code, shape in build_cases(functions, args):
+            case = bench_case(name, code, worker, args.repeat, args.blocks)
+            if shape:
+                case["shape"] = shape
+            report["cases"].append(case)
+            print(f"{name}: {case['lines']} lines, {case['nodes']} nodes, "
+                  f"analyze {case['stages']['analyze.total']['median']} ms", file=sys.stderr)
+    finally:
+        worker.stop()
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        for line in compare(report, baseline):
+            print(line, file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Stand-in for node_helper/index.js with a fixed, configurable latency
+Speaks both helper protocols (one-shot JSON on stdin, and `--worker` framed
+responses) and answers every request shape the backend sends: single
+sources, bulk `files`, session `functions` snippets, compact format, ping
+and profile. The CFG is a coarse entry/body/exit graph per function taken
+from SourceIndex, so the analyzer still has real work to do, but no
+Solidity parser runs and the parse cost is exactly the configured latency.
+Usage:
+    NODE_HELPER_COMMAND="python /path/to/backend/benchmarks/stub_parser.py --latency 20" python app.py
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from source_index import SourceIndex
+from wire import compact_cfg
+
+
+_SLOT_OFFSET = 400
+_FUNCTION_STYLE = {"background": "#667eea", "color": "white", "border": "2px solid #764ba2",
+                   "fontWeight": "bold", "padding": "10px"}
+
+
+def build_cfg(code: str, prefix: str = '', slot: int = 0) -> Dict[str, Any]:
+    """Label, entry, body and exit nodes for every function of code"""
+    index = SourceIndex(code)
+    nodes: List[Dict[str, Any]] = []
+    edges: List[Dict[str, Any]] = []
+    x0 = y0 = slot * _SLOT_OFFSET
+    for span in index.functions:
+        name = span.name or span.kind
+        y = y0 + len(nodes) * 100
+        ids = [f"{prefix}node_{len(nodes) + i}" for i in range(4)]
+        nodes.extend([
+            {"id": ids[0], "type": "default", "position": {"x": x0 + 150, "y": y}, "style": dict(_FUNCTION_STYLE),
+             "data": {"label": f"Function: {name}", "startLine": span.start_line, "endLine": span.end_line}},
+            {"id": ids[1], "type": "entry", "position": {"x": x0 + 200, "y": y + 80},
+             "data": {"label": f"Entry: {name}", "startLine": span.start_line, "endLine": span.start_line}},
+            {"id": ids[2], "type": "default", "position": {"x": x0 + 200, "y": y + 180},
+             "data": {"label": "Expression", "startLine": span.body_start_line, "endLine": span.end_line}},
+            {"id": ids[3], "type": "exit", "position": {"x": x0 + 200, "y": y + 280},
+             "data": {"label": f"Exit: {name}", "startLine": span.end_line, "endLine": span.end_line}},
+        ])
+        edges.extend({"id": f"{a}-{b}", "source": a, "target": b, "type": "smoothstep"}
+                     for a, b in ((ids[1], ids[2]), (ids[2], ids[3])))
+    return {"nodes": nodes, "edges": edges}
+
+
+def handle(payload: Dict[str, Any], op: str = 'parse') -> Dict[str, Any]:
+    if op == 'ping':
+        return {"pong": True}
+    if op == 'profile':
+        cfg = build_cfg(payload.get('code') or '')
+        return {"parseMs": 0, "cfgMs": 0, "nodes": len(cfg['nodes']), "edges": len(cfg['edges'])}
+    if isinstance(payload.get('functions'), list):
+        return {"results": [dict(build_cfg(fn.get('code') or '', fn.get('prefix') or '', fn.get('slot') or 0),
+                                 key=fn.get('key'))
+                            for fn in payload['functions']]}
+    if isinstance(payload.get('files'), list):
+        return {"results": [{"path": f.get('path'), "cfg": handle(dict(payload, files=None, code=f.get('code')))}
+                            for f in payload['files']]}
+    if not payload.get('code'):
+        return {"error": "Missing 'code'"}
+    cfg = build_cfg(payload['code'])
+    return compact_cfg(cfg) if payload.get('format') == 'compact' else cfg
+
+
+def _sleep(latency: float, jitter: float):
+    delay = latency + (random.uniform(-jitter, jitter) if jitter else 0)
+    if delay > 0:
+        time.sleep(delay / 1000)
+
+
+def run_worker(latency: float, jitter: float):
+    out = sys.stdout.buffer
+    for line in sys.stdin.buffer:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        op = request.get('op', 'parse')
+        if op != 'ping':
+            _sleep(latency, jitter)
+        body = json.dumps(handle(request.get('payload') or {}, op)).encode('utf-8')
+        out.write(json.dumps({"id": request.get('id'), "ok": True, "length": len(body)}).encode('utf-8') + b'\n')
+        out.write(body)
+        out.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Node helper with a fixed parse latency")
+    parser.add_argument('--latency', type=float, default=20, help="milliseconds per parse request")
+    parser.add_argument('--jitter', type=float, default=0, help="uniform +/- milliseconds added to the latency")
+    parser.add_argument('--worker', action='store_true', help="framed worker protocol (as `index.js --worker`)")
+    args = parser.parse_args()
+    if args.worker:
+        run_worker(args.latency, args.jitter)
+        return
+    payload = json.loads(sys.stdin.read() or '{}')
+    _sleep(args.latency, args.jitter)
+    print(json.dumps(handle(payload)))
+
+
+if __name__ == '__main__':
+    main()
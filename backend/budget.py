@@ -0,0 +1,80 @@
+"""
+Per-request resource budgets
+A Budget bounds one request's wall time, source size, CFG size and the
+time any single detector may take. Stages check it cooperatively and,
+when it runs out, are skipped rather than failing the request; the result
+then carries `partial: true` and the names of the skipped stages.
+"""
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+
+TIME_BUDGET = float(os.environ.get('REQUEST_TIME_BUDGET', '30'))
+MAX_SOURCE_BYTES = int(os.environ.get('MAX_SOURCE_BYTES', str(5 * 1024 * 1024)))
+MAX_CFG_NODES = int(os.environ.get('MAX_CFG_NODES', '200000'))
+DETECTOR_TIME_SLICE = float(os.environ.get('DETECTOR_TIME_SLICE', '5'))
+# Share of the remaining time a parse may use, leaving the rest for the detectors
+PARSE_SHARE = 0.8
+
+
+class SourceTooLarge(ValueError):
+    """Raised when a source is over the byte budget; nothing useful can be returned"""
+
+
+class Budget:
+    """Limits for one request plus the stages skipped because one ran out (0 = unlimited)"""
+
+    __slots__ = ('deadline', 'max_bytes', 'max_nodes', 'detector_slice', 'skipped')
+
+    def __init__(self, seconds: float = TIME_BUDGET, max_bytes: int = MAX_SOURCE_BYTES,
+                 max_nodes: int = MAX_CFG_NODES, detector_slice: float = DETECTOR_TIME_SLICE):
+        self.deadline = time.monotonic() + seconds if seconds > 0 else None
+        self.max_bytes = max_bytes
+        self.max_nodes = max_nodes
+        self.detector_slice = detector_slice
+        self.skipped: List[str] = []
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None without a time limit"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def parse_timeout(self, default: float) -> float:
+        """Node timeout: default, shortened to the parse's share of the remaining time"""
+        remaining = self.remaining()
+        return default if remaining is None else min(default, remaining * PARSE_SHARE)
+
+    def check_source(self, code: str):
+        if self.max_bytes and len(code.encode('utf-8')) > self.max_bytes:
+            raise SourceTooLarge(f"Source is larger than {self.max_bytes} bytes")
+
+    def allows(self, stage: str, spent: float = 0.0) -> bool:
+        """
+        Whether stage may run, having already spent that many seconds; when
+        the request is out of time or the stage is past its detector slice,
+        it is recorded as skipped instead
+        """
+        if self.expired() or (self.detector_slice and spent > self.detector_slice):
+            self.skip(stage)
+            return False
+        return True
+
+    def skip(self, stage: str):
+        if stage not in self.skipped:
+            self.skipped.append(stage)
+
+    @property
+    def partial(self) -> bool:
+        return bool(self.skipped)
+
+    def annotate(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Add partial/skipped to a result when a budget ran out"""
+        if self.skipped:
+            result['partial'] = True
+            result['skipped'] = list(self.skipped)
+        return result
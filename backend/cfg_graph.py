@@ -0,0 +1,315 @@
+"""
+Compact integer-indexed views of a CFG for linear-time graph passes
+Node ids are mapped to 0..V-1 once and edges are stored CSR-style
+(offsets + targets arrays), so traversals and SCC search run in O(V + E)
+without recursion and scale to very large graphs. Node line spans get a
+sorted index for line -> node lookups.
+"""
+import bisect
+from array import array
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+class Loop:
+    """A strongly connected region of the CFG"""
+
+    __slots__ = ('header', 'members', 'exits')
+
+    def __init__(self, header: int, members: List[int], exits: List[int]):
+        self.header = header
+        self.members = members
+        # Edge indices (into the CFG's edge list) that leave the loop
+        self.exits = exits
+
+
+class CompactGraph:
+    """CSR adjacency over a CFG's nodes/edges"""
+
+    def __init__(self, nodes: List[Dict], edges: List[Dict], skip_hidden: bool = False):
+        self.nodes = nodes
+        self.ids = [node['id'] for node in nodes]
+        self.index: Dict[str, int] = {node_id: i for i, node_id in enumerate(self.ids)}
+        n = len(self.ids)
+
+        pairs = []
+        for e, edge in enumerate(edges):
+            if skip_hidden and edge.get('hidden'):
+                continue
+            source = self.index.get(edge.get('source'))
+            target = self.index.get(edge.get('target'))
+            if source is not None and target is not None:
+                pairs.append((source, target, e))
+
+        counts = [0] * (n + 1)
+        for source, _, _ in pairs:
+            counts[source + 1] += 1
+        for i in range(n):
+            counts[i + 1] += counts[i]
+        self.offsets = array('i', counts)
+
+        fill = list(counts[:n])
+        self.targets = array('i', bytes(4 * len(pairs)))
+        self.edge_ids = array('i', bytes(4 * len(pairs)))
+        for source, target, e in pairs:
+            slot = fill[source]
+            self.targets[slot] = target
+            self.edge_ids[slot] = e
+            fill[source] += 1
+
+        self._pred_offsets: Optional[array] = None
+        self._pred_sources: Optional[array] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.ids)
+
+    def successors(self, v: int) -> array:
+        return self.targets[self.offsets[v]:self.offsets[v + 1]]
+
+    def predecessor_csr(self) -> Tuple[array, array]:
+        """(offsets, sources) of the reversed graph, built on first use"""
+        if self._pred_offsets is None:
+            n = self.size
+            counts = [0] * (n + 1)
+            for w in self.targets:
+                counts[w + 1] += 1
+            for i in range(n):
+                counts[i + 1] += counts[i]
+            fill = list(counts[:n])
+            sources = array('i', bytes(4 * len(self.targets)))
+            offsets, targets = self.offsets, self.targets
+            for u in range(n):
+                for slot in range(offsets[u], offsets[u + 1]):
+                    w = targets[slot]
+                    sources[fill[w]] = u
+                    fill[w] += 1
+            self._pred_offsets = array('i', counts)
+            self._pred_sources = sources
+        return self._pred_offsets, self._pred_sources
+
+    def predecessors(self, v: int) -> array:
+        offsets, sources = self.predecessor_csr()
+        return sources[offsets[v]:offsets[v + 1]]
+
+    def reachable(self, sources: Iterable[int]) -> bytearray:
+        """Breadth-first reachability; returns a 0/1 flag per node"""
+        seen = bytearray(self.size)
+        queue = deque()
+        for s in sources:
+            if not seen[s]:
+                seen[s] = 1
+                queue.append(s)
+        offsets, targets = self.offsets, self.targets
+        while queue:
+            v = queue.popleft()
+            for slot in range(offsets[v], offsets[v + 1]):
+                w = targets[slot]
+                if not seen[w]:
+                    seen[w] = 1
+                    queue.append(w)
+        return seen
+
+    def sccs(self) -> List[List[int]]:
+        """Strongly connected components (iterative Tarjan), in reverse topological order"""
+        n = self.size
+        offsets, targets = self.offsets, self.targets
+        index = [-1] * n
+        low = [0] * n
+        on_stack = bytearray(n)
+        stack: List[int] = []
+        components: List[List[int]] = []
+        counter = 0
+
+        for root in range(n):
+            if index[root] != -1:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            work = [[root, offsets[root]]]
+            while work:
+                frame = work[-1]
+                v, pos = frame
+                if pos < offsets[v + 1]:
+                    frame[1] = pos + 1
+                    w = targets[pos]
+                    if index[w] == -1:
+                        index[w] = low[w] = counter
+                        counter += 1
+                        stack.append(w)
+                        on_stack[w] = 1
+                        work.append([w, offsets[w]])
+                    elif on_stack[w] and index[w] < low[v]:
+                        low[v] = index[w]
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    if low[v] < low[parent]:
+                        low[parent] = low[v]
+                if low[v] == index[v]:
+                    component = []
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = 0
+                        component.append(w)
+                        if w == v:
+                            break
+                    components.append(component)
+        return components
+
+    def back_edges(self) -> List[Tuple[int, int]]:
+        """(latch, header) pairs: edges into a node still on the DFS stack (iterative DFS)"""
+        n = self.size
+        offsets, targets = self.offsets, self.targets
+        pred_offsets, _ = self.predecessor_csr()
+        # 0 = unvisited, 1 = on stack, 2 = done
+        state = bytearray(n)
+        found = []
+        roots = [v for v in range(n) if pred_offsets[v] == pred_offsets[v + 1]]
+        for root in roots + list(range(n)):
+            if state[root]:
+                continue
+            state[root] = 1
+            work = [[root, offsets[root]]]
+            while work:
+                frame = work[-1]
+                v, pos = frame
+                if pos < offsets[v + 1]:
+                    frame[1] = pos + 1
+                    w = targets[pos]
+                    if state[w] == 0:
+                        state[w] = 1
+                        work.append([w, offsets[w]])
+                    elif state[w] == 1:
+                        found.append((v, w))
+                    continue
+                state[v] = 2
+                work.pop()
+        return found
+
+    def natural_loop(self, header: int, latches: Iterable[int]) -> List[int]:
+        """Header plus every node that reaches a latch without passing through the header"""
+        pred_offsets, pred_sources = self.predecessor_csr()
+        body = {header}
+        stack = [v for v in latches if v not in body]
+        body.update(stack)
+        while stack:
+            v = stack.pop()
+            for slot in range(pred_offsets[v], pred_offsets[v + 1]):
+                u = pred_sources[slot]
+                if u not in body:
+                    body.add(u)
+                    stack.append(u)
+        return sorted(body)
+
+    def loops(self) -> List[Loop]:
+        """Every cyclic SCC with its header node and exit edges"""
+        offsets, targets, edge_ids = self.offsets, self.targets, self.edge_ids
+        component_of = [-1] * self.size
+        components = self.sccs()
+        for c, component in enumerate(components):
+            for v in component:
+                component_of[v] = c
+
+        # One pass over all edges collects exits, entry points and self-loops
+        cyclic = [len(component) > 1 for component in components]
+        exits: Dict[int, List[int]] = {}
+        header: Dict[int, int] = {}
+        for u in range(self.size):
+            cu = component_of[u]
+            for slot in range(offsets[u], offsets[u + 1]):
+                w = targets[slot]
+                cw = component_of[w]
+                if cu == cw:
+                    if u == w:
+                        cyclic[cu] = True
+                    continue
+                exits.setdefault(cu, []).append(edge_ids[slot])
+                if w < header.get(cw, w + 1):
+                    header[cw] = w
+
+        loops = []
+        for c, component in enumerate(components):
+            if cyclic[c]:
+                loops.append(Loop(header.get(c, min(component)), sorted(component), exits.get(c, [])))
+        return loops
+
+
+class NodeSpanIndex:
+    """
+    Innermost CFG node containing a source line
+
+    Node line ranges come from AST locations, so they nest. One sorted
+    sweep flattens them into disjoint segments, each owned by its innermost
+    node (the earliest node wins between identical ranges); lookups are a
+    binary search.
+    """
+
+    def __init__(self, nodes: List[Dict]):
+        spans = []
+        for order, node in enumerate(nodes):
+            data = node.get('data') or {}
+            start = data.get('startLine')
+            if not isinstance(start, int):
+                continue
+            end = data.get('endLine')
+            if not isinstance(end, int) or end < start:
+                end = start
+            spans.append((start, -end, -order))
+        spans.sort()
+
+        self.ids = [node['id'] for node in nodes]
+        self._starts: List[int] = []
+        self._owners: List[int] = []
+        stack: List[Tuple[int, int]] = []
+        for start, neg_end, neg_order in spans:
+            while stack and stack[-1][0] < start:
+                self._pop(stack)
+            end = -neg_end
+            if stack and end > stack[-1][0]:
+                # Ranges that overlap without nesting are clipped to the parent
+                end = stack[-1][0]
+            stack.append((end, -neg_order))
+            self._mark(start, -neg_order)
+        while stack:
+            self._pop(stack)
+
+    def _mark(self, line: int, owner: int):
+        if self._starts and self._starts[-1] == line:
+            self._owners[-1] = owner
+        else:
+            self._starts.append(line)
+            self._owners.append(owner)
+
+    def _pop(self, stack: List[Tuple[int, int]]):
+        end, _ = stack.pop()
+        self._mark(end + 1, stack[-1][1] if stack else -1)
+
+    def index_at(self, line: int) -> int:
+        """Position (in the nodes list) of the innermost node spanning line, or -1"""
+        k = bisect.bisect_right(self._starts, line) - 1
+        return self._owners[k] if k >= 0 else -1
+
+    def node_at(self, line: int) -> Optional[str]:
+        owner = self.index_at(line)
+        return self.ids[owner] if owner >= 0 else None
+
+
+def split_functions(cfg: Dict[str, Any]) -> List[Tuple[Dict[str, Any], List[Dict[str, Any]], List[Dict[str, Any]]]]:
+    """(label node, nodes, edges) per function; the helper emits each function's nodes after its label"""
+    groups: List[Tuple[Dict[str, Any], List[Dict[str, Any]], List[Dict[str, Any]]]] = []
+    owner: Dict[str, int] = {}
+    for node in cfg.get('nodes', []):
+        if (node.get('data') or {}).get('label', '').startswith('Function:') or not groups:
+            groups.append((node, [], []))
+        groups[-1][1].append(node)
+        owner[node['id']] = len(groups) - 1
+    for edge in cfg.get('edges', []):
+        group = owner.get(edge.get('source'))
+        if group is not None:
+            groups[group][2].append(edge)
+    return groups
@@ -0,0 +1,156 @@
+"""
+Bitset dataflow over the CFG built by the Node helper
+Facts are bits of Python ints, so transfer and meet are single integer
+operations. A worklist solver runs forward or backward problems, with a
+union ("may") or intersection ("must") meet, to a fixpoint over the CSR
+graph. Statement facts come from the source lines each CFG node stands for.
+"""
+import re
+from collections import deque
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from cfg_graph import CompactGraph, NodeSpanIndex
+from source_index import SourceIndex
+
+
+# Nodes that only shape the graph; their line ranges belong to the statements inside
+STRUCTURAL_LABELS = ('True', 'False', 'Merge', 'Loop body', 'Exit loop')
+STRUCTURAL_PREFIXES = ('Entry:', 'Exit:', 'Function:')
+
+
+class Solution:
+    """Fact sets at the entry and exit of every node, in program order"""
+
+    __slots__ = ('entry', 'exit')
+
+    def __init__(self, entry: List[int], exit_: List[int]):
+        self.entry = entry
+        self.exit = exit_
+
+
+def solve(graph: CompactGraph, gen: Sequence[int], kill: Sequence[int], forward: bool = True,
+          may: bool = True, boundary: int = 0, universe: int = 0) -> Solution:
+    """
+    Iterate transfer(x) = gen | (x & ~kill) to a fixpoint
+
+    Forward: entry = meet of the predecessors' exits. Backward: exit = meet
+    of the successors' entries. Nodes without incoming flow get boundary;
+    must-problems start from universe (all facts) elsewhere.
+    """
+    n = graph.size
+    succ_offsets, succ_targets = graph.offsets, graph.targets
+    pred_offsets, pred_sources = graph.predecessor_csr()
+    if forward:
+        in_offsets, in_nodes, out_offsets, out_nodes = pred_offsets, pred_sources, succ_offsets, succ_targets
+    else:
+        in_offsets, in_nodes, out_offsets, out_nodes = succ_offsets, succ_targets, pred_offsets, pred_sources
+
+    start = 0 if may else universe
+    before = [start] * n
+    after = [start] * n
+    queued = bytearray(b'\x01' * n)
+    order = range(n) if forward else range(n - 1, -1, -1)
+    worklist = deque(order)
+
+    while worklist:
+        v = worklist.popleft()
+        queued[v] = 0
+        lo, hi = in_offsets[v], in_offsets[v + 1]
+        if lo == hi:
+            value = boundary
+        elif may:
+            value = 0
+            for slot in range(lo, hi):
+                value |= after[in_nodes[slot]]
+        else:
+            value = universe
+            for slot in range(lo, hi):
+                value &= after[in_nodes[slot]]
+        before[v] = value
+        result = gen[v] | (value & ~kill[v])
+        if result != after[v]:
+            after[v] = result
+            for slot in range(out_offsets[v], out_offsets[v + 1]):
+                w = out_nodes[slot]
+                if not queued[w]:
+                    queued[w] = 1
+                    worklist.append(w)
+
+    return Solution(before, after) if forward else Solution(after, before)
+
+
+def iter_bits(value: int) -> Iterator[int]:
+    """Indices of the set bits of value, lowest first"""
+    while value:
+        low = value & -value
+        yield low.bit_length() - 1
+        value ^= low
+
+
+def is_statement(node: Dict) -> bool:
+    label = (node.get('data') or {}).get('label', '')
+    return node.get('type') not in ('entry', 'exit') and label not in STRUCTURAL_LABELS \
+        and not label.startswith(STRUCTURAL_PREFIXES)
+
+
+class LineFacts:
+    """Source lines matching each predicate, attributed to the innermost statement node"""
+
+    def __init__(self, nodes: List[Dict], index: SourceIndex,
+                 predicates: Dict[str, Callable[[str], bool]]):
+        statements = [i for i, node in enumerate(nodes) if is_statement(node)]
+        owners = NodeSpanIndex([nodes[i] for i in statements])
+        covered = [(d.get('startLine'), d.get('endLine') or d.get('startLine'))
+                   for d in ((nodes[i].get('data') or {}) for i in statements)
+                   if isinstance(d.get('startLine'), int)]
+        lo = min((a for a, _ in covered), default=1)
+        hi = max((b for _, b in covered), default=0)
+
+        # predicate name -> [(line, node position)]
+        self.hits: Dict[str, List[Tuple[int, int]]] = {name: [] for name in predicates}
+        lines = index.masked_lines
+        for line_no in range(max(lo, 1), min(hi, len(lines)) + 1):
+            text = lines[line_no - 1]
+            matched = [name for name, test in predicates.items() if test(text)]
+            if not matched:
+                continue
+            owner = owners.index_at(line_no)
+            if owner < 0:
+                continue
+            for name in matched:
+                self.hits[name].append((line_no, statements[owner]))
+
+    def nodes_with(self, name: str) -> Dict[int, List[int]]:
+        """node position -> matching lines"""
+        found: Dict[int, List[int]] = {}
+        for line_no, node in self.hits[name]:
+            found.setdefault(node, []).append(line_no)
+        return found
+
+
+def state_write_predicate(index: SourceIndex, fallback: Callable[[str], bool]) -> Callable[[str], bool]:
+    """Assignment, ++/--, delete or push/pop on a declared state variable (or fallback)"""
+    names = index.state_variables()
+    if not names:
+        return fallback
+    alternation = '|'.join(re.escape(n) for n in sorted(names, key=len, reverse=True))
+    pattern = re.compile(
+        rf'(?<![\w.])(?:{alternation})\b(?:\s*\[[^\]]*\]|\s*\.\s*\w+)*\s*'
+        rf'(?:(?<![=!<>])=(?![=>])|\+=|-=|\*=|/=|%=|\|=|&=|\^=|<<=|>>=|\+\+|--|\.\s*(?:push|pop)\s*\()'
+        rf'|\bdelete\s+(?:{alternation})\b'
+        rf'|(?:\+\+|--)\s*(?:{alternation})\b'
+    )
+    return lambda text: bool(pattern.search(text)) or fallback(text)
+
+
+def loop_bodies(graph: CompactGraph) -> List[Tuple[int, List[int]]]:
+    """(header, body nodes) for every natural loop, one per header"""
+    latches: Dict[int, List[int]] = {}
+    for latch, header in graph.back_edges():
+        latches.setdefault(header, []).append(latch)
+    return [(header, graph.natural_loop(header, found)) for header, found in sorted(latches.items())]
+
+
+def first_line(nodes: List[Dict], position: int) -> Optional[int]:
+    line = (nodes[position].get('data') or {}).get('startLine')
+    return line if isinstance(line, int) else None
@@ -0,0 +1,170 @@
+"""
+Import resolution against local library trees and a store of analyzed units
+The Node helper only sees the string it is given, so `import` directives
+are resolved here against request-supplied sources and the directories
+in IMPORT_PATHS (a node_modules tree, vendored libraries), after
+Solidity-style remappings. Every imported unit is analyzed once per
+content hash and stored in the result cache, which persists with
+RESULT_CACHE_DB. A unit that is not in the store is analyzed per
+function, so functions shared with other files come from the function
+cache. Only changed files cost a parse.
+"""
+import json
+import os
+import posixpath
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from budget import MAX_SOURCE_BYTES, Budget
+from metrics import CACHE_LOOKUPS
+from node_pool import parser_version
+from result_cache import cache_key, get_cache
+from security_analyzer import ANALYZER_VERSION
+from sessions import analyze_by_function
+from source_index import mask_source
+
+
+IMPORT_PATHS = [p for p in os.environ.get('IMPORT_PATHS', '').split(os.pathsep) if p]
+IMPORT_MAX_UNITS = int(os.environ.get('IMPORT_MAX_UNITS', '500'))
+
+_IMPORT = re.compile(r'\bimport\b[^;]*;')
+_PATH = re.compile(r'"((?:\\.|[^"\\\n])*)"|\'((?:\\.|[^\'\\\n])*)\'')
+
+
+class RemappingError(ValueError):
+    """Raised when a remapping is not of the form prefix=target"""
+
+
+def parse_remappings(entries) -> List[Tuple[str, str]]:
+    """[(prefix, target)] from "prefix=target" strings, longest prefix first"""
+    if isinstance(entries, str):
+        entries = entries.replace(',', ' ').split()
+    if not isinstance(entries, list):
+        raise RemappingError("'remappings' must be a list of \"prefix=target\" strings")
+    remappings = []
+    for entry in entries:
+        if not isinstance(entry, str) or '=' not in entry:
+            raise RemappingError(f"Invalid remapping {entry!r}; expected \"prefix=target\"")
+        # Context-scoped remappings (context:prefix=target) apply everywhere here
+        prefix, target = entry.split('=', 1)
+        prefix = prefix.split(':', 1)[-1]
+        if prefix:
+            remappings.append((prefix, target))
+    return sorted(remappings, key=lambda r: len(r[0]), reverse=True)
+
+
+IMPORT_REMAPPINGS = parse_remappings(os.environ.get('IMPORT_REMAPPINGS', ''))
+
+
+def import_paths(code: str) -> List[str]:
+    """Paths named by the import directives of code, in order (commented-out ones excluded)"""
+    paths = []
+    for m in _IMPORT.finditer(mask_source(code)):
+        found = _PATH.search(code, m.start(), m.end())
+        if found:
+            paths.append(found.group(1) if found.group(1) is not None else found.group(2))
+    return paths
+
+
+class Resolver:
+    """Maps import paths to unit names and sources; reads files only inside the search roots"""
+
+    __slots__ = ('sources', 'roots', 'remappings')
+
+    def __init__(self, sources: Dict[str, str] = None, remappings: List[Tuple[str, str]] = None,
+                 roots: List[str] = None):
+        self.sources = {posixpath.normpath(path).lstrip('/'): code for path, code in (sources or {}).items()}
+        self.roots = [os.path.realpath(root) for root in (IMPORT_PATHS if roots is None else roots)]
+        self.remappings = sorted((remappings or []) + IMPORT_REMAPPINGS, key=lambda r: len(r[0]), reverse=True)
+
+    def name(self, path: str, importer: Optional[str]) -> str:
+        """Unit name of path as imported from importer: remapped, made relative and normalized"""
+        for prefix, target in self.remappings:
+            if path.startswith(prefix):
+                path = target + path[len(prefix):]
+                break
+        if path.startswith(('./', '../')) and importer:
+            path = posixpath.join(posixpath.dirname(importer), path)
+        return posixpath.normpath(path).lstrip('/')
+
+    def read(self, name: str) -> Optional[str]:
+        if name in self.sources:
+            return self.sources[name]
+        for root in self.roots:
+            full = os.path.realpath(os.path.join(root, name))
+            if os.path.commonpath([root, full]) != root or not os.path.isfile(full):
+                continue
+            if os.path.getsize(full) > MAX_SOURCE_BYTES:
+                return None
+            with open(full, encoding='utf-8', errors='replace') as f:
+                return f.read()
+        return None
+
+
+def _unit_key(code: str) -> str:
+    return cache_key('dependency', f"{parser_version()}/{ANALYZER_VERSION}", code)
+
+
+def analyze_unit(code: str) -> Tuple[Dict[str, Any], bool]:
+    """(summary, score, findings and import paths of a unit, whether it came from the store)"""
+    key = _unit_key(code)
+    body = get_cache().get(key)
+    CACHE_LOOKUPS.inc(kind='dependency', result='miss' if body is None else 'hit')
+    if body is not None:
+        return json.loads(body), True
+    result = analyze_by_function(code)
+    record = {
+        "summary": result['summary'],
+        "score": result['score'],
+        "vulnerabilities": result['vulnerabilities'],
+        "imports": import_paths(code),
+    }
+    if not result.get('errors'):
+        get_cache().put(key, json.dumps(record, sort_keys=True))
+    return record, False
+
+
+def resolve_imports(code: str, path: str = None, resolver: Resolver = None,
+                    budget: Budget = None) -> Dict[str, Any]:
+    """
+    Analyze everything code imports, transitively and depth first
+
+    Returns {"imports": [...], "unresolved": [...]}: one record per unit
+    (name, sourceId, whether it came from the store, summary, score,
+    findings) and one per import that matched no source or file. Past
+    IMPORT_MAX_UNITS units the result is marked 'truncated'; units left
+    when the budget runs out are skipped as 'import:<name>'.
+    """
+    resolver = resolver or Resolver()
+    root = posixpath.normpath(path).lstrip('/') if path else None
+    seen = {root} if root else set()
+    units: List[Dict[str, Any]] = []
+    unresolved: List[Dict[str, str]] = []
+    truncated = False
+    stack = [(p, root) for p in reversed(import_paths(code))]
+    while stack:
+        imported, importer = stack.pop()
+        name = resolver.name(imported, importer)
+        if name in seen:
+            continue
+        seen.add(name)
+        if len(units) >= IMPORT_MAX_UNITS:
+            # Nothing past the cap is read; no further units can add imports
+            truncated = True
+            break
+        source = resolver.read(name)
+        if source is None:
+            unresolved.append({"import": imported, "from": importer})
+            continue
+        if budget is not None and budget.expired():
+            budget.skip(f"import:{name}")
+            continue
+        record, stored = analyze_unit(source)
+        units.append(dict(record, path=name, sourceId=_unit_key(source).split(':', 1)[1], cached=stored))
+        stack.extend((p, name) for p in reversed(record['imports']))
+    for unit in units:
+        del unit['imports']
+    resolved = {"imports": units, "unresolved": unresolved}
+    if truncated:
+        resolved['truncated'] = True
+    return resolved
@@ -0,0 +1,133 @@
+"""
+Cross-source cache of per-function CFG fragments and findings
+Cloned code (library copies, flattened dependencies, forks) repeats the
+same function bodies. A function's CFG and its local findings depend only
+on its own text plus the contract state variables it mentions, so they
+are stored under a hash of those, with node ids, layout and lines made
+relative to the function, and remapped when another source has the same
+function. Optionally, parameters and locals are alpha-renamed first so
+copies that only rename variables share an entry.
+"""
+import hashlib
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from metrics import CACHE_LOOKUPS
+from node_pool import parser_version
+from result_cache import cache_key, get_cache
+from security_analyzer import ANALYZER_VERSION
+from source_index import SourceIndex, Span, mask_source, normalize_lines
+from vulnerability import Vulnerability
+
+
+RENAME_IDENTIFIERS = os.environ.get('FUNCTION_CACHE_RENAME', '').lower() in ('1', 'true', 'yes')
+
+# Column offset per layout slot used by the Node helper in session mode
+SLOT_OFFSET = 400
+_PREFIX = '{prefix}'
+
+_WORD = re.compile(r'(?<![\w.$])[A-Za-z_]\w*')
+# `Type [location] name` followed by = ; , or ) - parameters and local variables
+_DECLARATION = re.compile(
+    r'\b(?:u?int\d*|bool|address|bytes\d*|byte|string|u?fixed\w*|[A-Z]\w*)(?:\s*\[[^\]]*\])*'
+    r'(?:\s+(?:memory|storage|calldata|payable))*\s+([A-Za-z_]\w*)\s*(?=[=;,)])'
+)
+# Names some detector matches literally; renaming them would change its findings
+_LITERAL_NAMES = re.compile(r'^(?:only\w*|balances|now|msg|tx|block|this|super)$', re.IGNORECASE)
+
+
+def _alpha_rename(text: str, masked: str, keep: frozenset) -> str:
+    """Replace declared parameter/local names with _v0, _v1... in order of first use"""
+    declared = {m.group(1) for m in _DECLARATION.finditer(masked)}
+    declared = {name for name in declared if name not in keep and not _LITERAL_NAMES.match(name)}
+    if not declared:
+        return text
+    mapping: Dict[str, str] = {}
+
+    def rename(m: re.Match) -> str:
+        name = m.group()
+        if name not in declared:
+            return name
+        if name not in mapping:
+            mapping[name] = f"_v{len(mapping)}"
+        return mapping[name]
+    return _WORD.sub(rename, text)
+
+
+def mentioned_state(index: SourceIndex, text: str) -> List[str]:
+    """Sorted state variable names of index that appear as identifiers in text"""
+    return sorted(index.state_variables() & set(_WORD.findall(text)))
+
+
+def fragment_key(index: SourceIndex, span: Span, rename: bool = None) -> str:
+    """Cache key of a function's fragment: its normalized text plus the state variables it names"""
+    rename = RENAME_IDENTIFIERS if rename is None else rename
+    raw = index.code[span.start:span.end + 1]
+    text = normalize_lines(raw)
+    state = index.state_variables()
+    if rename:
+        text = _alpha_rename(text, mask_source(raw), state)
+    mentioned = mentioned_state(index, text)
+    version = f"{parser_version()}/{ANALYZER_VERSION}" + ('/renamed' if rename else '')
+    return cache_key('fragment', version, text + '\0' + ' '.join(mentioned))
+
+
+def _unprefix(value: Optional[str], prefix: str) -> Optional[str]:
+    return value.replace(prefix, _PREFIX) if isinstance(value, str) and prefix else value
+
+
+def _reprefix(value: Optional[str], prefix: str) -> Optional[str]:
+    return value.replace(_PREFIX, prefix) if isinstance(value, str) else value
+
+
+def _moved(node: Dict[str, Any], lines: int, dx: int, dy: int, ids) -> Dict[str, Any]:
+    data = dict(node.get('data') or {})
+    for field in ('startLine', 'endLine'):
+        if isinstance(data.get(field), int):
+            data[field] += lines
+    moved = dict(node, id=ids(node['id']), data=data)
+    if 'position' in node:
+        moved['position'] = {"x": node['position']['x'] + dx, "y": node['position']['y'] + dy}
+    return moved
+
+
+def store_fragment(key: str, prefix: str, slot: int, start_line: int, nodes: List[Dict[str, Any]],
+                   edges: List[Dict[str, Any]], findings: List[Tuple[str, Vulnerability]]):
+    """Save a function's CFG and findings relative to its first line, slot 0 and no id prefix"""
+    ids = lambda value: _unprefix(value, prefix)
+    offset = -slot * SLOT_OFFSET
+    relative = []
+    for rule_id, vuln in findings:
+        copy = Vulnerability(vuln.rule, vuln.line, ids(vuln.node_id), vuln.variant, **(vuln.params or {}))
+        copy.shift(-start_line)
+        relative.append([rule_id, copy.to_record()])
+    fragment = {
+        "nodes": [_moved(node, -start_line, offset, offset, ids) for node in nodes],
+        "edges": [dict(edge, id=ids(edge.get('id')), source=ids(edge.get('source')), target=ids(edge.get('target')))
+                  for edge in edges],
+        "findings": relative,
+    }
+    get_cache().put(key, json.dumps(fragment))
+
+
+def load_fragment(key: str, prefix: str, slot: int,
+                  start_line: int) -> Optional[Tuple[List[Dict], List[Dict], List[Tuple[str, Vulnerability]]]]:
+    """(nodes, edges, findings) of a stored fragment placed at start_line/slot/prefix, or None"""
+    body = get_cache().get(key)
+    CACHE_LOOKUPS.inc(kind='fragment', result='miss' if body is None else 'hit')
+    if body is None:
+        return None
+    fragment = json.loads(body)
+    ids = lambda value: _reprefix(value, prefix)
+    offset = slot * SLOT_OFFSET
+    nodes = [_moved(node, start_line, offset, offset, ids) for node in fragment['nodes']]
+    edges = [dict(edge, id=ids(edge.get('id')), source=ids(edge.get('source')), target=ids(edge.get('target')))
+             for edge in fragment['edges']]
+    findings = []
+    for rule_id, v in fragment['findings']:
+        vuln = Vulnerability.from_record(dict(v, nodeId=ids(v.get('nodeId'))))
+        vuln.shift(start_line)
+        findings.append((rule_id, vuln))
+    return nodes, edges, findings
@@ -0,0 +1,189 @@
+"""
+In-process job queue for large or slow analyses
+Jobs go to a priority lane ('interactive' or 'batch'), each lane has its
+own bounded set of worker threads, and finished results expire after a TTL.
+Batch workers help with interactive jobs when their own lane is empty, but
+interactive workers never pick up batch work.
+"""
+import os
+import queue
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+
+LANES = ('interactive', 'batch')
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when it has been cancelled"""
+
+
+class QueueFull(Exception):
+    """Raised when a lane already holds its maximum number of queued jobs"""
+
+
+class Job:
+    """A unit of work and its lifecycle"""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    def __init__(self, fn: Callable[['Job'], Any], lane: str):
+        self.id = uuid.uuid4().hex
+        self.fn = fn
+        self.lane = lane
+        self.status = Job.QUEUED
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def checkpoint(self):
+        """Call between stages of work; raises once the job is cancelled"""
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def to_dict(self, include_result: bool = True) -> Dict[str, Any]:
+        data = {
+            "id": self.id,
+            "lane": self.lane,
+            "status": self.status,
+            "createdAt": self.created,
+            "startedAt": self.started,
+            "finishedAt": self.finished,
+        }
+        if self.error:
+            data["error"] = self.error
+        if include_result and self.status == Job.DONE:
+            data["result"] = self.result
+        return data
+
+
+class JobQueue:
+    """Priority lanes with dedicated workers, cancellation and result TTL"""
+
+    def __init__(self, workers: Dict[str, int] = None, ttl: float = 600, max_queued: int = 1000):
+        workers = workers or {"interactive": 2, "batch": 1}
+        self.ttl = ttl
+        self.max_queued = max_queued
+        self._queues = {lane: queue.Queue() for lane in LANES}
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        for lane in LANES:
+            for i in range(workers.get(lane, 0)):
+                threading.Thread(target=self._work, args=(lane,), name=f"job-{lane}-{i}", daemon=True).start()
+
+    def submit(self, fn: Callable[[Job], Any], lane: str = 'interactive') -> Job:
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane '{lane}'")
+        if self._queues[lane].qsize() >= self.max_queued:
+            raise QueueFull(f"The {lane} queue is full")
+        job = Job(fn, lane)
+        with self._lock:
+            self._reap()
+            self._jobs[job.id] = job
+        self._queues[lane].put(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            self._reap()
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a queued job immediately; a running job stops at its next checkpoint"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job._cancel.set()
+        with self._lock:
+            if job.status == Job.QUEUED:
+                job.status = Job.CANCELLED
+                job.finished = time.time()
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._reap()
+            by_status: Dict[str, int] = {}
+            for job in self._jobs.values():
+                by_status[job.status] = by_status.get(job.status, 0) + 1
+        return {
+            "queued": {lane: q.qsize() for lane, q in self._queues.items()},
+            "jobs": by_status,
+        }
+
+    def _reap(self):
+        """Drop finished jobs older than the TTL (caller holds the lock)"""
+        cutoff = time.time() - self.ttl
+        expired = [jid for jid, job in self._jobs.items() if job.finished is not None and job.finished < cutoff]
+        for jid in expired:
+            del self._jobs[jid]
+
+    def _next_job(self, lane: str) -> Job:
+        if lane == 'batch':
+            # Idle batch workers help drain the interactive lane first
+            while True:
+                try:
+                    return self._queues['interactive'].get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    return self._queues['batch'].get(timeout=0.2)
+                except queue.Empty:
+                    continue
+        return self._queues[lane].get()
+
+    def _work(self, lane: str):
+        while True:
+            job = self._next_job(lane)
+            with self._lock:
+                if job.status != Job.QUEUED:
+                    continue
+                job.status = Job.RUNNING
+                job.started = time.time()
+            try:
+                job.checkpoint()
+                result = job.fn(job)
+                status, error = Job.DONE, None
+            except JobCancelled:
+                result, status, error = None, Job.CANCELLED, None
+            except Exception as e:
+                result, status, error = None, Job.FAILED, str(e)
+            with self._lock:
+                job.result = result
+                job.status = status
+                job.error = error
+                job.finished = time.time()
+                job.fn = None
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Return the process-wide job queue configured from the environment"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue(
+                workers={
+                    "interactive": int(os.environ.get('JOB_INTERACTIVE_WORKERS', '2')),
+                    "batch": int(os.environ.get('JOB_BATCH_WORKERS', '1')),
+                },
+                ttl=float(os.environ.get('JOB_RESULT_TTL', '600')),
+                max_queued=int(os.environ.get('JOB_MAX_QUEUED', '1000')),
+            )
+        return _queue
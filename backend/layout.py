@@ -0,0 +1,244 @@
+"""
+Layered (Sugiyama-style) CFG layout
+The Node helper places statements on a fixed 100 px grid, which overlaps
+on branchy code. This stage lays out each function on its own. Back
+edges are reversed to break loops, nodes are layered by longest path,
+long edges get dummy nodes, and barycenter sweeps reduce crossings (the
+best ordering seen is kept). Functions sit side by side at fixed-stride
+origins, each with a bounding box in its label node's `data.bounds`. A
+function's layout depends only on its own node kinds, labels and edges,
+so it is cached under a hash of those, and unchanged functions keep their
+coordinates across edits and sources.
+"""
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from cfg_graph import split_functions
+from metrics import CACHE_LOOKUPS
+from result_cache import cache_key, get_cache
+
+
+# 'helper' keeps the Node helper's positions; 'layered' runs layered_layout
+CFG_LAYOUT = os.environ.get('CFG_LAYOUT', 'helper').lower()
+LAYOUTS = ('helper', 'layered')
+LAYOUT_VERSION = '2'
+
+NODE_WIDTH = 170
+DUMMY_WIDTH = 20
+NODE_GAP = 40
+LAYER_HEIGHT = 100
+HEADER_HEIGHT = 80
+FUNCTION_GAP = 100
+# Functions start at multiples of this, so one function growing only moves those it overlaps
+FUNCTION_STRIDE = 4 * (NODE_WIDTH + NODE_GAP) + FUNCTION_GAP
+SWEEPS = 4
+
+# (x, y) per function node relative to the function's origin, width, height
+FunctionLayout = Tuple[List[Tuple[float, float]], float, float]
+
+
+def _acyclic(n: int, pairs: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """pairs with DFS back edges reversed, so the graph has no cycles"""
+    succ: List[List[int]] = [[] for _ in range(n)]
+    for s, t in pairs:
+        succ[s].append(t)
+    state = [0] * n  # 0 unseen, 1 on the DFS stack, 2 done
+    back = set()
+    for root in range(n):
+        if state[root]:
+            continue
+        state[root] = 1
+        stack = [(root, 0)]
+        while stack:
+            node, i = stack[-1]
+            if i < len(succ[node]):
+                stack[-1] = (node, i + 1)
+                target = succ[node][i]
+                if state[target] == 1:
+                    back.add((node, target))
+                elif state[target] == 0:
+                    state[target] = 1
+                    stack.append((target, 0))
+            else:
+                state[node] = 2
+                stack.pop()
+    return [(t, s) if (s, t) in back else (s, t) for s, t in pairs]
+
+
+def _layers(n: int, pairs: List[Tuple[int, int]]) -> List[int]:
+    """Longest-path layer of each node of a DAG (Kahn order)"""
+    succ: List[List[int]] = [[] for _ in range(n)]
+    indegree = [0] * n
+    for s, t in pairs:
+        succ[s].append(t)
+        indegree[t] += 1
+    layer = [0] * n
+    ready = [v for v in range(n) if indegree[v] == 0]
+    while ready:
+        node = ready.pop()
+        for target in succ[node]:
+            layer[target] = max(layer[target], layer[node] + 1)
+            indegree[target] -= 1
+            if indegree[target] == 0:
+                ready.append(target)
+    return layer
+
+
+def _crossings(edges: List[Tuple[int, int]], pos: List[int]) -> int:
+    """Crossings between two adjacent layers: inversions of the lower ends, via a Fenwick tree"""
+    if len(edges) < 2:
+        return 0
+    ordered = sorted(edges, key=lambda e: (pos[e[0]], pos[e[1]]))
+    size = max(pos[t] for _, t in edges) + 2
+    tree = [0] * size
+    count = 0
+    for seen, (_, t) in enumerate(ordered):
+        i = pos[t] + 1
+        below = 0
+        while i > 0:
+            below += tree[i]
+            i -= i & -i
+        count += seen - below
+        i = pos[t] + 1
+        while i < size:
+            tree[i] += 1
+            i += i & -i
+    return count
+
+
+def layout_function(n: int, pairs: List[Tuple[int, int]]) -> FunctionLayout:
+    """Positions for n nodes joined by pairs (local indices), top-down"""
+    if not n:
+        return [], 0, 0
+    dag = _acyclic(n, [(s, t) for s, t in pairs if s != t])
+    layer = _layers(n, dag)
+
+    # Split long edges with dummy nodes so every edge joins adjacent layers
+    width = [NODE_WIDTH] * n
+    up: List[List[int]] = [[] for _ in range(n)]
+    down: List[List[int]] = [[] for _ in range(n)]
+    for s, t in dag:
+        prev = s
+        for level in range(layer[s] + 1, layer[t]):
+            dummy = len(layer)
+            layer.append(level)
+            width.append(DUMMY_WIDTH)
+            up.append([])
+            down.append([])
+            down[prev].append(dummy)
+            up[dummy].append(prev)
+            prev = dummy
+        down[prev].append(t)
+        up[t].append(prev)
+
+    rows: List[List[int]] = [[] for _ in range(max(layer) + 1)]
+    for v in range(len(layer)):
+        rows[layer[v]].append(v)
+    pos = [0] * len(layer)
+
+    def number(row: List[int]):
+        for i, v in enumerate(row):
+            pos[v] = i
+
+    def total_crossings() -> int:
+        return sum(_crossings([(s, t) for s in rows[i] for t in down[s]], pos)
+                   for i in range(len(rows) - 1))
+
+    for row in rows:
+        number(row)
+    best = [list(row) for row in rows]
+    best_count = total_crossings()
+    for sweep in range(SWEEPS * 2):
+        downward = sweep % 2 == 0
+        order = range(1, len(rows)) if downward else range(len(rows) - 2, -1, -1)
+        for i in order:
+            row = rows[i]
+            neighbours = up if downward else down
+
+            def barycenter(v: int) -> float:
+                adjacent = neighbours[v]
+                return sum(pos[u] for u in adjacent) / len(adjacent) if adjacent else pos[v]
+            row.sort(key=barycenter)
+            number(row)
+        count = total_crossings()
+        if count < best_count:
+            best, best_count = [list(row) for row in rows], count
+        if not best_count:
+            break
+    rows = best
+
+    # Each node goes under the mean of its parents, then overlaps are pushed apart
+    x = [0.0] * len(layer)
+    for row in rows:
+        desired = [sum(x[u] for u in up[v]) / len(up[v]) if up[v] else 0.0 for v in row]
+        placed: List[float] = []
+        for i, v in enumerate(row):
+            target = desired[i]
+            if placed:
+                target = max(target, placed[-1] + (width[row[i - 1]] + width[v]) / 2 + NODE_GAP)
+            placed.append(target)
+        # Recentre the row over where its nodes wanted to be
+        shift = (sum(desired) - sum(placed)) / len(row)
+        for v, value in zip(row, placed):
+            x[v] = value + shift
+    left = min(x[v] - width[v] / 2 for v in range(len(layer)))
+    right = max(x[v] + width[v] / 2 for v in range(len(layer)))
+    positions = [(round(x[v] - left - NODE_WIDTH / 2, 1), float(layer[v] * LAYER_HEIGHT)) for v in range(n)]
+    return positions, round(right - left, 1), float(len(rows) * LAYER_HEIGHT)
+
+
+def _signature(nodes: List[Dict[str, Any]], pairs: List[Tuple[int, int]]) -> str:
+    shape = [[node.get('type'), (node.get('data') or {}).get('label')] for node in nodes]
+    return json.dumps([shape, pairs], separators=(',', ':'))
+
+
+def _cached_function(nodes: List[Dict[str, Any]], pairs: List[Tuple[int, int]]) -> FunctionLayout:
+    key = cache_key('layout', LAYOUT_VERSION, _signature(nodes, pairs))
+    cache = get_cache()
+    body = cache.get(key)
+    CACHE_LOOKUPS.inc(kind='layout', result='miss' if body is None else 'hit')
+    if body is not None:
+        stored = json.loads(body)
+        return [tuple(p) for p in stored['positions']], stored['width'], stored['height']
+    positions, width, height = layout_function(len(nodes), pairs)
+    cache.put(key, json.dumps({"positions": positions, "width": width, "height": height}))
+    return positions, width, height
+
+
+def layered_layout(cfg: Dict[str, Any], columns: Dict[str, int] = None) -> Dict[str, Any]:
+    """
+    Replace the positions of cfg's nodes with a layered layout, in place; returns cfg
+
+    Each function starts at column * FUNCTION_STRIDE, where columns maps a
+    function's label node id to a stable column (e.g. a session slot) and
+    defaults to the function's position in cfg. A function wider than the
+    stride pushes the columns after it right, by as much as it overflows.
+    """
+    columns = columns or {}
+    placed = []
+    for order, (label, nodes, edges) in enumerate(split_functions(cfg)):
+        header: Optional[Dict[str, Any]] = None
+        if (label.get('data') or {}).get('label', '').startswith('Function:'):
+            header, nodes = label, nodes[1:]
+        index = {node['id']: i for i, node in enumerate(nodes)}
+        pairs = sorted({(index[e['source']], index[e['target']]) for e in edges
+                        if not e.get('hidden') and e.get('source') in index and e.get('target') in index})
+        positions, width, height = _cached_function(nodes, pairs)
+        placed.append((columns.get(label['id'], order), order, header, nodes, positions,
+                       max(width, NODE_WIDTH), height))
+
+    right = None
+    for column, _, header, nodes, positions, width, height in sorted(placed, key=lambda p: p[:2]):
+        x0 = float(column * FUNCTION_STRIDE)
+        if right is not None:
+            x0 = max(x0, right + FUNCTION_GAP)
+        right = x0 + width
+        top = HEADER_HEIGHT if header is not None else 0
+        for node, (x, y) in zip(nodes, positions):
+            node['position'] = {"x": x0 + x, "y": top + y}
+        if header is not None:
+            header['position'] = {"x": x0 + (width - NODE_WIDTH) / 2, "y": 0}
+            header['data'] = dict(header.get('data') or {},
+                                  bounds={"x": x0, "y": 0, "width": width, "height": top + height})
+    return cfg
@@ -0,0 +1,216 @@
+"""
+Process-wide counters and latency histograms in the Prometheus text format
+Hot-path code wraps its work in `stage(name)`. Every stage feeds the
+cfgviz_stage_seconds histogram and, while a request is being profiled
+(`?profile=1`), that request's own stage breakdown as well.
+"""
+import contextvars
+import cProfile
+import io
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+LabelKey = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: LabelKey, extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        # Unlabelled counters are exported as 0 before their first increment
+        self._values: Dict[LabelKey, float] = {} if self.labels else {(): 0}
+        self._lock = threading.Lock()
+
+    def inc(self, value: float = 1, **labels):
+        key = tuple(str(labels.get(n, '')) for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels.get(n, '')) for n in self.labels)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_number(v)}" for key, v in items]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[LabelKey, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, '')) for n in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labels, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            labels = _format_labels(self.labels, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_number(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Ordered set of metrics rendered together at /metrics"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(Counter(
+    'cfgviz_requests_total', 'HTTP requests by endpoint and status', ('endpoint', 'method', 'status')))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'cfgviz_request_seconds', 'HTTP request latency (streamed responses: until the view returns)', ('endpoint',)))
+INPUT_BYTES = REGISTRY.register(Histogram(
+    'cfgviz_input_bytes', 'Request body size', ('endpoint',), buckets=SIZE_BUCKETS))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'cfgviz_stage_seconds', 'Time spent per pipeline stage', ('stage',)))
+NODE_TIMEOUTS = REGISTRY.register(Counter(
+    'cfgviz_node_timeouts_total', 'Node helper requests that timed out'))
+NODE_FAILURES = REGISTRY.register(Counter(
+    'cfgviz_node_failures_total', 'Node helper requests that failed (crash, bad output, busy pool)', ('reason',)))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    'cfgviz_cache_lookups_total', 'Result cache lookups by kind and outcome', ('kind', 'result')))
+
+
+class Profile:
+    """Per-request stage breakdown collected while `profiling()` is active"""
+
+    def __init__(self):
+        self.stages: Dict[str, List[float]] = {}
+        self.cprofile: Optional[str] = None
+
+    def add(self, name: str, seconds: float):
+        entry = self.stages.get(name)
+        if entry is None:
+            self.stages[name] = [seconds, 1]
+        else:
+            entry[0] += seconds
+            entry[1] += 1
+
+    def to_dict(self) -> Dict[str, object]:
+        data: Dict[str, object] = {
+            "stages": {name: {"ms": round(total * 1000, 3), "count": count}
+                       for name, (total, count) in self.stages.items()},
+        }
+        if self.cprofile is not None:
+            data["cprofile"] = self.cprofile
+        return data
+
+
+_active_profile: contextvars.ContextVar = contextvars.ContextVar('profile', default=None)
+
+
+def observe_stage(name: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=name)
+    profile = _active_profile.get()
+    if profile is not None:
+        profile.add(name, seconds)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the enclosed block as one pipeline stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+@contextmanager
+def profiling(cprofile: bool = False, top: int = 30) -> Iterator[Profile]:
+    """Collect the stages run by this thread; optionally also a cProfile summary"""
+    profile = Profile()
+    token = _active_profile.set(profile)
+    profiler = cProfile.Profile() if cprofile else None
+    if profiler is not None:
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active in this thread
+            profiler = None
+    try:
+        yield profile
+    finally:
+        _active_profile.reset(token)
+        if profiler is not None:
+            profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(top)
+            profile.cprofile = out.getvalue()
@@ -1,11 +1,17 @@
 import parser from '@solidity-parser/parser';
+import readline from 'readline';
 
 let nodeIdCounter = 0;
+let nodeIdPrefix = '';
+// Basic-block mode: consecutive simple statements share one node
+let blockMode = false;
 function getNodeId() {
-  return `node_${nodeIdCounter++}`;
+  return `${nodeIdPrefix}node_${nodeIdCounter++}`;
 }
-function resetNodeId() {
+// A prefix namespaces the ids of one function built on its own (session mode)
+function resetNodeId(prefix = '') {
   nodeIdCounter = 0;
+  nodeIdPrefix = prefix;
 }
 
 function getStatementLabel(stmt) {
@@ -34,6 +40,22 @@ function processStatements(statements, prevNodeId, exitId, xPosition, yPosition,
   return { lastNodeId: currentNodeId, yPosition: currentY };
 }
 
+// Single-entry marker nodes; in block mode they lead the block that follows them
+const BLOCK_MARKERS = new Set(['True', 'False', 'Loop body', 'Merge', 'Exit loop']);
+
+function markerData(label, startLine, endLine) {
+  return blockMode ? { label, startLine, endLine, statements: [] } : { label, startLine, endLine };
+}
+
+function blockLabel(data) {
+  const base = data.label.replace(/ \(\d+ statements?\)$/, '');
+  const count = data.statements.length;
+  if (BLOCK_MARKERS.has(base)) {
+    return `${base} (${count} statement${count === 1 ? '' : 's'})`;
+  }
+  return `Block (${count} statements)`;
+}
+
 function processIfStatement(stmt, prevNodeId, exitId, xPosition, yPosition, nodes, edges) {
   const conditionNodeId = getNodeId();
   nodes.push({
@@ -54,11 +76,7 @@ function processIfStatement(stmt, prevNodeId, exitId, xPosition, yPosition, node
   nodes.push({
     id: trueBranchId,
     type: 'default',
-    data: {
-      label: 'True',
-      startLine: stmt.trueBody?.loc?.start.line,
-      endLine: stmt.trueBody?.loc?.start.line,
-    },
+    data: markerData('True', stmt.trueBody?.loc?.start.line, stmt.trueBody?.loc?.start.line),
     position: { x: xPosition - 150, y: trueY },
     style: { background: '#e8f5e9' },
   });
@@ -80,11 +98,7 @@ function processIfStatement(stmt, prevNodeId, exitId, xPosition, yPosition, node
     nodes.push({
       id: falseBranchId,
       type: 'default',
-      data: {
-        label: 'False',
-        startLine: stmt.falseBody?.loc?.start.line,
-        endLine: stmt.falseBody?.loc?.start.line,
-      },
+      data: markerData('False', stmt.falseBody?.loc?.start.line, stmt.falseBody?.loc?.start.line),
       position: { x: xPosition + 150, y: falseY },
       style: { background: '#ffebee' },
     });
@@ -100,7 +114,7 @@ function processIfStatement(stmt, prevNodeId, exitId, xPosition, yPosition, node
   }
 
   const mergeNodeId = getNodeId();
-  nodes.push({ id: mergeNodeId, type: 'default', data: { label: 'Merge', startLine: stmt.loc?.end.line, endLine: stmt.loc?.end.line }, position: { x: xPosition, y: maxY } });
+  nodes.push({ id: mergeNodeId, type: 'default', data: markerData('Merge', stmt.loc?.end.line, stmt.loc?.end.line), position: { x: xPosition, y: maxY } });
   edges.push({ id: `${trueEndNodeId}-${mergeNodeId}`, source: trueEndNodeId, target: mergeNodeId, type: 'smoothstep' });
   if (stmt.falseBody) {
     edges.push({ id: `${falseEndNodeId}-${mergeNodeId}`, source: falseEndNodeId, target: mergeNodeId, type: 'smoothstep' });
@@ -123,7 +137,7 @@ function processLoopStatement(stmt, prevNodeId, exitId, xPosition, yPosition, no
 
   const bodyNodeId = getNodeId();
   const bodyY = yPosition + 100;
-  nodes.push({ id: bodyNodeId, type: 'default', data: { label: 'Loop body', startLine: stmt.body?.loc?.start.line, endLine: stmt.body?.loc?.end.line }, position: { x: xPosition - 100, y: bodyY } });
+  nodes.push({ id: bodyNodeId, type: 'default', data: markerData('Loop body', stmt.body?.loc?.start.line, stmt.body?.loc?.end.line), position: { x: xPosition - 100, y: bodyY } });
   edges.push({ id: `${conditionNodeId}-${bodyNodeId}`, source: conditionNodeId, target: bodyNodeId, type: 'smoothstep', label: 'true', style: { stroke: '#4caf50' } });
 
   let bodyEndNodeId = bodyNodeId;
@@ -136,12 +150,27 @@ function processLoopStatement(stmt, prevNodeId, exitId, xPosition, yPosition, no
   edges.push({ id: `${bodyEndNodeId}-${conditionNodeId}`, source: bodyEndNodeId, target: conditionNodeId, type: 'smoothstep', animated: true });
 
   const exitLoopNodeId = getNodeId();
-  nodes.push({ id: exitLoopNodeId, type: 'default', data: { label: 'Exit loop', startLine: stmt.loc?.end.line, endLine: stmt.loc?.end.line }, position: { x: xPosition + 100, y: yPosition + 100 } });
+  nodes.push({ id: exitLoopNodeId, type: 'default', data: markerData('Exit loop', stmt.loc?.end.line, stmt.loc?.end.line), position: { x: xPosition + 100, y: yPosition + 100 } });
   edges.push({ id: `${conditionNodeId}-${exitLoopNodeId}`, source: conditionNodeId, target: exitLoopNodeId, type: 'smoothstep', label: 'false', style: { stroke: '#f44336' } });
 
   return { lastNodeId: exitLoopNodeId, yPosition: bodyY + 200 };
 }
 
+// A simple statement or marker node gets its only successor when the next
+// statement is processed, so when that successor is a simple statement it can
+// join the same block: the block stays single-entry/single-exit.
+function appendToBlock(stmt, label, prevNodeId, nodes) {
+  const prev = nodes[nodes.length - 1];
+  if (!prev || prev.id !== prevNodeId || !prev.data.statements) {
+    return false;
+  }
+  const statement = { label, startLine: stmt.loc?.start.line, endLine: stmt.loc?.end.line };
+  prev.data.statements.push(statement);
+  prev.data.endLine = Math.max(prev.data.endLine || 0, statement.endLine || 0) || prev.data.endLine;
+  prev.data.label = blockLabel(prev.data);
+  return true;
+}
+
 function processStatement(stmt, prevNodeId, exitId, xPosition, yPosition, nodes, edges) {
   switch (stmt.type) {
     case 'IfStatement':
@@ -157,9 +186,19 @@ function processStatement(stmt, prevNodeId, exitId, xPosition, yPosition, nodes,
       return { lastNodeId: returnNodeId, yPosition: yPosition + 100 };
     }
     default: {
-      const nodeId = getNodeId();
       const label = getStatementLabel(stmt);
-      nodes.push({ id: nodeId, type: 'default', data: { label, startLine: stmt.loc?.start.line, endLine: stmt.loc?.end.line }, position: { x: xPosition, y: yPosition } });
+      if (blockMode) {
+        const merged = appendToBlock(stmt, label, prevNodeId, nodes);
+        if (merged) {
+          return { lastNodeId: prevNodeId, yPosition };
+        }
+      }
+      const nodeId = getNodeId();
+      const data = { label, startLine: stmt.loc?.start.line, endLine: stmt.loc?.end.line };
+      if (blockMode) {
+        data.statements = [{ label, startLine: data.startLine, endLine: data.endLine }];
+      }
+      nodes.push({ id: nodeId, type: 'default', data, position: { x: xPosition, y: yPosition } });
       edges.push({ id: `${prevNodeId}-${nodeId}`, source: prevNodeId, target: nodeId, type: 'smoothstep' });
       return { lastNodeId: nodeId, yPosition: yPosition + 100 };
     }
@@ -183,43 +222,215 @@ function buildCFGForFunction(functionNode, functionName) {
   if (currentNodeId !== exitId) {
     edges.push({ id: `${currentNodeId}-${exitId}`, source: currentNodeId, target: exitId, type: 'smoothstep' });
   }
+  if (blockMode) {
+    // Markers that no statement joined stay plain markers
+    nodes.forEach((node) => {
+      if (node.data.statements && node.data.statements.length === 0) {
+        delete node.data.statements;
+      }
+    });
+  }
   return { nodes, edges };
 }
 
 function parseSolidityCode(code) {
-  resetNodeId();
-  const ast = parser.parse(code, { loc: true, range: true });
-  const nodes = [];
-  const edges = [];
+  return buildCFG(parser.parse(code, { loc: true, range: true }));
+}
+
+function collectFunctionGraphs(ast) {
   const functionGraphs = [];
   parser.visit(ast, {
     FunctionDefinition(node) {
       const functionName = node.name || 'fallback';
       const cfg = buildCFGForFunction(node, functionName);
       if (cfg.nodes.length > 0) {
-        functionGraphs.push({ name: functionName, ...cfg });
+        functionGraphs.push({ name: functionName, startLine: node.loc?.start.line, endLine: node.loc?.end.line, ...cfg });
       }
     },
   });
+  return functionGraphs;
+}
 
-  let yOffset = 0;
-  functionGraphs.forEach((funcGraph, index) => {
-    const xOffset = index * 400;
-    const labelId = getNodeId();
-    nodes.push({
-      id: labelId,
-      type: 'default',
-      data: { label: `Function: ${funcGraph.name}`, startLine: 1, endLine: 1 },
-      position: { x: xOffset + 150, y: yOffset },
-      style: { background: '#667eea', color: 'white', border: '2px solid #764ba2', fontWeight: 'bold', padding: '10px' },
+// Places a function graph in its column (slot) behind a label node
+function layoutFunction(funcGraph, slot, nodes, edges) {
+  const xOffset = slot * 400;
+  const yOffset = slot * 400;
+  const labelId = getNodeId();
+  nodes.push({
+    id: labelId,
+    type: 'default',
+    data: { label: `Function: ${funcGraph.name}`, startLine: funcGraph.startLine, endLine: funcGraph.endLine },
+    position: { x: xOffset + 150, y: yOffset },
+    style: { background: '#667eea', color: 'white', border: '2px solid #764ba2', fontWeight: 'bold', padding: '10px' },
+  });
+  funcGraph.nodes.forEach((node) => {
+    nodes.push({ ...node, position: { x: node.position.x + xOffset, y: node.position.y + yOffset + 80 } });
+  });
+  edges.push(...funcGraph.edges);
+}
+
+function buildCFG(ast) {
+  resetNodeId();
+  const nodes = [];
+  const edges = [];
+  collectFunctionGraphs(ast).forEach((funcGraph, index) => layoutFunction(funcGraph, index, nodes, edges));
+  return { nodes, edges };
+}
+
+// Session mode: each entry is one function's source, padded with blank lines so
+// its line numbers match the full file, and is built under its own id prefix.
+function buildFunctionSnippets(functions) {
+  const results = functions.map((fn) => {
+    try {
+      resetNodeId(fn.prefix || '');
+      const ast = parser.parse(fn.code || '', { loc: true, range: true });
+      const nodes = [];
+      const edges = [];
+      collectFunctionGraphs(ast).forEach((funcGraph) => layoutFunction(funcGraph, fn.slot || 0, nodes, edges));
+      return { key: fn.key, nodes, edges };
+    } catch (err) {
+      return { key: fn.key, error: String(err && err.message ? err.message : err) };
+    }
+  });
+  resetNodeId();
+  return { results };
+}
+
+// Compact wire format: integer node ids (array positions), columnar node/edge
+// fields and a shared label table. Styles are left to the client, which derives
+// them from the node label and the edge label/flags.
+const COMPACT_KINDS = ['default', 'entry', 'exit'];
+const COMPACT_EDGE_LABELS = [null, 'true', 'false'];
+const EDGE_HIDDEN = 1;
+const EDGE_ANIMATED = 2;
+
+function toCompact(cfg) {
+  const index = new Map();
+  const strings = [];
+  const stringIndex = new Map();
+  const intern = (label) => {
+    if (!stringIndex.has(label)) {
+      stringIndex.set(label, strings.length);
+      strings.push(label);
+    }
+    return stringIndex.get(label);
+  };
+  const nodes = { kind: [], label: [], lines: [], x: [], y: [] };
+  // Basic blocks: statements of node i are offsets[i]..offsets[i + 1]
+  const statements = { offsets: [0], label: [], lines: [] };
+  cfg.nodes.forEach((node, i) => {
+    index.set(node.id, i);
+    const data = node.data || {};
+    nodes.kind.push(Math.max(0, COMPACT_KINDS.indexOf(node.type)));
+    nodes.label.push(intern(data.label || ''));
+    nodes.lines.push(data.startLine || 0, data.endLine || 0);
+    nodes.x.push(node.position?.x ?? 0);
+    nodes.y.push(node.position?.y ?? 0);
+    (data.statements || []).forEach((statement) => {
+      statements.label.push(intern(statement.label || ''));
+      statements.lines.push(statement.startLine || 0, statement.endLine || 0);
     });
-    funcGraph.nodes.forEach((node) => {
-      nodes.push({ ...node, position: { x: node.position.x + xOffset, y: node.position.y + yOffset + 80 } });
+    statements.offsets.push(statements.label.length);
+  });
+  const edges = { source: [], target: [], label: [], flags: [] };
+  cfg.edges.forEach((edge) => {
+    if (!index.has(edge.source) || !index.has(edge.target)) {
+      return;
+    }
+    edges.source.push(index.get(edge.source));
+    edges.target.push(index.get(edge.target));
+    edges.label.push(Math.max(0, COMPACT_EDGE_LABELS.indexOf(edge.label ?? null)));
+    edges.flags.push((edge.hidden ? EDGE_HIDDEN : 0) | (edge.animated ? EDGE_ANIMATED : 0));
+  });
+  const compact = { format: 'compact', version: 1, strings, nodes, edges };
+  if (statements.label.length) {
+    compact.statements = statements;
+  }
+  return compact;
+}
+
+function handleRequest(payload) {
+  blockMode = Boolean(payload.blocks);
+  if (Array.isArray(payload.functions)) {
+    return buildFunctionSnippets(payload.functions);
+  }
+  if (Array.isArray(payload.files)) {
+    // Bulk mode: one result per file, failures isolated to their own entry
+    const results = payload.files.map((file) => {
+      try {
+        return { path: file.path, cfg: handleRequest({ code: file.code, blocks: payload.blocks, format: payload.format }) };
+      } catch (err) {
+        return { path: file.path, error: String(err && err.message ? err.message : err) };
+      }
     });
-    edges.push(...funcGraph.edges);
-    yOffset += 400;
+    return { results };
+  }
+  const code = payload.code || '';
+  if (!code) {
+    return { error: "Missing 'code'" };
+  }
+  const cfg = parseSolidityCode(code);
+  return payload.format === 'compact' ? toCompact(cfg) : cfg;
+}
+
+// Times the parse and the CFG build separately (used by the benchmark suite)
+function profileRequest(payload) {
+  blockMode = Boolean(payload.blocks);
+  const code = payload.code || '';
+  if (!code) {
+    return { error: "Missing 'code'" };
+  }
+  const t0 = process.hrtime.bigint();
+  const ast = parser.parse(code, { loc: true, range: true });
+  const t1 = process.hrtime.bigint();
+  const cfg = buildCFG(ast);
+  const t2 = process.hrtime.bigint();
+  return {
+    parseMs: Number(t1 - t0) / 1e6,
+    cfgMs: Number(t2 - t1) / 1e6,
+    nodes: cfg.nodes.length,
+    edges: cfg.edges.length,
+  };
+}
+
+// Worker mode: one JSON request per line on stdin. Each response is framed as a
+// header line {"id", "ok", "length"} followed by exactly `length` bytes of JSON.
+function writeFrame(id, ok, body) {
+  const payload = Buffer.from(JSON.stringify(body), 'utf8');
+  const header = JSON.stringify({ id, ok, length: payload.length });
+  process.stdout.write(header + '\n');
+  process.stdout.write(payload);
+}
+
+function runWorker() {
+  const rl = readline.createInterface({ input: process.stdin, crlfDelay: Infinity });
+  rl.on('line', (line) => {
+    if (!line.trim()) {
+      return;
+    }
+    let request;
+    try {
+      request = JSON.parse(line);
+    } catch (err) {
+      writeFrame(null, false, { error: `Invalid request: ${err.message}` });
+      return;
+    }
+    const id = request.id ?? null;
+    try {
+      if (request.op === 'ping') {
+        writeFrame(id, true, { pong: true });
+        return;
+      }
+      if (request.op === 'profile') {
+        writeFrame(id, true, profileRequest(request.payload || {}));
+        return;
+      }
+      writeFrame(id, true, handleRequest(request.payload || {}));
+    } catch (err) {
+      writeFrame(id, false, { error: String(err && err.message ? err.message : err) });
+    }
   });
-  return { nodes, edges };
+  rl.on('close', () => process.exit(0));
 }
 
 async function main() {
@@ -232,13 +443,7 @@ async function main() {
       process.stdin.on('error', reject);
     });
     const payload = JSON.parse(input || '{}');
-    const code = payload.code || '';
-    if (!code) {
-      console.log(JSON.stringify({ error: "Missing 'code'" }));
-      process.exit(0);
-      return;
-    }
-    const result = parseSolidityCode(code);
+    const result = handleRequest(payload);
     console.log(JSON.stringify(result));
   } catch (err) {
     console.error(String(err && err.message ? err.message : err));
@@ -246,6 +451,8 @@ async function main() {
   }
 }
 
-main();
-
-
+if (process.argv.includes('--worker')) {
+  runWorker();
+} else {
+  main();
+}
@@ -0,0 +1,602 @@
+"""
+Node helper process management
+Keeps a pool of warm `node index.js --worker` processes so requests skip
+Node start-up and parser module load; one-shot spawning remains available.
+The Async* variants drive the same protocol from an asyncio event loop.
+"""
+import asyncio
+import collections
+import functools
+import hashlib
+import itertools
+import json
+import logging
+import os
+import queue
+import shlex
+import subprocess
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from metrics import NODE_FAILURES, NODE_TIMEOUTS, stage
+
+logger = logging.getLogger(__name__)
+
+# V8 old-space cap per Node process, so one huge source cannot exhaust the host (0 = Node's default)
+NODE_MAX_OLD_SPACE_MB = int(os.environ.get('NODE_MAX_OLD_SPACE_MB', '1024'))
+# Replaces `node index.js` (e.g. with benchmarks/stub_parser.py for load tests); arguments are appended
+NODE_HELPER_COMMAND = shlex.split(os.environ.get('NODE_HELPER_COMMAND', ''))
+
+
+class NodeHelperError(Exception):
+    """Raised when the Node helper cannot produce a result"""
+
+    def __init__(self, message: str, details: str = ''):
+        super().__init__(message)
+        self.details = details
+
+
+class NodeHelperTimeout(NodeHelperError):
+    """Raised when the Node helper does not answer in time"""
+
+
+class PoolBusy(NodeHelperError):
+    """Raised when every worker is busy for longer than the acquire timeout"""
+
+
+def node_helper_dir() -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'node_helper')
+
+
+def node_helper_entry() -> str:
+    return os.path.join(node_helper_dir(), 'index.js')
+
+
+def node_command(*args: str) -> List[str]:
+    """argv for a Node helper process with the configured heap cap (or NODE_HELPER_COMMAND)"""
+    if NODE_HELPER_COMMAND:
+        return [*NODE_HELPER_COMMAND, *args]
+    flags = [f'--max-old-space-size={NODE_MAX_OLD_SPACE_MB}'] if NODE_MAX_OLD_SPACE_MB > 0 else []
+    return ['node', *flags, node_helper_entry(), *args]
+
+
+@functools.lru_cache(maxsize=None)
+def parser_version() -> str:
+    """Version tag for cache keys: helper package version plus a hash of its entry point"""
+    with open(os.path.join(node_helper_dir(), 'package.json'), encoding='utf-8') as f:
+        package = json.load(f)
+    with open(node_helper_entry(), 'rb') as f:
+        entry_hash = hashlib.sha256(f.read()).hexdigest()[:12]
+    parser_dep = package.get('dependencies', {}).get('@solidity-parser/parser', '')
+    version = f"{package.get('version', '0')}+{parser_dep}+{entry_hash}"
+    if NODE_HELPER_COMMAND:
+        # A substitute helper must never share cache entries with the real one
+        version += '+cmd:' + hashlib.sha256(' '.join(NODE_HELPER_COMMAND).encode('utf-8')).hexdigest()[:12]
+    return version
+
+
+def run_oneshot(payload: Dict[str, Any], timeout: float = 30) -> str:
+    """Spawn a fresh Node process for a single request and return its raw JSON output"""
+    proc = subprocess.Popen(
+        node_command(),
+        cwd=node_helper_dir(),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        # Feed the code via stdin to avoid CLI length limits
+        stdout, stderr = proc.communicate(input=json.dumps(payload), timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.communicate()
+        raise NodeHelperTimeout("Node helper timed out")
+    if proc.returncode != 0:
+        raise NodeHelperError("Node helper failed", stderr.strip())
+    return stdout
+
+
+class NodeWorker:
+    """A single long-lived Node helper process speaking the framed protocol"""
+
+    _EOF = object()
+
+    def __init__(self, max_requests: int = 0):
+        self.max_requests = max_requests
+        self.served = 0
+        self._proc: Optional[subprocess.Popen] = None
+        self._responses: queue.Queue = queue.Queue()
+        self._stderr = collections.deque(maxlen=50)
+        self._ids = itertools.count(1)
+
+    def start(self):
+        with stage('node.spawn'):
+            self._proc = subprocess.Popen(
+                node_command('--worker'),
+                cwd=node_helper_dir(),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        self._responses = queue.Queue()
+        self.served = 0
+        threading.Thread(target=self._read_frames, args=(self._proc, self._responses), daemon=True).start()
+        threading.Thread(target=self._read_stderr, args=(self._proc,), daemon=True).start()
+
+    def _read_frames(self, proc: subprocess.Popen, responses: queue.Queue):
+        try:
+            while True:
+                header_line = proc.stdout.readline()
+                if not header_line:
+                    break
+                header = json.loads(header_line)
+                body = proc.stdout.read(header['length'])
+                responses.put((header, body.decode('utf-8')))
+        except (ValueError, KeyError, OSError) as e:
+            logger.warning("Node worker produced an invalid frame: %s", e)
+        responses.put(self._EOF)
+
+    def _read_stderr(self, proc: subprocess.Popen):
+        for line in proc.stderr:
+            self._stderr.append(line.decode('utf-8', 'replace').rstrip())
+
+    @property
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    @property
+    def exhausted(self) -> bool:
+        return bool(self.max_requests) and self.served >= self.max_requests
+
+    def request(self, payload: Dict[str, Any], timeout: float = 30, op: str = 'parse') -> str:
+        """Send one request and return the raw JSON body of the response"""
+        if not self.alive:
+            self.start()
+        request_id = next(self._ids)
+        line = json.dumps({"id": request_id, "op": op, "payload": payload}) + '\n'
+        try:
+            self._proc.stdin.write(line.encode('utf-8'))
+            self._proc.stdin.flush()
+        except OSError as e:
+            self.stop()
+            raise NodeHelperError("Node worker is not accepting requests", str(e))
+
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                frame = self._responses.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                # A stuck worker cannot be trusted with the next request
+                self.stop()
+                raise NodeHelperTimeout("Node helper timed out")
+            if frame is self._EOF:
+                details = '\n'.join(self._stderr)
+                self.stop()
+                raise NodeHelperError("Node helper failed", details)
+            header, body = frame
+            if header.get('id') != request_id:
+                # Stale answer to a request that already timed out
+                continue
+            self.served += 1
+            if not header.get('ok'):
+                try:
+                    details = json.loads(body).get('error', body)
+                except ValueError:
+                    details = body
+                raise NodeHelperError("Node helper failed", details)
+            return body
+
+    def ping(self, timeout: float = 5) -> bool:
+        try:
+            self.request({}, timeout=timeout, op='ping')
+            self.served -= 1
+            return True
+        except NodeHelperError:
+            return False
+
+    def stop(self):
+        if self._proc is None:
+            return
+        proc, self._proc = self._proc, None
+        try:
+            proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            proc.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+
+class NodeWorkerPool:
+    """Fixed-size pool of Node workers with restart, recycling and back-pressure"""
+
+    def __init__(self, size: int = 2, max_requests: int = 500, acquire_timeout: float = 5,
+                 health_interval: float = 30):
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(NodeWorker(max_requests=max_requests))
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "restarts": 0, "timeouts": 0, "busy": 0}
+        self._closed = threading.Event()
+        if health_interval > 0:
+            threading.Thread(target=self._health_loop, args=(health_interval,), daemon=True).start()
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _acquire(self) -> NodeWorker:
+        try:
+            return self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            self._count('busy')
+            raise PoolBusy("All Node workers are busy")
+
+    def _release(self, worker: NodeWorker):
+        if worker.exhausted:
+            # Recycle long-lived workers to bound memory growth in Node
+            worker.stop()
+        self._idle.put(worker)
+
+    def request(self, payload: Dict[str, Any], timeout: float = 30) -> str:
+        worker = self._acquire()
+        try:
+            if not worker.alive and worker.served:
+                self._count('restarts')
+            self._count('requests')
+            return worker.request(payload, timeout=timeout)
+        except NodeHelperTimeout:
+            self._count('timeouts')
+            raise
+        finally:
+            self._release(worker)
+
+    def check_health(self):
+        """Ping idle workers and stop the ones that do not answer"""
+        for _ in range(self.size):
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                if worker.alive and not worker.ping():
+                    logger.warning("Node worker failed health check; restarting on next use")
+                    worker.stop()
+            finally:
+                self._idle.put(worker)
+
+    def _health_loop(self, interval: float):
+        while not self._closed.wait(interval):
+            self.check_health()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({"size": self.size, "idle": self._idle.qsize()})
+        return stats
+
+    def close(self):
+        self._closed.set()
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                return
+
+
+class NodeParser:
+    """Front door for parse requests: pooled workers or one-shot processes"""
+
+    def __init__(self, mode: str = 'pool', timeout: float = 30, pool: NodeWorkerPool = None):
+        self.mode = mode
+        self.timeout = timeout
+        self.pool = pool if mode == 'pool' else None
+        if mode == 'pool' and self.pool is None:
+            self.pool = NodeWorkerPool()
+
+    def parse(self, payload: Dict[str, Any], timeout: float = None) -> str:
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            with stage('node.parse'):
+                if self.pool is None:
+                    return run_oneshot(payload, timeout=timeout)
+                return self.pool.request(payload, timeout=timeout)
+        except NodeHelperTimeout:
+            NODE_TIMEOUTS.inc()
+            raise
+        except PoolBusy:
+            NODE_FAILURES.inc(reason='busy')
+            raise
+        except NodeHelperError:
+            NODE_FAILURES.inc(reason='error')
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": self.mode, **(self.pool.stats() if self.pool else {})}
+
+
+_parser: Optional[NodeParser] = None
+_parser_lock = threading.Lock()
+
+
+def get_parser() -> NodeParser:
+    """Return the process-wide parser configured from the environment"""
+    global _parser
+    with _parser_lock:
+        if _parser is None:
+            mode = os.environ.get('NODE_HELPER_MODE', 'pool')
+            timeout = float(os.environ.get('NODE_HELPER_TIMEOUT', '30'))
+            pool = None
+            if mode == 'pool':
+                pool = NodeWorkerPool(
+                    size=int(os.environ.get('NODE_POOL_SIZE', '2')),
+                    max_requests=int(os.environ.get('NODE_POOL_MAX_REQUESTS', '500')),
+                    acquire_timeout=float(os.environ.get('NODE_POOL_ACQUIRE_TIMEOUT', '5')),
+                    health_interval=float(os.environ.get('NODE_POOL_HEALTH_INTERVAL', '30')),
+                )
+            _parser = NodeParser(mode=mode, timeout=timeout, pool=pool)
+        return _parser
+
+
+async def run_oneshot_async(payload: Dict[str, Any], timeout: float = 30) -> str:
+    """run_oneshot without blocking the event loop"""
+    proc = await asyncio.create_subprocess_exec(
+        *node_command(),
+        cwd=node_helper_dir(),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(json.dumps(payload).encode('utf-8')), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        raise NodeHelperTimeout("Node helper timed out")
+    if proc.returncode != 0:
+        raise NodeHelperError("Node helper failed", stderr.decode('utf-8', 'replace').strip())
+    return stdout.decode('utf-8')
+
+
+class _WorkerRestarted(NodeHelperError):
+    """A request was written to a worker that was restarted for another request's timeout"""
+
+
+class AsyncNodeWorker:
+    """
+    A Node worker driven from the event loop; requests are pipelined
+
+    The helper answers requests in order, each frame tagged with its id,
+    so several requests can be written before the first answer arrives.
+    At most max_in_flight are written at once; the rest wait in Python.
+    A request's timeout runs from when the helper starts on it (the
+    answer to the request ahead of it). A timeout restarts the process;
+    the requests written behind the stuck one are sent again, once.
+    """
+
+    def __init__(self, max_requests: int = 0, max_in_flight: int = 4):
+        self.max_requests = max_requests
+        self.max_in_flight = max(1, max_in_flight)
+        self.served = 0
+        self.pending: Dict[int, asyncio.Future] = {}
+        # Requests waiting for one of the max_in_flight slots
+        self.waiting = 0
+        self._proc: Optional[asyncio.subprocess.Process] = None
+        self._stderr = collections.deque(maxlen=50)
+        self._ids = itertools.count(1)
+        self._start_lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        # Future of the last request written; the helper starts on the next one when it resolves
+        self._last: Optional[asyncio.Future] = None
+
+    @property
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.returncode is None
+
+    @property
+    def load(self) -> int:
+        """Requests written and not yet answered, plus those waiting for a slot"""
+        return len(self.pending) + self.waiting
+
+    @property
+    def exhausted(self) -> bool:
+        return bool(self.max_requests) and self.served + self.load >= self.max_requests
+
+    async def start(self):
+        with stage('node.spawn'):
+            self._proc = await asyncio.create_subprocess_exec(
+                *node_command('--worker'),
+                cwd=node_helper_dir(),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        self.served = 0
+        asyncio.ensure_future(self._read_frames(self._proc))
+        asyncio.ensure_future(self._read_stderr(self._proc))
+
+    async def _read_frames(self, proc: asyncio.subprocess.Process):
+        try:
+            while True:
+                header_line = await proc.stdout.readline()
+                if not header_line:
+                    break
+                header = json.loads(header_line)
+                body = await proc.stdout.readexactly(header['length'])
+                future = self.pending.pop(header.get('id'), None)
+                if future is not None and not future.done():
+                    future.set_result((header, body.decode('utf-8')))
+        except (ValueError, KeyError, OSError, asyncio.IncompleteReadError) as e:
+            logger.warning("Node worker produced an invalid frame: %s", e)
+        if proc is self._proc:
+            self._fail_pending(NodeHelperError("Node helper failed", '\n'.join(self._stderr)))
+
+    async def _read_stderr(self, proc: asyncio.subprocess.Process):
+        async for line in proc.stderr:
+            self._stderr.append(line.decode('utf-8', 'replace').rstrip())
+
+    def _fail_pending(self, error: NodeHelperError):
+        pending, self.pending = self.pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    async def request(self, payload: Dict[str, Any], timeout: float = 30, op: str = 'parse') -> str:
+        """Send one request and return the raw JSON body of the response"""
+        # Counted before any await so concurrent callers see this worker as busy
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            try:
+                return await self._send(payload, timeout, op)
+            except _WorkerRestarted:
+                return await self._send(payload, timeout, op)
+        finally:
+            self._slots.release()
+
+    async def _send(self, payload: Dict[str, Any], timeout: float, op: str) -> str:
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        ahead, self._last = self._last, future
+        line = json.dumps({"id": request_id, "op": op, "payload": payload}) + '\n'
+        try:
+            if not self.alive:
+                async with self._start_lock:
+                    if not self.alive:
+                        await self.start()
+            self._proc.stdin.write(line.encode('utf-8'))
+            await self._proc.stdin.drain()
+        except OSError as e:
+            self.pending.pop(request_id, None)
+            await self.stop(kill=True)
+            raise NodeHelperError("Node worker is not accepting requests", str(e))
+
+        # Time spent behind the request ahead is not this request's
+        if ahead is not None and not ahead.done():
+            await asyncio.wait([ahead, future], return_when=asyncio.FIRST_COMPLETED)
+        try:
+            header, body = await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.pending.pop(request_id, None)
+            # A stuck worker cannot be trusted with the requests written behind this one
+            await self.stop(kill=True, error=_WorkerRestarted("Node worker restarted after a timeout"))
+            raise NodeHelperTimeout("Node helper timed out")
+        self.served += 1
+        if not header.get('ok'):
+            try:
+                details = json.loads(body).get('error', body)
+            except ValueError:
+                details = body
+            raise NodeHelperError("Node helper failed", details)
+        return body
+
+    async def stop(self, kill: bool = False, error: NodeHelperError = None):
+        """Close the worker's stdin and wait briefly for it to exit; kill skips the wait"""
+        if self._proc is None:
+            return
+        proc, self._proc = self._proc, None
+        self._last = None
+        self._fail_pending(error or NodeHelperError("Node worker stopped"))
+        try:
+            proc.stdin.close()
+        except OSError:
+            pass
+        if not kill:
+            try:
+                await asyncio.wait_for(proc.wait(), 1)
+                return
+            except asyncio.TimeoutError:
+                pass
+        if proc.returncode is None:
+            proc.kill()
+        await proc.wait()
+
+    async def close_when_idle(self):
+        """Stop once the requests already sent or waiting for a slot have been answered"""
+        # Slots are handed out in order, so holding all of them means the waiters went first
+        for _ in range(self.max_in_flight):
+            await self._slots.acquire()
+        await self.stop()
+
+
+class AsyncNodeParser:
+    """
+    Event-loop front door for parse requests, for the ASGI app
+
+    Pool mode keeps NODE_POOL_SIZE pipelined workers, each with at most
+    max_in_flight requests written to it, and sends each request to the
+    one with the fewest outstanding or waiting requests; one-shot mode
+    spawns a process per request. Waiting on Node never holds a thread.
+    """
+
+    def __init__(self, mode: str = 'pool', timeout: float = 30, size: int = 2, max_requests: int = 500,
+                 max_in_flight: int = 4):
+        self.mode = mode
+        self.timeout = timeout
+        self.max_requests = max_requests
+        self.max_in_flight = max_in_flight
+        self.workers = [AsyncNodeWorker(max_requests, max_in_flight) for _ in range(size)] if mode == 'pool' else []
+        self._stats = {"requests": 0, "restarts": 0, "timeouts": 0}
+
+    async def parse(self, payload: Dict[str, Any], timeout: float = None) -> str:
+        timeout = self.timeout if timeout is None else timeout
+        self._stats["requests"] += 1
+        try:
+            with stage('node.parse'):
+                if not self.workers:
+                    return await run_oneshot_async(payload, timeout=timeout)
+                slot = min(range(len(self.workers)), key=lambda i: self.workers[i].load)
+                worker = self.workers[slot]
+                if worker.exhausted:
+                    # Recycle: new requests go to a fresh process, the old one drains and exits
+                    asyncio.ensure_future(worker.close_when_idle())
+                    worker = self.workers[slot] = AsyncNodeWorker(self.max_requests, self.max_in_flight)
+                    self._stats["restarts"] += 1
+                return await worker.request(payload, timeout=timeout)
+        except NodeHelperTimeout:
+            self._stats["timeouts"] += 1
+            NODE_TIMEOUTS.inc()
+            raise
+        except NodeHelperError:
+            NODE_FAILURES.inc(reason='error')
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            **self._stats,
+            "size": len(self.workers),
+            "inFlight": sum(len(worker.pending) for worker in self.workers),
+            "waiting": sum(worker.waiting for worker in self.workers),
+        }
+
+    async def close(self):
+        await asyncio.gather(*(worker.stop() for worker in self.workers))
+
+
+_async_parser: Optional[AsyncNodeParser] = None
+
+
+def get_async_parser() -> AsyncNodeParser:
+    """The event loop's parser, configured like get_parser() (call from the loop thread)"""
+    global _async_parser
+    if _async_parser is None:
+        parser = get_parser()
+        _async_parser = AsyncNodeParser(
+            mode=parser.mode,
+            timeout=parser.timeout,
+            size=int(os.environ.get('NODE_POOL_SIZE', '2')),
+            max_requests=int(os.environ.get('NODE_POOL_MAX_REQUESTS', '500')),
+            max_in_flight=int(os.environ.get('NODE_POOL_PIPELINE', '4')),
+        )
+    return _async_parser
@@ -0,0 +1,210 @@
+"""
+Analysis process pool and parallel detector execution for large sources
+One source is split into independent tasks: the pattern rules over the
+whole text, the dataflow rules over chunks of whole functions (functions
+are disjoint in the CFG) and the CFG passes. Tasks are pure - inputs in,
+findings out - and their results are merged in report order, so the
+output matches a serial SecurityAnalyzer run exactly.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from budget import Budget
+from cfg_graph import CompactGraph, split_functions
+from security_analyzer import CFG_PASSES, CFG_RULES, SecurityAnalyzer, merge_flow, uncovered_ranges
+from source_index import SourceIndex
+from vulnerability import Vulnerability
+
+
+# Sources with at least this many lines are analyzed across the pool (0 disables)
+PARALLEL_MIN_LINES = int(os.environ.get('PARALLEL_MIN_LINES', '0'))
+# Longest wait for the tasks of one source when the request sets no time budget
+PARALLEL_TASK_TIMEOUT = float(os.environ.get('PARALLEL_TASK_TIMEOUT', '300'))
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Process pool sized to the machine's cores (ANALYSIS_WORKERS overrides)"""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None:
+            _executor_workers = int(os.environ.get('ANALYSIS_WORKERS', '0')) or os.cpu_count() or 1
+            # spawn: the server process runs helper threads that must not be forked
+            _executor = ProcessPoolExecutor(max_workers=_executor_workers,
+                                            mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+
+def submit(fn: Callable, *args) -> Future:
+    """Submit to the pool, replacing it once if a worker died (e.g. OOM)"""
+    global _executor
+    try:
+        return get_executor().submit(fn, *args)
+    except BrokenProcessPool:
+        with _executor_lock:
+            _executor = None
+        return get_executor().submit(fn, *args)
+
+
+def _retire_executor(pool: ProcessPoolExecutor):
+    """Send later work to a fresh pool; pool's workers exit once their current tasks end"""
+    global _executor
+    with _executor_lock:
+        if _executor is not pool:
+            return
+        _executor = None
+    pool.shutdown(wait=False)
+
+
+# Tasks of one analysis usually share workers; keep the last source's index
+_last_index: Optional[SourceIndex] = None
+
+
+def _analyzer(code: str, rules: Optional[Tuple[str, ...]]) -> Tuple[SecurityAnalyzer, Any]:
+    global _last_index
+    if _last_index is None or _last_index.code != code:
+        _last_index = SourceIndex(code)
+    analyzer = SecurityAnalyzer()
+    analyzer.source_index = _last_index
+    engine = analyzer.rule_engine if rules is None else analyzer.rule_engine.only(rules)
+    return analyzer, engine
+
+
+# Each task returns (findings, stages its copy of the budget skipped)
+def _line_task(code: str, rules: Optional[Tuple[str, ...]], ranges: Optional[List[Tuple[int, int]]],
+               budget: Optional[Budget]) -> Tuple[Dict[str, List[Vulnerability]], List[str]]:
+    analyzer, engine = _analyzer(code, rules)
+    return analyzer.line_findings(engine, ranges, budget=budget), budget.skipped if budget else []
+
+
+def _flow_task(code: str, rules: Optional[Tuple[str, ...]], nodes: List[Dict], edges: List[Dict],
+               budget: Optional[Budget]) -> Tuple[Dict[str, List[Vulnerability]], List[str]]:
+    analyzer, engine = _analyzer(code, rules)
+    graph = CompactGraph(nodes, edges, skip_hidden=True)
+    return analyzer.flow_findings(engine, nodes, edges, graph, budget=budget), budget.skipped if budget else []
+
+
+def _passes_task(code: str, nodes: List[Dict], edges: List[Dict], passes: Tuple[str, ...],
+                 budget: Optional[Budget]) -> Tuple[List[Tuple[str, List[Vulnerability]]], List[str]]:
+    # The infinite-loop pass reads loop bodies from the source index
+    analyzer, _ = _analyzer(code, None)
+    graph = CompactGraph(nodes, edges, skip_hidden=True)
+    found = list(analyzer._analyze_cfg(nodes, edges, graph, passes, budget))
+    return found, budget.skipped if budget else []
+
+
+def function_chunks(cfg: Dict[str, Any], count: int) -> List[Tuple[List[Dict], List[Dict]]]:
+    """Up to count (nodes, edges) parts of whole functions, in node order, of similar node counts"""
+    groups = split_functions(cfg)
+    target = max(1, -(-len(cfg.get('nodes', [])) // max(count, 1)))
+    chunks: List[Tuple[List[Dict], List[Dict]]] = []
+    nodes: List[Dict] = []
+    edges: List[Dict] = []
+    for _, group_nodes, group_edges in groups:
+        nodes.extend(group_nodes)
+        edges.extend(group_edges)
+        if len(nodes) >= target:
+            chunks.append((nodes, edges))
+            nodes, edges = [], []
+    if nodes:
+        chunks.append((nodes, edges))
+    return chunks
+
+
+def analyze_parallel(code: str, cfg_data: Dict = None, rules: Tuple[str, ...] = None,
+                     checkpoint: Callable[[], None] = None, budget: Budget = None) -> Dict[str, Any]:
+    """
+    SecurityAnalyzer.analyze(code, cfg_data) with the detectors spread over
+    the process pool; checkpoint runs as each task completes.
+
+    Tasks get the budget, so its deadline reaches the workers and their
+    detectors stop at it between rules and passes. Without a budget (or
+    without a time limit) the wait is bounded by PARALLEL_TASK_TIMEOUT.
+    Tasks still pending at the deadline are dropped and their detectors
+    recorded as skipped. Cancellation is best effort: a task that is
+    already running cannot be interrupted, so its pool is retired (new
+    work goes to a fresh pool while it finishes) instead of holding up
+    later requests.
+    """
+    checkpoint = checkpoint or (lambda: None)
+    own_budget = budget is None
+    if own_budget:
+        budget = Budget(seconds=PARALLEL_TASK_TIMEOUT, max_bytes=0, max_nodes=0, detector_slice=0)
+    nodes = edges = None
+    if cfg_data and 'nodes' in cfg_data:
+        nodes = cfg_data.get('nodes', [])
+        edges = cfg_data.get('edges', [])
+    wanted = lambda rule_id: rules is None or rule_id in rules
+
+    analyzer = SecurityAnalyzer()
+    engine = analyzer.rule_engine if rules is None else analyzer.rule_engine.only(rules)
+    flow_ids = [r.id for r in engine.rules if r.id in CFG_RULES]
+    selected = tuple(p for p in CFG_PASSES if wanted(p))
+
+    get_executor()
+    if nodes is None:
+        line = submit(_line_task, code, rules, None, budget)
+        flows: List[Future] = []
+        passes = None
+    else:
+        ranges = uncovered_ranges(nodes, code.count('\n') + 1)
+        line = submit(_line_task, code, rules, ranges, budget)
+        flows = []
+        if flow_ids:
+            flows = [submit(_flow_task, code, rules, part_nodes, part_edges, budget)
+                     for part_nodes, part_edges in function_chunks(cfg_data, _executor_workers)]
+        passes = submit(_passes_task, code, nodes, edges, selected, budget) if selected else None
+
+    pending = {line, *flows} | ({passes} if passes else set())
+    pool = _executor
+    give_up = time.monotonic() + PARALLEL_TASK_TIMEOUT
+    try:
+        while pending:
+            remaining = budget.remaining()
+            timeout = max(0.0, give_up - time.monotonic()) if remaining is None else remaining
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                future.result()
+            checkpoint()
+    finally:
+        overran = [future for future in pending if not future.cancel() and not future.done()]
+        if overran:
+            _retire_executor(pool)
+
+    def finished(future: Optional[Future], stages) -> bool:
+        if future is None or (future.done() and not future.cancelled()):
+            return True
+        for name in stages:
+            budget.skip(name)
+        return False
+
+    found = {r.id: [] for r in engine.rules}
+    if finished(line, [r.id for r in engine.rules]):
+        found, skipped = line.result()
+        for name in skipped:
+            budget.skip(name)
+    flow_results = []
+    for future in flows:
+        if finished(future, flow_ids):
+            result, skipped = future.result()
+            flow_results.append(result)
+            for name in skipped:
+                budget.skip(name)
+    grouped = merge_flow(engine, found, flow_results)
+    if passes is not None and finished(passes, selected):
+        result, skipped = passes.result()
+        grouped.extend(result)
+        for name in skipped:
+            budget.skip(name)
+    result = analyzer.merge(grouped, nodes)
+    return budget.annotate(result) if own_budget else result
@@ -0,0 +1,414 @@
+"""
+Parse and analysis steps shared by the HTTP routes, batch scans and jobs
+The Node helper output is cached as JSON text, so /cfg, /analyze and bulk
+requests on the same source only parse it once. Analyses are cached in
+the lean shape (findings as rule references), which ?findings=lean
+serves as is; full responses render the text from the rule catalog.
+"""
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from cfg_graph import split_functions
+from budget import Budget
+from layout import LAYOUT_VERSION, layered_layout
+from metrics import CACHE_LOOKUPS, stage
+from node_pool import NodeHelperTimeout, get_async_parser, get_parser, node_helper_entry, parser_version
+from parallel import PARALLEL_MIN_LINES, analyze_parallel
+from result_cache import cache_key, get_cache
+from rule_engine import rule_catalog
+from security_analyzer import ANALYZER_VERSION, SecurityAnalyzer, needs_parse
+from vulnerability import Vulnerability, group_by_node, lean_findings
+from wire import COMPACT_VERSION, compact_analysis, compact_cfg, expand_analysis
+
+
+logger = logging.getLogger(__name__)
+
+
+def variant(kind: str, blocks: bool = False, compact: bool = False, layered: bool = False) -> str:
+    """Cache kind for one output shape, e.g. 'cfg', 'analyze-blocks-layered-compact'"""
+    return kind + ('-blocks' if blocks else '') + ('-layered' if layered else '') + ('-compact' if compact else '')
+
+
+def cache_keys(code: str) -> Dict[str, str]:
+    """Cache key of every output shape of code, by variant()"""
+    # Stored analyses reference the rule catalog, so its version is part of their key;
+    # 'rendered' holds the full-shape text of the same analysis
+    analyze_version = f"{parser_version()}/{ANALYZER_VERSION}/lean{rule_catalog()['version']}"
+    versions = {"cfg": parser_version(), "analyze": analyze_version, "rendered": analyze_version}
+    keys = {}
+    for kind, version in versions.items():
+        for blocks in (False, True):
+            for layered in (False, True):
+                for compact in (False, True):
+                    suffix = (('/blocks' if blocks else '') + (f'/layered{LAYOUT_VERSION}' if layered else '')
+                              + (f'/compact{COMPACT_VERSION}' if compact else ''))
+                    keys[variant(kind, blocks, compact, layered)] = cache_key(kind, version + suffix, code)
+    return keys
+
+
+def _cache_get(kind: str, key: str, refresh: bool = False) -> Optional[str]:
+    """Cache read that feeds the lookup counters; refresh skips the read entirely"""
+    if refresh:
+        CACHE_LOOKUPS.inc(kind=kind, result='bypass')
+        return None
+    value = get_cache().get(key)
+    CACHE_LOOKUPS.inc(kind=kind, result='miss' if value is None else 'hit')
+    return value
+
+
+def get_cfg_raw(code: str, refresh: bool = False, compact: bool = False, blocks: bool = False,
+                timeout: float = None, layered: bool = False) -> str:
+    """
+    Return the Node helper output for code as JSON text, parsing only on a cache miss
+
+    compact asks the helper for the compact wire format (see wire.py) and
+    blocks for basic-block nodes; each shape is cached separately. timeout
+    overrides the parser's default. layered replaces the helper's
+    positions with layout.layered_layout, cached as its own shape.
+    """
+    cache = get_cache()
+    if layered:
+        kind = variant('cfg', blocks, compact, layered=True)
+        key = cache_keys(code)[kind]
+        raw = _cache_get(kind, key, refresh)
+        if raw is None:
+            cfg = json.loads(get_cfg_raw(code, refresh, blocks=blocks, timeout=timeout))
+            with stage('cfg.layout'):
+                layered_layout(cfg)
+            raw = json.dumps(compact_cfg(cfg) if compact else cfg)
+            cache.put(key, raw)
+        return raw
+    kind = variant('cfg', blocks, compact)
+    key = cache_keys(code)[kind]
+    raw = _cache_get(kind, key, refresh)
+    if raw is None:
+        payload = {"code": code}
+        if compact:
+            payload["format"] = "compact"
+        if blocks:
+            payload["blocks"] = True
+        raw = get_parser().parse(payload, timeout=timeout)
+        json.loads(raw)  # never cache a malformed result
+        cache.put(key, raw)
+    return raw
+
+
+async def get_cfg_raw_async(code: str, compact: bool = False, blocks: bool = False, timeout: float = None) -> str:
+    """
+    get_cfg_raw (without layout) for the event loop: a cache miss awaits
+    the async parser instead of blocking a thread
+    """
+    kind = variant('cfg', blocks, compact)
+    key = cache_keys(code)[kind]
+    raw = _cache_get(kind, key)
+    if raw is None:
+        payload = {"code": code}
+        if compact:
+            payload["format"] = "compact"
+        if blocks:
+            payload["blocks"] = True
+        raw = await get_async_parser().parse(payload, timeout=timeout)
+        json.loads(raw)  # never cache a malformed result
+        get_cache().put(key, raw)
+    return raw
+
+
+def get_cfg(code: str, refresh: bool = False, blocks: bool = False, timeout: float = None,
+            layered: bool = False) -> Dict[str, Any]:
+    """Parse code with the Node helper and return the decoded CFG"""
+    raw = get_cfg_raw(code, refresh, blocks=blocks, timeout=timeout, layered=layered)
+    with stage('cfg.decode'):
+        return json.loads(raw)
+
+
+def get_cfg_many(files: List[Tuple[str, str]], timeout: float = None) -> List[Dict[str, Any]]:
+    """
+    Parse several sources with one Node helper call
+
+    Returns one entry per input, in order: {"cfg": ...} or {"error": ...}.
+    Cached sources are not sent to Node again.
+    """
+    cache = get_cache()
+    results: List[Dict[str, Any]] = [None] * len(files)
+    pending = []
+    for i, (path, code) in enumerate(files):
+        raw = _cache_get('cfg', cache_keys(code)["cfg"])
+        if raw is None:
+            pending.append(i)
+        else:
+            results[i] = {"cfg": json.loads(raw)}
+
+    if pending:
+        payload = {"files": [{"path": files[i][0], "code": files[i][1]} for i in pending]}
+        bulk = json.loads(get_parser().parse(payload, timeout=timeout))
+        for i, entry in zip(pending, bulk.get('results', [])):
+            if 'cfg' in entry:
+                cache.put(cache_keys(files[i][1])["cfg"], json.dumps(entry['cfg']))
+                results[i] = {"cfg": entry['cfg']}
+            else:
+                results[i] = {"error": entry.get('error', 'Parse failed')}
+    return [r if r is not None else {"error": "Parse failed"} for r in results]
+
+
+def try_get_cfg(code: str, refresh: bool = False, blocks: bool = False, budget: Budget = None,
+                layered: bool = False) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Return (cfg, None), or (None, error message) when the CFG cannot be built
+
+    With a budget the parse gets part of the remaining time, and a parse
+    that runs out of it or a CFG over the node limit is recorded as a
+    skipped 'cfg' stage.
+    """
+    if not os.path.exists(node_helper_entry()):
+        return None, "Node helper not installed"
+    if budget is not None and budget.expired():
+        budget.skip('cfg')
+        return None, "Time budget exhausted before parsing"
+    try:
+        timeout = budget.parse_timeout(get_parser().timeout) if budget is not None else None
+        cfg = get_cfg(code, refresh, blocks, timeout, layered)
+    except NodeHelperTimeout as e:
+        if budget is not None:
+            budget.skip('cfg')
+        return None, str(e)
+    except Exception as e:
+        return None, str(e)
+    if budget is not None and budget.max_nodes and len(cfg.get('nodes', [])) > budget.max_nodes:
+        budget.skip('cfg')
+        return None, f"CFG has more than {budget.max_nodes} nodes"
+    return cfg, None
+
+
+SEVERITY_COLORS = {
+    'critical': '#d32f2f',
+    'high': '#f57c00',
+    'medium': '#fbc02d',
+    'low': '#7cb342',
+    'info': '#0288d1'
+}
+
+
+def annotate_cfg(cfg: Dict[str, Any], vulnerabilities: List[Dict[str, Any]], lean: bool = False):
+    """
+    Mark vulnerable nodes with their findings, highest severity and styling
+
+    lean gives each node the indices of its findings in vulnerabilities
+    (data.findings, as in wire.lean_analysis) instead of the findings.
+    """
+    groups = group_by_node(vulnerabilities)
+    if not groups:
+        return
+    positions = {id(v): i for i, v in enumerate(vulnerabilities)} if lean else None
+
+    for node in cfg.get('nodes', []):
+        group = groups.get(node['id'])
+        if group is None:
+            continue
+        max_severity, node_vulns = group
+
+        # Add vulnerability styling
+        node['data']['vulnerable'] = True
+        node['data']['severity'] = max_severity
+        if lean:
+            node['data']['findings'] = [positions[id(v)] for v in node_vulns]
+        else:
+            node['data']['vulnerabilities'] = node_vulns
+
+        # Update node style based on severity
+        if 'style' not in node:
+            node['style'] = {}
+
+        color = SEVERITY_COLORS.get(max_severity, '#999')
+        node['style']['border'] = f"3px solid {color}"
+        node['style']['boxShadow'] = f"0 0 10px {color}"
+
+        # Basic blocks: point at the statements the findings are on
+        statements = node['data'].get('statements')
+        if statements:
+            node['data']['vulnerableStatements'] = statements_at(statements, [v['line'] for v in node_vulns])
+
+
+def statements_at(statements: List[Dict[str, Any]], lines: List[int]) -> List[int]:
+    """Indices of the block statements spanning any of lines"""
+    return [i for i, s in enumerate(statements)
+            if any((s.get('startLine') or 0) <= line <= (s.get('endLine') or s.get('startLine') or 0) for line in lines)]
+
+
+def _run_analyzer(code: str, cfg: Optional[Dict[str, Any]], checkpoint: Callable[[], None],
+                  rules: Tuple[str, ...] = None, budget: Budget = None) -> Dict[str, Any]:
+    if PARALLEL_MIN_LINES and code.count('\n') + 1 >= PARALLEL_MIN_LINES:
+        with stage('analyzer.parallel'):
+            return analyze_parallel(code, cfg, rules, checkpoint, budget)
+    analyzer = SecurityAnalyzer()
+    for _ in analyzer.iter_analyze(code, cfg_data=cfg, rules=rules, budget=budget):
+        checkpoint()
+    return analyzer.result()
+
+
+def analyze(code: str, checkpoint: Callable[[], None] = None,
+            run: Callable[[str, Optional[Dict[str, Any]]], Dict[str, Any]] = None,
+            refresh: bool = False, blocks: bool = False, rules: Tuple[str, ...] = None,
+            budget: Budget = None, layered: bool = False,
+            parsed: Tuple[Optional[Dict[str, Any]], Optional[str]] = None,
+            lean: bool = False) -> Tuple[Dict[str, Any], bool]:
+    """
+    Parse, analyze and annotate one source
+
+    checkpoint is called between stages and may raise to abandon the work;
+    run replaces the in-process analyzer (e.g. to use a process pool);
+    refresh ignores cached CFGs; blocks analyzes the basic-block CFG and
+    layered lays it out with layout.layered_layout;
+    rules (see select_rules) limits the in-process analyzer to those
+    detectors, and the Node parse is skipped when none of them needs it;
+    budget bounds the work, and what it cuts short is listed under
+    'skipped' with 'partial' set; parsed is a (cfg, error) pair obtained
+    elsewhere (e.g. a failed async parse) that replaces the parse step;
+    lean returns wire.lean_analysis's shape without building the full one.
+    Returns (result, cacheable): results without a CFG may come from a
+    transient parser failure, and partial ones from a busy moment; neither
+    is cacheable.
+    """
+    checkpoint = checkpoint or (lambda: None)
+    checkpoint()
+
+    # First, get CFG data (shared with /cfg through the parse cache)
+    cfg_result = None
+    if needs_parse(rules):
+        if parsed is not None:
+            cfg_result, cfg_error = parsed
+        else:
+            cfg_result, cfg_error = try_get_cfg(code, refresh, blocks, budget, layered)
+        if cfg_error:
+            # Continue without CFG if parsing fails
+            logger.warning("CFG generation failed: %s", cfg_error)
+        checkpoint()
+
+    # Run security analysis
+    if run is not None:
+        analysis_result = run(code, cfg_result)
+    else:
+        analysis_result = _run_analyzer(code, cfg_result, checkpoint, rules, budget)
+    if rules is not None:
+        analysis_result['rules'] = list(rules)
+    if budget is not None:
+        budget.annotate(analysis_result)
+
+    # Combine CFG with vulnerability info
+    if cfg_result:
+        analysis_result['cfg'] = cfg_result
+        with stage('cfg.annotate'):
+            annotate_cfg(cfg_result, analysis_result['vulnerabilities'], lean)
+    if lean:
+        analysis_result['vulnerabilities'] = lean_findings(analysis_result['vulnerabilities'])
+        analysis_result['catalog'] = rule_catalog()['version']
+    return analysis_result, cfg_result is not None and not analysis_result.get('partial')
+
+
+def analysis_json(code: str, refresh: bool = False, compact: bool = False, blocks: bool = False,
+                  rules: Tuple[str, ...] = None, layered: bool = False, lean: bool = False, **options) -> str:
+    """
+    Analysis result for code as JSON text, served from the cache unless refresh is set
+
+    Results for a rules subset are not cached; they are cheap next to the
+    parse, which still comes from the cache when one of the rules needs it.
+    lean returns wire.lean_analysis's shape, which is what the cache holds;
+    the full shape is rendered from it once and cached as a 'rendered' entry.
+    """
+    if rules is not None:
+        result, _ = analyze(code, refresh=refresh, blocks=blocks, rules=rules, layered=layered, lean=lean,
+                            **options)
+        with stage('json.encode'):
+            return json.dumps(compact_analysis(result) if compact else result, sort_keys=True)
+
+    if lean:
+        return _lean_json(code, refresh, compact, blocks, layered, **options)[0]
+    kind = variant('rendered', blocks, compact, layered)
+    key = cache_keys(code)[kind]
+    text = _cache_get(kind, key, refresh)
+    if text is not None:
+        return text
+    body, stored = _lean_json(code, refresh, compact, blocks, layered, **options)
+    with stage('json.encode'):
+        text = json.dumps(expand_analysis(json.loads(body)), sort_keys=True)
+    if stored:
+        get_cache().put(key, text)
+    return text
+
+
+def _lean_json(code: str, refresh: bool, compact: bool, blocks: bool, layered: bool,
+               **options) -> Tuple[str, bool]:
+    """The stored (lean) analysis of one output shape and whether it is cached, analyzing on a miss"""
+    kind = variant('analyze', blocks, compact, layered)
+    key = cache_keys(code)[kind]
+    body = _cache_get(kind, key, refresh)
+    if body is not None:
+        return body, True
+    if compact:
+        # Derived from the React Flow result, which is usually cached already
+        result = json.loads(_lean_json(code, refresh, False, blocks, layered, **options)[0])
+        result = compact_analysis(result)
+        cacheable = 'cfg' in result and not result.get('partial')
+    else:
+        result, cacheable = analyze(code, refresh=refresh, blocks=blocks, layered=layered, lean=True, **options)
+    with stage('json.encode'):
+        body = json.dumps(result, sort_keys=True)
+    if cacheable:
+        get_cache().put(key, body)
+    return body, cacheable
+
+
+def _function_key(source_id: str, index: int) -> str:
+    return cache_key('function', source_id, str(index))
+
+
+def function_summary(code: str, refresh: bool = False, blocks: bool = False, layered: bool = False) -> Dict[str, Any]:
+    """
+    Function list of code with sizes and finding counts
+
+    Each function's annotated CFG, moved to the origin, is cached under the
+    returned sourceId so function_json can serve it without another parse.
+    """
+    source_id = cache_keys(code)[variant('analyze', blocks, layered=layered)].split(':', 1)[1]
+    result = expand_analysis(json.loads(analysis_json(code, refresh=refresh, blocks=blocks, layered=layered,
+                                                      lean=True)))
+    cache = get_cache()
+    functions = []
+    assigned = 0
+    rank = Vulnerability.SEVERITY_RANK
+    for index, (label, nodes, edges) in enumerate(split_functions(result.get('cfg') or {})):
+        data = label.get('data') or {}
+        origin = label.get('position') or {}
+        dx, dy = origin.get('x', 0) - 150, origin.get('y', 0)
+        ids = {node['id'] for node in nodes}
+        found = [v for v in result['vulnerabilities'] if v.get('nodeId') in ids]
+        assigned += len(found)
+        name = data.get('label', '').split(':', 1)[-1].strip()
+        meta = {"index": index, "name": name, "startLine": data.get('startLine'), "endLine": data.get('endLine')}
+        moved = [dict(node, position={"x": node['position']['x'] - dx, "y": node['position']['y'] - dy})
+                 if 'position' in node else node for node in nodes]
+        body = dict(meta, sourceId=source_id, cfg={"nodes": moved, "edges": edges}, vulnerabilities=found)
+        cache.put(_function_key(source_id, index), json.dumps(body, sort_keys=True))
+        functions.append(dict(
+            meta,
+            nodes=len(nodes),
+            edges=len(edges),
+            findings=len(found),
+            severity=min((v['severity'] for v in found), key=lambda s: rank.get(s, len(rank)), default=None),
+        ))
+    return {
+        "sourceId": source_id,
+        "functions": functions,
+        # Findings outside any function (e.g. pragma), or all of them when the CFG failed
+        "unassigned": len(result['vulnerabilities']) - assigned,
+        "summary": result['summary'],
+        "score": result['score'],
+    }
+
+
+def function_json(source_id: str, index: int) -> Optional[str]:
+    """One function's annotated CFG and findings as cached by function_summary, or None"""
+    body = get_cache().get(_function_key(source_id, index))
+    CACHE_LOOKUPS.inc(kind='function', result='miss' if body is None else 'hit')
+    return body
@@ -0,0 +1,198 @@
+"""
+Content-addressed cache for parse and analysis results
+Entries are serialized JSON text keyed by a hash of the source plus the
+parser/analyzer versions, held in a byte-bounded LRU with an optional
+SQLite tier that survives restarts.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+def cache_key(kind: str, version: str, code: str) -> str:
+    digest = hashlib.sha256()
+    for part in (kind, version, code):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return f"{kind}:{digest.hexdigest()}"
+
+
+class ResultCache:
+    """
+    Two-tier cache: in-memory LRU bounded by bytes, optional SQLite store
+
+    The SQLite tier is bounded by db_max_bytes and evicts the rows least
+    recently written or read from disk. It has its own lock, so memory hits
+    never wait behind a disk write.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, db_path: str = None,
+                 db_max_bytes: int = 1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.db_max_bytes = db_max_bytes
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "diskHits": 0, "evictions": 0, "diskEvictions": 0}
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._db_size = 0
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL,"
+                " used REAL NOT NULL DEFAULT 0, size INTEGER NOT NULL DEFAULT 0)"
+            )
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(results)")}
+            if 'used' not in columns:
+                # Table from before the disk bound: rows are ranked by creation time
+                self._db.execute("ALTER TABLE results ADD COLUMN used REAL NOT NULL DEFAULT 0")
+                self._db.execute("ALTER TABLE results ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+                self._db.execute("UPDATE results SET used = created, size = length(CAST(value AS BLOB))")
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+            self._db_size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            self._evict_disk()
+            self._db.commit()
+
+    @staticmethod
+    def _sizeof(value: str) -> int:
+        return len(value.encode('utf-8'))
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return value
+            if self._db is None:
+                self._counters["misses"] += 1
+                return None
+
+        with self._db_lock:
+            row = self._db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._db.execute("UPDATE results SET used = ? WHERE key = ?", (time.time(), key))
+                self._db.commit()
+        with self._lock:
+            if row is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["hits"] += 1
+            self._counters["diskHits"] += 1
+            self._remember(key, row[0])
+            return row[0]
+
+    def put(self, key: str, value: str):
+        with self._lock:
+            self._remember(key, value)
+        if self._db is None:
+            return
+        size = self._sizeof(value)
+        if size > self.db_max_bytes:
+            return
+        with self._db_lock:
+            previous = self._db.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, value, created, used, size) VALUES (?, ?, ?, ?, ?)",
+                (key, value, now, now, size),
+            )
+            self._db_size += size - (previous[0] if previous else 0)
+            self._evict_disk()
+            self._db.commit()
+
+    def _evict_disk(self):
+        """Delete least recently used rows until the table fits db_max_bytes (caller holds _db_lock)"""
+        if self._db_size <= self.db_max_bytes:
+            return
+        doomed = []
+        for key, size in self._db.execute("SELECT key, size FROM results ORDER BY used"):
+            doomed.append((key,))
+            self._db_size -= size
+            if self._db_size <= self.db_max_bytes:
+                break
+        self._db.executemany("DELETE FROM results WHERE key = ?", doomed)
+        with self._lock:
+            self._counters["diskEvictions"] += len(doomed)
+
+    def _remember(self, key: str, value: str):
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= self._sizeof(previous)
+        self._entries[key] = value
+        self._size += size
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= self._sizeof(evicted)
+            self._counters["evictions"] += 1
+
+    def invalidate(self, keys=None) -> int:
+        """Drop the given keys, or everything when no keys are given"""
+        if keys is None:
+            with self._lock:
+                removed = len(self._entries)
+                self._entries.clear()
+                self._size = 0
+            if self._db is not None:
+                with self._db_lock:
+                    removed = max(removed, self._db.execute("DELETE FROM results").rowcount)
+                    self._db_size = 0
+                    self._db.commit()
+            return removed
+
+        keys = list(keys)
+        with self._lock:
+            found = set()
+            for key in keys:
+                value = self._entries.pop(key, None)
+                if value is not None:
+                    self._size -= self._sizeof(value)
+                    found.add(key)
+        if self._db is not None:
+            with self._db_lock:
+                for key in keys:
+                    row = self._db.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+                    if row is not None:
+                        self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                        self._db_size -= row[0]
+                        found.add(key)
+                self._db.commit()
+        return len(found)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "maxBytes": self.max_bytes,
+                "persistent": self._db is not None,
+                "diskBytes": self._db_size,
+                "diskMaxBytes": self.db_max_bytes,
+            })
+            return stats
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ResultCache:
+    """Return the process-wide cache configured from the environment"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache(
+                max_bytes=int(os.environ.get('RESULT_CACHE_MAX_BYTES', str(64 * 1024 * 1024))),
+                db_path=os.environ.get('RESULT_CACHE_DB') or None,
+                db_max_bytes=int(os.environ.get('RESULT_CACHE_DB_MAX_BYTES', str(1024 * 1024 * 1024))),
+            )
+        return _cache
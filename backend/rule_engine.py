@@ -0,0 +1,432 @@
+"""
+Single-pass rule engine for line-based Solidity pattern checks
+Rules see the comment/string-masked lines of a SourceIndex; every line goes
+through one combined precompiled matcher, and only candidate lines are
+dispatched to the matching rules. Scopes come from the index's function and
+loop spans, and the remaining windows are answered from lookup tables built
+once per source, so a run is O(lines) rather than O(rules x lines x window).
+"""
+import hashlib
+import json
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional, Pattern, Tuple, Union
+
+from budget import Budget
+from source_index import SourceIndex
+from vulnerability import Vulnerability
+
+
+class LineContext:
+    """Masked source lines plus lazily built per-predicate lookup tables shared by all rules"""
+
+    def __init__(self, index: SourceIndex):
+        self.index = index
+        self.code = index.masked
+        self.lines = index.masked_lines
+        self._next: Dict[str, List[int]] = {}
+        self._prefix: Dict[str, List[int]] = {}
+        self._flags: Dict[str, bool] = {}
+
+    def flag(self, name: str, compute: Callable[[str], bool]) -> bool:
+        """Whole-source fact, computed once"""
+        if name not in self._flags:
+            self._flags[name] = compute(self.code)
+        return self._flags[name]
+
+    def first_between(self, name: str, predicate: Callable[[str], bool], lo: int, hi: int) -> Optional[int]:
+        """First 0-based line index in [lo, hi) satisfying predicate, or None"""
+        table = self._next.get(name)
+        if table is None:
+            n = len(self.lines)
+            table = [n] * (n + 1)
+            for k in range(n - 1, -1, -1):
+                table[k] = k if predicate(self.lines[k]) else table[k + 1]
+            self._next[name] = table
+        lo = max(lo, 0)
+        if lo >= len(self.lines):
+            return None
+        found = table[lo]
+        return found if found < min(hi, len(self.lines)) else None
+
+    def any_between(self, name: str, predicate: Callable[[str], bool], lo: int, hi: int) -> bool:
+        """Whether any 0-based line index in [lo, hi) satisfies predicate"""
+        table = self._prefix.get(name)
+        if table is None:
+            table = [0]
+            for line in self.lines:
+                table.append(table[-1] + (1 if predicate(line) else 0))
+            self._prefix[name] = table
+        lo = max(lo, 0)
+        hi = min(hi, len(self.lines))
+        return lo < hi and table[hi] - table[lo] > 0
+
+
+CheckFn = Callable[[LineContext, int, str], Optional[Vulnerability]]
+
+# What a detector can depend on: the raw text, the SourceIndex built from it,
+# or the output of the Node parse (only the CFG is used so far)
+ARTIFACTS = ('text', 'index', 'ast', 'cfg')
+PARSE_ARTIFACTS = ('ast', 'cfg')
+
+
+class RuleInfo:
+    """
+    Registry entry: a detector's id, the severity it reports, the artifacts
+    it needs and the catalog text of its findings (title, message template
+    and recommendation, plus named variants of the last two)
+    """
+
+    __slots__ = ('id', 'severity', 'needs', 'title', 'texts')
+
+    def __init__(self, rule_id: str, severity: str, needs: Tuple[str, ...], title: str = None,
+                 message: str = '', recommendation: str = '', variants: Dict[str, Tuple[str, str]] = None):
+        unknown = set(needs) - set(ARTIFACTS)
+        if unknown:
+            raise ValueError(f"Unknown artifacts for {rule_id}: {sorted(unknown)}")
+        self.id = rule_id
+        self.severity = severity
+        self.needs = tuple(needs)
+        self.title = title or rule_id
+        self.texts: Dict[Optional[str], Tuple[str, str]] = {None: (message, recommendation)}
+        self.texts.update(variants or {})
+
+    @property
+    def needs_parse(self) -> bool:
+        return any(a in PARSE_ARTIFACTS for a in self.needs)
+
+    def message(self, variant: str = None) -> str:
+        """Description template; {line} and the finding's params are filled in"""
+        return self.texts[variant][0]
+
+    def recommendation(self, variant: str = None) -> str:
+        return self.texts[variant][1]
+
+    def to_dict(self) -> Dict[str, Any]:
+        entry = {"id": self.id, "title": self.title, "severity": self.severity, "needs": list(self.needs),
+                 "message": self.message(), "recommendation": self.recommendation()}
+        variants = {name: {"message": message, "recommendation": recommendation}
+                    for name, (message, recommendation) in self.texts.items() if name is not None}
+        if variants:
+            entry['variants'] = variants
+        return entry
+
+
+# Every detector, pattern rules and CFG passes alike, in report order
+RULES: Dict[str, RuleInfo] = {}
+
+
+def register_rule(rule_id: str, severity: str, needs: Tuple[str, ...], **text) -> RuleInfo:
+    """Add a detector to RULES; text is RuleInfo's title, message, recommendation and variants"""
+    if rule_id in RULES:
+        raise ValueError(f"Rule {rule_id!r} is already registered")
+    info = RULES[rule_id] = RuleInfo(rule_id, severity, needs, **text)
+    return info
+
+
+def rule_catalog() -> Dict[str, Any]:
+    """Every registered rule with its catalog text, as served by GET /rules, under a content version"""
+    rules = [info.to_dict() for info in RULES.values()]
+    version = hashlib.sha256(json.dumps(rules, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    return {"version": version, "rules": rules}
+
+
+class PatternRule:
+    """A line rule: a trigger regex plus a check run on each triggering line"""
+
+    def __init__(self, rule_id: str, trigger: str, check: CheckFn, flags: int = 0,
+                 applies: Callable[[LineContext], bool] = None, once: bool = False):
+        self.id = rule_id
+        self.pattern = trigger
+        self.flags = flags
+        self.trigger: Pattern = re.compile(trigger, flags)
+        self.check = check
+        self.applies = applies or (lambda ctx: True)
+        self.once = once
+        # Findings depend on the whole file, not just the lines around the trigger
+        self.file_scope = once or applies is not None
+
+
+class RuleEngine:
+    """Runs a fixed, ordered set of pattern rules in one pass over the source"""
+
+    def __init__(self, rules: List[PatternRule]):
+        self.rules = list(rules)
+        alternatives = []
+        for r in self.rules:
+            scoped = 'i' if r.flags & re.IGNORECASE else ''
+            alternatives.append(f"(?{scoped}:{r.pattern})" if scoped else f"(?:{r.pattern})")
+        self._prefilter = re.compile('|'.join(alternatives)) if alternatives else None
+        self._subsets: Dict[Tuple[bool, Tuple[str, ...]], 'RuleEngine'] = {}
+
+    def without(self, rule_ids: Tuple[str, ...]) -> 'RuleEngine':
+        """Engine over the same rules minus rule_ids (cached per id tuple)"""
+        return self._subset(rule_ids, keep=False)
+
+    def only(self, rule_ids: Tuple[str, ...]) -> 'RuleEngine':
+        """Engine over the rules in rule_ids, in the original order (cached per id tuple)"""
+        return self._subset(rule_ids, keep=True)
+
+    def _subset(self, rule_ids: Tuple[str, ...], keep: bool) -> 'RuleEngine':
+        subset = self._subsets.get((keep, rule_ids))
+        if subset is None:
+            subset = self._subsets[(keep, rule_ids)] = RuleEngine(
+                [r for r in self.rules if (r.id in rule_ids) == keep])
+        return subset
+
+    def run(self, source: Union[SourceIndex, str]) -> List[Vulnerability]:
+        """Return findings grouped by rule (in rule order), each group ordered by line"""
+        return [v for _, found in self.run_grouped(source) for v in found]
+
+    def run_grouped(self, source: Union[SourceIndex, str], timings: Dict[str, float] = None,
+                    ranges: List[Tuple[int, int]] = None,
+                    budget: Budget = None) -> List[Tuple[str, List[Vulnerability]]]:
+        """
+        Return (rule id, findings) for every rule, in rule order
+
+        When a timings dict is given, the seconds each rule spends in its
+        trigger and check are accumulated into it by rule id. ranges limits
+        the scan to those 1-based inclusive line ranges (checks still see the
+        whole source). With a budget, both limits are checked after every
+        rule on every line: a rule that uses up its time slice stops, and
+        the scan stops when the request runs out of time; both keep the
+        findings made so far and are recorded as skipped.
+        """
+        if isinstance(source, str):
+            source = SourceIndex(source)
+        ctx = LineContext(source)
+        active = [r for r in self.rules if r.applies(ctx)]
+        findings: Dict[str, List[Vulnerability]] = {r.id: [] for r in self.rules}
+        if not active:
+            return list(findings.items())
+
+        if budget is not None and budget.expired():
+            for r in active:
+                budget.skip(r.id)
+            return list(findings.items())
+        if budget is not None and timings is None:
+            timings = {}
+        clock = time.perf_counter if timings is not None else None
+        if clock is not None:
+            for r in active:
+                timings.setdefault(r.id, 0.0)
+        time_slice = budget.detector_slice if budget is not None else 0
+        # The request deadline on the timing clock, checked after every rule on every line
+        deadline = None
+        if budget is not None and budget.remaining() is not None:
+            deadline = clock() + budget.remaining()
+        prefilter = self._prefilter.search
+        lines = ctx.lines
+        if ranges is None:
+            numbered = enumerate(lines, 1)
+        else:
+            numbered = ((i, lines[i - 1]) for lo, hi in ranges
+                        for i in range(max(lo, 1), min(hi, len(lines)) + 1))
+        for i, line in numbered:
+            if not prefilter(line):
+                continue
+            over = None
+            for r in active:
+                bucket = findings[r.id]
+                if r.once and bucket:
+                    continue
+                if clock is not None:
+                    started = clock()
+                if r.trigger.search(line):
+                    vuln = r.check(ctx, i, line)
+                    if vuln is not None:
+                        bucket.append(vuln)
+                if clock is None:
+                    continue
+                ended = clock()
+                timings[r.id] += ended - started
+                if deadline is not None and ended >= deadline:
+                    # Out of time: this and every later rule on this line are cut short
+                    over = active
+                    break
+                if time_slice and timings[r.id] > time_slice:
+                    over = (over or []) + [r]
+            if over:
+                for r in over:
+                    budget.skip(r.id)
+                if over is active:
+                    break
+                active = [r for r in active if r not in over]
+                if not active:
+                    break
+
+        return list(findings.items())
+
+
+PATTERN_RULES: List[PatternRule] = []
+
+
+def rule(rule_id: str, trigger: str, flags: int = 0, severity: str = Vulnerability.SEVERITY_MEDIUM,
+         needs: Tuple[str, ...] = ('index',), title: str = None, message: str = '', recommendation: str = '',
+         variants: Dict[str, Tuple[str, str]] = None, **options):
+    """Register a check function as a pattern rule (registration order is report order)"""
+    def register(check: CheckFn) -> CheckFn:
+        register_rule(rule_id, severity, needs, title=title, message=message, recommendation=recommendation,
+                      variants=variants)
+        PATTERN_RULES.append(PatternRule(rule_id, trigger, check, flags, **options))
+        return check
+    return register
+
+
+_STATE_CHANGE = re.compile(r'(balances\[.*?\]|storage\s+\w+)\s*(=|\+=|-=)')
+VALUE_CALL = re.compile(r'\.(call|send|transfer)\s*\{', re.IGNORECASE)
+_GUARD_CALL = re.compile(r'(require|assert|revert)\s*\(')
+_REQUIRE_FLAG = re.compile(r'require\s*\(\s*\w+\s*,')
+_CAPTURED_BOOL = re.compile(r'\(\s*bool\s+\w+\s*,')
+_REQUIRE_WRAPPED_CALL = re.compile(r'require\s*\(.*\.(call|send)')
+_ACCESS_GUARD = re.compile(r'(require|modifier|onlyOwner|onlyAdmin)', re.IGNORECASE)
+_ONLY_MODIFIER = re.compile(r'(only\w+|require\s*\(\s*msg\.sender)', re.IGNORECASE)
+_STATE_EFFECT = re.compile(r'((?<![=!<>])=(?![=>])|\+=|-=|\.transfer|\.send|\.call|selfdestruct)')
+EXTERNAL_CALL = re.compile(r'\.(call|send|transfer)\s*[({]')
+_NON_PUBLIC = re.compile(r'\b(internal|private|view|pure)\b')
+_OLD_PRAGMA = re.compile(r'pragma\s+solidity\s+\^?0\.[0-7]\.')
+_OVERFLOW_GUARD = re.compile(r'SafeMath|unchecked')
+
+
+def is_state_change(line: str) -> bool:
+    content = line.strip()
+    # Skip empty lines, comments, and require/assert context
+    if not content or content.startswith('//'):
+        return False
+    return bool(_STATE_CHANGE.search(line)) and not _GUARD_CALL.search(line)
+
+
+def reentrancy_finding(call_line: int, write_line: int) -> Vulnerability:
+    return Vulnerability('reentrancy', call_line, write_line=write_line)
+
+
+def loop_call_finding(line: int) -> Vulnerability:
+    return Vulnerability('dos-loop', line)
+
+
+# Answered by dataflow over the CFG when there is one, by the line heuristic otherwise
+@rule('reentrancy', VALUE_CALL.pattern, re.IGNORECASE, severity=Vulnerability.SEVERITY_CRITICAL,
+      needs=('index', 'cfg'), title="Reentrancy",
+      message="Potential reentrancy vulnerability: External call on line {line} followed by state change on line {write_line}",
+      recommendation="Use checks-effects-interactions pattern: update state BEFORE external calls, or use ReentrancyGuard modifier")
+def _reentrancy(ctx: LineContext, i: int, line: str) -> Optional[Vulnerability]:
+    """External call followed by a state change later in the same function"""
+    fn = ctx.index.function_at(i)
+    j = ctx.first_between('state_change', is_state_change, i, fn.end_line if fn else i + 15)
+    if j is None:
+        return None
+    return reentrancy_finding(i, j + 1)
+
+
+@rule('unchecked-call', r'\.(call|send)\s*\{', severity=Vulnerability.SEVERITY_HIGH,
+      title="Unchecked Call Return Value",
+      message="Unchecked return value from external call on line {line}",
+      recommendation="Always check return values: (bool success, ) = address.call(...); require(success, 'Call failed');",
+      variants={'captured': ("Return value captured but not validated with require() on line {line}",
+                             "Add require(success, 'Call failed') to validate the call succeeded")})
+def _unchecked_external_call(ctx: LineContext, i: int, line: str) -> Optional[Vulnerability]:
+    """Return value of .call/.send ignored, or captured but never required"""
+    if _CAPTURED_BOOL.search(line):
+        # Return value is captured, check if it's validated in next few lines of the function
+        fn = ctx.index.function_at(i)
+        hi = min(i + 3, fn.end_line) if fn else i + 3
+        if ctx.any_between('require_flag', lambda l: bool(_REQUIRE_FLAG.search(l)), i, hi):
+            return None
+        return Vulnerability('unchecked-call', i, variant='captured')
+    if _REQUIRE_WRAPPED_CALL.search(line):
+        return None
+    return Vulnerability('unchecked-call', i)
+
+
+def _overflow_possible(ctx: LineContext) -> bool:
+    return (ctx.flag('old_pragma', lambda code: bool(_OLD_PRAGMA.search(code)))
+            and not ctx.flag('overflow_guard', lambda code: bool(_OVERFLOW_GUARD.search(code))))
+
+
+@rule('integer-overflow', r'(\+\+|--|\+=|-=|\*=|/=)', severity=Vulnerability.SEVERITY_HIGH, needs=('text',),
+      applies=_overflow_possible, once=True, title="Integer Overflow/Underflow",
+      message="Potential integer overflow/underflow on line {line} (Solidity < 0.8.0)",
+      recommendation="Use SafeMath library or upgrade to Solidity ^0.8.0")
+def _integer_overflow(ctx: LineContext, i: int, line: str) -> Optional[Vulnerability]:
+    """Arithmetic on Solidity < 0.8 without SafeMath, reported once per contract"""
+    return Vulnerability('integer-overflow', i)
+
+
+@rule('tx-origin', r'tx\.origin', re.IGNORECASE, needs=('text',), title="tx.origin Authentication",
+      message="Using tx.origin for authentication on line {line}",
+      recommendation="Use msg.sender instead of tx.origin for authorization checks")
+def _tx_origin(ctx: LineContext, i: int, line: str) -> Optional[Vulnerability]:
+    return Vulnerability('tx-origin', i)
+
+
+@rule('unprotected-selfdestruct', r'selfdestruct\s*\(', re.IGNORECASE, severity=Vulnerability.SEVERITY_CRITICAL,
+      title="Unprotected Selfdestruct", message="Unprotected selfdestruct call on line {line}",
+      recommendation="Add access control modifier (e.g., onlyOwner) to selfdestruct function")
+def _unprotected_selfdestruct(ctx: LineContext, i: int, line: str) -> Optional[Vulnerability]:
+    """selfdestruct without access control earlier in its function"""
+    fn = ctx.index.function_at(i)
+    if fn is not None:
+        guard_end = ctx.index.line_starts[i] if i < len(ctx.index.line_starts) else len(ctx.code)
+        if _ACCESS_GUARD.search(ctx.code, fn.start, guard_end):
+            return None
+    elif ctx.any_between('access_guard', lambda l: bool(_ACCESS_GUARD.search(l)), i - 5, i + 2):
+        return None
+    return Vulnerability('unprotected-selfdestruct', i)
+
+
+@rule('delegatecall', r'\.delegatecall\s*\(', re.IGNORECASE, severity=Vulnerability.SEVERITY_HIGH, needs=('text',),
+      title="Dangerous Delegatecall",
+      message="Delegatecall usage on line {line} - can be dangerous if target is user-controlled",
+      recommendation="Ensure delegatecall target is trusted and validated. Consider using a whitelist.")
+def _delegatecall(ctx: LineContext, i: int, line: str) -> Optional[Vulnerability]:
+    return Vulnerability('delegatecall', i)
+
+
+@rule('timestamp-dependence', r'(block\.timestamp|now)\s*(==|<|>|<=|>=)', re.IGNORECASE, needs=('text',),
+      title="Timestamp Dependence",
+      message="Timestamp dependence on line {line} - miners can manipulate timestamps",
+      recommendation="Avoid using block.timestamp for critical logic. Use block.number or oracle services.")
+def _timestamp_dependence(ctx: LineContext, i: int, line: str) -> Optional[Vulnerability]:
+    return Vulnerability('timestamp-dependence', i)
+
+
+@rule('uninitialized-storage', r'\s+storage\s+\w+\s*;', severity=Vulnerability.SEVERITY_HIGH, needs=('text',),
+      title="Uninitialized Storage Pointer", message="Uninitialized storage pointer on line {line}",
+      recommendation="Always initialize storage pointers or use memory keyword")
+def _uninitialized_storage(ctx: LineContext, i: int, line: str) -> Optional[Vulnerability]:
+    return Vulnerability('uninitialized-storage', i)
+
+
+@rule('access-control', r'\bfunction\s+\w+', re.IGNORECASE, severity=Vulnerability.SEVERITY_HIGH,
+      title="Missing Access Control",
+      message="Public/external state-changing function without access control on line {line}",
+      recommendation="Add access control modifier or require statement to restrict access")
+def _access_control(ctx: LineContext, i: int, line: str) -> Optional[Vulnerability]:
+    """Public/external function that changes state without a guard"""
+    fn = ctx.index.function_at(i)
+    if fn is None or fn.kind != 'function' or fn.start_line != i:
+        return None
+    if _NON_PUBLIC.search(fn.header) or _ONLY_MODIFIER.search(fn.header):
+        return None
+    if _ONLY_MODIFIER.search(ctx.code, fn.body_start, fn.end):
+        return None
+    if not _STATE_EFFECT.search(ctx.code, fn.body_start, fn.end):
+        return None
+    return Vulnerability('access-control', i)
+
+
+@rule('dos-loop', r'for\s*\(', re.IGNORECASE, needs=('index', 'cfg'), title="DoS with Block Gas Limit",
+      message="Loop starting at line {line} contains external call - potential gas limit DoS",
+      recommendation="Avoid loops with external calls. Use pull over push pattern.")
+def _dos_loop(ctx: LineContext, i: int, line: str) -> Optional[Vulnerability]:
+    """Loop whose body contains an external call"""
+    loops = [s for s in ctx.index.loops_starting_at(i) if s.kind == 'for']
+    if loops:
+        if not any(EXTERNAL_CALL.search(ctx.code, s.body_start, s.end + 1) for s in loops):
+            return None
+    elif not ctx.any_between('external_call', lambda l: bool(EXTERNAL_CALL.search(l)), i, i + 15):
+        return None
+    return loop_call_finding(i)
+
+
+DEFAULT_ENGINE = RuleEngine(PATTERN_RULES)
@@ -3,44 +3,108 @@ Security Vulnerability Analyzer for Solidity Smart Contracts
 Analyzes AST and CFG to detect common vulnerabilities
 """
 import re
-from typing import List, Dict, Any, Set
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
+from budget import Budget
+from cfg_graph import CompactGraph, NodeSpanIndex
+from dataflow import LineFacts, first_line, iter_bits, loop_bodies, solve, state_write_predicate
+from metrics import observe_stage, stage
+from rule_engine import (DEFAULT_ENGINE, EXTERNAL_CALL, RULES, VALUE_CALL, RuleEngine, is_state_change,
+                         loop_call_finding, reentrancy_finding, register_rule)
+from source_index import SourceIndex, Span
+from vulnerability import Vulnerability
+
+
+# Bump whenever detector behaviour changes so cached results are not reused
+ANALYZER_VERSION = "1.5.1"
+
+# Pattern rules answered by dataflow over the CFG wherever the CFG covers the code
+CFG_RULES = ('reentrancy', 'dos-loop')
+
+# Passes that only exist on the CFG, run after the pattern rules in this order
+CFG_PASSES = ('unreachable-code', 'infinite-loop')
+register_rule('unreachable-code', Vulnerability.SEVERITY_INFO, ('cfg',), title="Unreachable Code",
+              message="Unreachable code detected at line {line}",
+              recommendation="Remove dead code or fix control flow logic")
+register_rule('infinite-loop', Vulnerability.SEVERITY_MEDIUM, ('cfg',), title="Potential Infinite Loop",
+              message="Potential infinite loop detected at line {line}",
+              recommendation="Ensure loop has proper exit condition and gas limits")
+
+# `while (true)`, `for (;;)` and `for (...; true; ...)` headers (masked text)
+_CONSTANT_TRUE_LOOP = re.compile(r'(?:while\s*\(\s*true\s*\)|for\s*\([^;]*;\s*(?:true\s*)?;)')
+# Ways out of a loop the CFG does not draw as edges (break is handled separately)
+_LOOP_ESCAPE = re.compile(r'\b(?:return|revert|throw|require|assert)\b')
+_BREAK = re.compile(r'\bbreak\b')
+
+
+class UnknownRule(ValueError):
+    """A rules=/exclude= selection names a rule that is not registered"""
 
-class Vulnerability:
-    """Represents a detected security vulnerability"""
-    
-    SEVERITY_CRITICAL = "critical"
-    SEVERITY_HIGH = "high"
-    SEVERITY_MEDIUM = "medium"
-    SEVERITY_LOW = "low"
-    SEVERITY_INFO = "info"
-    
-    def __init__(self, vuln_type: str, severity: str, line: int, 
-                 description: str, recommendation: str, node_id: str = None):
-        self.type = vuln_type
-        self.severity = severity
-        self.line = line
-        self.description = description
-        self.recommendation = recommendation
-        self.node_id = node_id
-    
-    def to_dict(self) -> Dict[str, Any]:
-        return {
-            "type": self.type,
-            "severity": self.severity,
-            "line": self.line,
-            "description": self.description,
-            "recommendation": self.recommendation,
-            "nodeId": self.node_id
-        }
+
+def select_rules(rules: Iterable[str] = None, exclude: Iterable[str] = None) -> Optional[Tuple[str, ...]]:
+    """
+    Registered rule ids selected by rules (default: all) minus exclude, in
+    report order, or None when that is every rule
+    """
+    named = set(rules or ()) | set(exclude or ())
+    unknown = sorted(named - set(RULES))
+    if unknown:
+        raise UnknownRule(f"Unknown rules: {', '.join(unknown)}")
+    if rules is None and not exclude:
+        return None
+    wanted = set(rules) if rules is not None else set(RULES)
+    wanted -= set(exclude or ())
+    selected = tuple(rule_id for rule_id in RULES if rule_id in wanted)
+    return None if len(selected) == len(RULES) else selected
+
+
+def needs_parse(rules: Optional[Tuple[str, ...]]) -> bool:
+    """Whether any selected rule (None: all) uses the Node parse"""
+    return any(RULES[rule_id].needs_parse for rule_id in (RULES if rules is None else rules))
+
+
+def uncovered_ranges(nodes: List[Dict], line_count: int) -> List[Tuple[int, int]]:
+    """1-based inclusive line ranges not inside any function the CFG describes"""
+    spans = sorted((d['startLine'], d.get('endLine') or d['startLine'])
+                   for d in (n.get('data') or {} for n in nodes)
+                   if d.get('label', '').startswith('Function:') and isinstance(d.get('startLine'), int))
+    ranges = []
+    line = 1
+    for start, end in spans:
+        if start > line:
+            ranges.append((line, start - 1))
+        line = max(line, end + 1)
+    if line <= line_count:
+        ranges.append((line, line_count))
+    return ranges
+
+
+def merge_flow(engine: RuleEngine, found: Dict[str, List[Vulnerability]],
+               flows: List[Dict[str, List[Vulnerability]]]) -> List[Tuple[str, List[Vulnerability]]]:
+    """
+    (rule id, findings) in engine order, adding the dataflow findings of
+    each CFG part (in node order) to the line findings of the CFG_RULES
+    """
+    for rule_id in CFG_RULES:
+        if rule_id in found:
+            extra = [v for flow in flows for v in flow.get(rule_id, ())]
+            found[rule_id] = sorted(found[rule_id] + extra, key=lambda v: v.line)
+    return [(r.id, found[r.id]) for r in engine.rules]
 
 
 class SecurityAnalyzer:
     """Main security analyzer class"""
     
-    def __init__(self):
+    def __init__(self, rule_engine: RuleEngine = None):
+        self.rule_engine = rule_engine or DEFAULT_ENGINE
         self.vulnerabilities: List[Vulnerability] = []
         self.visited_nodes: Set[str] = set()
+        self._node_index: NodeSpanIndex = None
+        self._node_index_nodes: List[Dict] = None
+        self._line_facts: LineFacts = None
+        self._line_facts_nodes: List[Dict] = None
+        self.source_index: SourceIndex = None
     
     def analyze(self, code: str, ast_data: Dict = None, cfg_data: Dict = None) -> Dict[str, Any]:
         """
@@ -54,356 +118,318 @@ class SecurityAnalyzer:
         Returns:
             Dictionary containing vulnerabilities and statistics
         """
+        for _ in self.iter_analyze(code, cfg_data=cfg_data):
+            pass
+        return self.result()
+
+    def iter_analyze(self, code: str, cfg_data: Dict = None, rules: Tuple[str, ...] = None,
+                     budget: Budget = None) -> Iterator[Tuple[str, List[Vulnerability]]]:
+        """
+        Run the detectors in a fixed order, yielding (detector id, new findings)
+
+        Pattern rules come first, in registration order, followed by the CFG
+        passes when a CFG is given. With a CFG, the CFG_RULES are answered by
+        dataflow inside the functions it covers and by their line heuristics
+        elsewhere. Findings are mapped to CFG nodes before they are yielded.
+        rules (see select_rules) limits the run to those detectors; detectors
+        a budget runs out on are cut short and recorded in it.
+        """
         self.vulnerabilities = []
         self.visited_nodes = set()
         
-        # Analyze code patterns
-        self._check_reentrancy(code)
-        self._check_unchecked_external_calls(code)
-        self._check_integer_overflow(code)
-        self._check_tx_origin(code)
-        self._check_unprotected_selfdestruct(code)
-        self._check_delegatecall(code)
-        self._check_timestamp_dependence(code)
-        self._check_uninitialized_storage(code)
-        self._check_access_control(code)
-        self._check_dos_vulnerabilities(code)
-        
-        # Analyze CFG if provided
+        # Preprocess once; every rule reads the same masked text and spans
+        with stage('analyzer.index'):
+            self.source_index = SourceIndex(code)
+
+        nodes = edges = None
         if cfg_data and 'nodes' in cfg_data:
-            self._analyze_cfg(cfg_data, code)
+            nodes = cfg_data.get('nodes', [])
+            edges = cfg_data.get('edges', [])
+
+        # Analyze code patterns in a single pass
+        engine = self.rule_engine if rules is None else self.rule_engine.only(tuple(rules))
+        timings: Dict[str, float] = {}
+        graph = None
+        with stage('analyzer.rules'):
+            if nodes is None:
+                grouped = engine.run_grouped(self.source_index, timings, budget=budget)
+            else:
+                graph = CompactGraph(nodes, edges, skip_hidden=True)
+                grouped = self._run_rules_with_cfg(nodes, edges, graph, timings, engine, budget)
+        for rule_id, seconds in timings.items():
+            observe_stage(f'rule.{rule_id}', seconds)
+        for rule_id, found in grouped:
+            yield rule_id, self._record(found, nodes)
         
+        # Analyze CFG if provided
+        if nodes is not None:
+            passes = CFG_PASSES if rules is None else tuple(p for p in CFG_PASSES if p in rules)
+            for detector, found in self._analyze_cfg(nodes, edges, graph, passes, budget, timings):
+                yield detector, self._record(found, nodes)
+
+    def cfg_rule_checks(self) -> Dict[str, Callable[..., List[Vulnerability]]]:
+        """Dataflow check standing in for each of the CFG_RULES"""
+        return {'reentrancy': self._check_reentrancy, 'dos-loop': self._check_dos_loops}
+
+    def _run_rules_with_cfg(self, nodes: List[Dict], edges: List[Dict], graph: CompactGraph,
+                            timings: Dict[str, float], engine: RuleEngine = None,
+                            budget: Budget = None) -> List[Tuple[str, List[Vulnerability]]]:
+        """Pattern rules, with CFG_RULES replaced by dataflow where the CFG covers the code"""
+        engine = engine or self.rule_engine
+        found = self.line_findings(engine, uncovered_ranges(nodes, len(self.source_index.lines)), timings, budget)
+        flow = self.flow_findings(engine, nodes, edges, graph, timings, budget)
+        return merge_flow(engine, found, [flow])
+
+    def line_findings(self, engine: RuleEngine, ranges: List[Tuple[int, int]] = None,
+                      timings: Dict[str, float] = None, budget: Budget = None) -> Dict[str, List[Vulnerability]]:
+        """
+        Pattern rule findings by rule id; with ranges (the code no CFG
+        function covers) the CFG_RULES only scan those lines
+        """
+        if ranges is None:
+            return dict(engine.run_grouped(self.source_index, timings, budget=budget))
+        found = dict(engine.without(CFG_RULES).run_grouped(self.source_index, timings, budget=budget))
+        flow_rules = [r for r in engine.rules if r.id in CFG_RULES]
+        if flow_rules:
+            found.update(RuleEngine(flow_rules).run_grouped(self.source_index, timings, ranges=ranges, budget=budget))
+        return found
+
+    def flow_findings(self, engine: RuleEngine, nodes: List[Dict], edges: List[Dict], graph: CompactGraph = None,
+                      timings: Dict[str, float] = None, budget: Budget = None) -> Dict[str, List[Vulnerability]]:
+        """
+        Dataflow findings of the engine's CFG_RULES over nodes (the whole CFG
+        or whole functions of it). With a budget, a rule whose timings entry
+        (e.g. from its line heuristics) is past the detector slice is skipped.
+        """
+        checks = self.cfg_rule_checks()
+        found = {}
+        for r in engine.rules:
+            if r.id in CFG_RULES:
+                if budget is not None and not budget.allows(r.id, (timings or {}).get(r.id, 0.0)):
+                    continue
+                started = time.perf_counter()
+                found[r.id] = checks[r.id](nodes, edges, graph)
+                if timings is not None:
+                    timings[r.id] = timings.get(r.id, 0.0) + time.perf_counter() - started
+        return found
+
+    def merge(self, grouped: Iterable[Tuple[str, List[Vulnerability]]], nodes: List[Dict] = None) -> Dict[str, Any]:
+        """Result of findings computed elsewhere (e.g. by parallel.py), recorded in the given order"""
+        self.vulnerabilities = []
+        self.visited_nodes = set()
+        for _, found in grouped:
+            self._record(found, nodes)
+        return self.result()
+
+    def result(self) -> Dict[str, Any]:
+        """Findings, summary and score of the last run"""
         return {
             "vulnerabilities": [v.to_dict() for v in self.vulnerabilities],
             "summary": self._generate_summary(),
             "score": self._calculate_security_score()
         }
+
+    def _record(self, found: List[Vulnerability], nodes: List[Dict] = None) -> List[Vulnerability]:
+        if nodes is not None:
+            with stage('analyzer.map-nodes'):
+                self._map_vulnerabilities_to_nodes(nodes, found)
+        self.vulnerabilities.extend(found)
+        return found
     
-    def _analyze_cfg(self, cfg_data: Dict, code: str):
-        """Analyze control flow graph for vulnerabilities"""
-        nodes = cfg_data.get('nodes', [])
-        edges = cfg_data.get('edges', [])
-        
-        # Check for unreachable code
-        self._check_unreachable_code(nodes, edges)
-        
-        # Check for infinite loops
-        self._check_infinite_loops(nodes, edges)
-        
-        # Map vulnerabilities to CFG nodes
-        self._map_vulnerabilities_to_nodes(nodes, code)
-    
-    def _check_reentrancy(self, code: str):
-        """Detect potential reentrancy vulnerabilities"""
-        lines = code.split('\n')
-        
-        for i, line in enumerate(lines, 1):
-            # Check for external call followed by state change
-            if re.search(r'\.(call|send|transfer)\s*\{', line, re.IGNORECASE):
-                # Look ahead for state changes (skip require/assert lines)
-                for j in range(i, min(i + 15, len(lines))):
-                    line_content = lines[j].strip()
-                    # Skip empty lines, comments, and control statements
-                    if not line_content or line_content.startswith('//'):
-                        continue
-                    
-                    # Check for state changes (but not in require/assert context)
-                    if re.search(r'(balances\[.*?\]|storage\s+\w+)\s*(=|\+=|-=)', lines[j]):
-                        # Check if this is not inside require/assert
-                        if not re.search(r'(require|assert|revert)\s*\(', lines[j]):
-                            self.vulnerabilities.append(Vulnerability(
-                                vuln_type="Reentrancy",
-                                severity=Vulnerability.SEVERITY_CRITICAL,
-                                line=i,
-                                description=f"Potential reentrancy vulnerability: External call on line {i} followed by state change on line {j+1}",
-                                recommendation="Use checks-effects-interactions pattern: update state BEFORE external calls, or use ReentrancyGuard modifier"
-                            ))
-                            break
-    
-    def _check_unchecked_external_calls(self, code: str):
-        """Detect unchecked return values from external calls"""
-        lines = code.split('\n')
-        
-        for i, line in enumerate(lines, 1):
-            # Check for .call, .send without checking return value OR checking but not using require
-            if re.search(r'\.(call|send)\s*\{', line):
-                # Check if return value is captured
-                if re.search(r'\(\s*bool\s+\w+\s*,', line):
-                    # Return value is captured, check if it's validated in next few lines
-                    found_require = False
-                    for j in range(i, min(i + 3, len(lines))):
-                        if re.search(r'require\s*\(\s*\w+\s*,', lines[j]):
-                            found_require = True
-                            break
-                    
-                    if not found_require:
-                        self.vulnerabilities.append(Vulnerability(
-                            vuln_type="Unchecked Call Return Value",
-                            severity=Vulnerability.SEVERITY_HIGH,
-                            line=i,
-                            description=f"Return value captured but not validated with require() on line {i}",
-                            recommendation="Add require(success, 'Call failed') to validate the call succeeded"
-                        ))
-                else:
-                    # Return value not captured at all
-                    if not re.search(r'require\s*\(.*\.(call|send)', line):
-                        self.vulnerabilities.append(Vulnerability(
-                            vuln_type="Unchecked Call Return Value",
-                            severity=Vulnerability.SEVERITY_HIGH,
-                            line=i,
-                            description=f"Unchecked return value from external call on line {i}",
-                            recommendation="Always check return values: (bool success, ) = address.call(...); require(success, 'Call failed');"
-                        ))
-    
-    def _check_integer_overflow(self, code: str):
-        """Detect potential integer overflow/underflow"""
-        lines = code.split('\n')
-        
-        # Check Solidity version
-        has_safe_math = re.search(r'pragma\s+solidity\s+\^?0\.[0-7]\.', code)
-        
-        if has_safe_math:
-            for i, line in enumerate(lines, 1):
-                if re.search(r'(\+\+|--|\+=|-=|\*=|/=)', line):
-                    if not re.search(r'SafeMath|unchecked', code):
-                        self.vulnerabilities.append(Vulnerability(
-                            vuln_type="Integer Overflow/Underflow",
-                            severity=Vulnerability.SEVERITY_HIGH,
-                            line=i,
-                            description=f"Potential integer overflow/underflow on line {i} (Solidity < 0.8.0)",
-                            recommendation="Use SafeMath library or upgrade to Solidity ^0.8.0"
-                        ))
-                        break  # Report once per contract
-    
-    def _check_tx_origin(self, code: str):
-        """Detect usage of tx.origin for authorization"""
-        lines = code.split('\n')
-        
-        for i, line in enumerate(lines, 1):
-            if re.search(r'tx\.origin', line, re.IGNORECASE):
-                self.vulnerabilities.append(Vulnerability(
-                    vuln_type="tx.origin Authentication",
-                    severity=Vulnerability.SEVERITY_MEDIUM,
-                    line=i,
-                    description=f"Using tx.origin for authentication on line {i}",
-                    recommendation="Use msg.sender instead of tx.origin for authorization checks"
-                ))
-    
-    def _check_unprotected_selfdestruct(self, code: str):
-        """Detect unprotected selfdestruct calls"""
-        lines = code.split('\n')
-        
-        for i, line in enumerate(lines, 1):
-            if re.search(r'selfdestruct\s*\(', line, re.IGNORECASE):
-                # Check if there's access control nearby
-                context = '\n'.join(lines[max(0, i-5):min(len(lines), i+2)])
-                if not re.search(r'(require|modifier|onlyOwner|onlyAdmin)', context, re.IGNORECASE):
-                    self.vulnerabilities.append(Vulnerability(
-                        vuln_type="Unprotected Selfdestruct",
-                        severity=Vulnerability.SEVERITY_CRITICAL,
-                        line=i,
-                        description=f"Unprotected selfdestruct call on line {i}",
-                        recommendation="Add access control modifier (e.g., onlyOwner) to selfdestruct function"
-                    ))
-    
-    def _check_delegatecall(self, code: str):
-        """Detect dangerous delegatecall usage"""
-        lines = code.split('\n')
-        
-        for i, line in enumerate(lines, 1):
-            if re.search(r'\.delegatecall\s*\(', line, re.IGNORECASE):
-                self.vulnerabilities.append(Vulnerability(
-                    vuln_type="Dangerous Delegatecall",
-                    severity=Vulnerability.SEVERITY_HIGH,
-                    line=i,
-                    description=f"Delegatecall usage on line {i} - can be dangerous if target is user-controlled",
-                    recommendation="Ensure delegatecall target is trusted and validated. Consider using a whitelist."
-                ))
-    
-    def _check_timestamp_dependence(self, code: str):
-        """Detect timestamp dependence"""
-        lines = code.split('\n')
-        
-        for i, line in enumerate(lines, 1):
-            if re.search(r'(block\.timestamp|now)\s*(==|<|>|<=|>=)', line, re.IGNORECASE):
-                self.vulnerabilities.append(Vulnerability(
-                    vuln_type="Timestamp Dependence",
-                    severity=Vulnerability.SEVERITY_MEDIUM,
-                    line=i,
-                    description=f"Timestamp dependence on line {i} - miners can manipulate timestamps",
-                    recommendation="Avoid using block.timestamp for critical logic. Use block.number or oracle services."
-                ))
-    
-    def _check_uninitialized_storage(self, code: str):
-        """Detect uninitialized storage pointers"""
-        lines = code.split('\n')
-        
-        for i, line in enumerate(lines, 1):
-            # Look for storage variables without initialization
-            if re.search(r'\s+storage\s+\w+\s*;', line):
-                self.vulnerabilities.append(Vulnerability(
-                    vuln_type="Uninitialized Storage Pointer",
-                    severity=Vulnerability.SEVERITY_HIGH,
-                    line=i,
-                    description=f"Uninitialized storage pointer on line {i}",
-                    recommendation="Always initialize storage pointers or use memory keyword"
-                ))
-    
-    def _check_access_control(self, code: str):
-        """Detect missing access control"""
-        lines = code.split('\n')
-        
-        # Look for state-changing functions without modifiers
-        in_function = False
-        function_line = 0
-        function_visibility = ""
-        
-        for i, line in enumerate(lines, 1):
-            func_match = re.search(r'function\s+(\w+)\s*\([^)]*\)\s*(public|external)?\s*(.*?)\s*\{?', line, re.IGNORECASE)
-            if func_match:
-                in_function = True
-                function_line = i
-                function_visibility = func_match.group(2) or "public"
-                modifiers = func_match.group(3) or ""
-                
-                # Check for state-changing functions without access control
-                if function_visibility in ['public', 'external']:
-                    if not re.search(r'(only\w+|require\s*\(\s*msg\.sender)', modifiers, re.IGNORECASE):
-                        # Check if function changes state
-                        func_body_start = i
-                        func_body_end = min(i + 20, len(lines))
-                        func_body = '\n'.join(lines[func_body_start:func_body_end])
-                        
-                        if re.search(r'(=|\+=|-=|\.transfer|\.send|\.call|selfdestruct)', func_body):
-                            self.vulnerabilities.append(Vulnerability(
-                                vuln_type="Missing Access Control",
-                                severity=Vulnerability.SEVERITY_HIGH,
-                                line=function_line,
-                                description=f"Public/external state-changing function without access control on line {function_line}",
-                                recommendation="Add access control modifier or require statement to restrict access"
-                            ))
-    
-    def _check_dos_vulnerabilities(self, code: str):
-        """Detect potential Denial of Service vulnerabilities"""
-        lines = code.split('\n')
-        
-        for i, line in enumerate(lines, 1):
-            # Check for loops with external calls
-            if re.search(r'for\s*\(', line, re.IGNORECASE):
-                # Look ahead for external calls in loop body
-                for j in range(i, min(i + 15, len(lines))):
-                    if re.search(r'\.(call|send|transfer)\s*\(', lines[j]):
-                        self.vulnerabilities.append(Vulnerability(
-                            vuln_type="DoS with Block Gas Limit",
-                            severity=Vulnerability.SEVERITY_MEDIUM,
-                            line=i,
-                            description=f"Loop starting at line {i} contains external call - potential gas limit DoS",
-                            recommendation="Avoid loops with external calls. Use pull over push pattern."
-                        ))
-                        break
+    def _analyze_cfg(self, nodes: List[Dict], edges: List[Dict], graph: CompactGraph = None,
+                     detectors: Tuple[str, ...] = CFG_PASSES, budget: Budget = None,
+                     timings: Dict[str, float] = None) -> Iterator[Tuple[str, List[Vulnerability]]]:
+        """
+        Analyze control flow graph for vulnerabilities, one pass at a time
+
+        Each pass's seconds are accumulated into timings when given, so over
+        repeated calls (per function, per chunk) a pass past the budget's
+        detector slice is skipped like one that runs out of request time.
+        """
+        passes = (
+            # Check for unreachable code
+            ('unreachable-code', lambda: self._check_unreachable_code(nodes, edges, graph)),
+            # Check for infinite loops
+            ('infinite-loop', lambda: self._check_infinite_loops(nodes, edges, graph)),
+        )
+        total = 0.0
+        for detector, check in passes:
+            if detector not in detectors:
+                continue
+            if budget is not None and not budget.allows(detector, (timings or {}).get(detector, 0.0)):
+                continue
+            started = time.perf_counter()
+            found = check()
+            elapsed = time.perf_counter() - started
+            if timings is not None:
+                timings[detector] = timings.get(detector, 0.0) + elapsed
+            observe_stage(f'detector.{detector}', elapsed)
+            total += elapsed
+            yield detector, found
+        observe_stage('analyzer.cfg', total)
     
-    def _check_unreachable_code(self, nodes: List[Dict], edges: List[Dict]):
+    def _check_unreachable_code(self, nodes: List[Dict], edges: List[Dict],
+                                graph: CompactGraph = None) -> List[Vulnerability]:
         """Detect unreachable nodes in CFG"""
-        # Build adjacency list
-        incoming = {node['id']: [] for node in nodes}
-        for edge in edges:
-            if edge['target'] in incoming:
-                incoming[edge['target']].append(edge['source'])
+        found = []
+        # Hidden edges are self-loops, so a graph without them has the same reachability
+        graph = graph or CompactGraph(nodes, edges)
         
         # Find entry nodes
-        entry_nodes = [node for node in nodes if node.get('type') == 'entry']
+        entry_nodes = [i for i, node in enumerate(nodes) if node.get('type') == 'entry']
         
         if not entry_nodes:
-            return
+            return found
         
         # BFS to find reachable nodes
-        reachable = set()
-        queue = [node['id'] for node in entry_nodes]
-        
-        while queue:
-            current = queue.pop(0)
-            if current in reachable:
-                continue
-            reachable.add(current)
-            
-            for edge in edges:
-                if edge['source'] == current and edge['target'] not in reachable:
-                    queue.append(edge['target'])
+        reachable = graph.reachable(entry_nodes)
         
         # Report unreachable nodes (but skip function labels and normal nodes)
-        for node in nodes:
-            if node['id'] not in reachable and node.get('type') not in ['entry', 'exit', 'default']:
+        for i, node in enumerate(nodes):
+            if not reachable[i] and node.get('type') not in ['entry', 'exit', 'default']:
                 line = node.get('data', {}).get('startLine', 0)
                 # Only report if it's actual code, not metadata
                 if line and line > 1:  # Skip line 1 which is usually pragma
-                    self.vulnerabilities.append(Vulnerability(
-                        vuln_type="Unreachable Code",
-                        severity=Vulnerability.SEVERITY_INFO,
-                        line=line,
-                        description=f"Unreachable code detected at line {line}",
-                        recommendation="Remove dead code or fix control flow logic",
-                        node_id=node['id']
-                    ))
+                    found.append(Vulnerability('unreachable-code', line, node['id']))
+        return found
     
-    def _check_infinite_loops(self, nodes: List[Dict], edges: List[Dict]):
-        """Detect potential infinite loops"""
-        # Build adjacency list
-        graph = {}
-        for node in nodes:
-            graph[node['id']] = []
-        
-        for edge in edges:
-            if edge['source'] in graph:
-                graph[edge['source']].append(edge['target'])
-        
-        # Detect cycles without exit conditions
-        def has_cycle(node_id, visited, rec_stack):
-            visited.add(node_id)
-            rec_stack.add(node_id)
-            
-            for neighbor in graph.get(node_id, []):
-                if neighbor not in visited:
-                    if has_cycle(neighbor, visited, rec_stack):
-                        return True
-                elif neighbor in rec_stack:
-                    # Found cycle
-                    return True
-            
-            rec_stack.remove(node_id)
-            return False
-        
-        visited = set()
-        for node in nodes:
-            if node['id'] not in visited:
-                rec_stack = set()
-                if has_cycle(node['id'], visited, rec_stack):
-                    # Check if it's a loop construct
-                    node_label = node.get('data', {}).get('label', '').lower()
-                    if 'while' in node_label or 'for' in node_label:
-                        line = node.get('data', {}).get('startLine', 0)
-                        self.vulnerabilities.append(Vulnerability(
-                            vuln_type="Potential Infinite Loop",
-                            severity=Vulnerability.SEVERITY_MEDIUM,
-                            line=line,
-                            description=f"Potential infinite loop detected at line {line}",
-                            recommendation="Ensure loop has proper exit condition and gas limits",
-                            node_id=node['id']
-                        ))
+    def _check_infinite_loops(self, nodes: List[Dict], edges: List[Dict],
+                              graph: CompactGraph = None) -> List[Vulnerability]:
+        """Detect loops (cyclic regions of the CFG) none of whose exit edges can be taken"""
+        found = []
+        # Hidden edges are layout helpers (e.g. the if-without-else self-loop), not control flow
+        graph = graph or CompactGraph(nodes, edges, skip_hidden=True)
+        
+        for loop in graph.loops():
+            if any(self._exit_can_be_taken(nodes, edges[e], graph) for e in loop.exits):
+                continue
+            node = nodes[self._loop_condition(nodes, loop.header, loop.members)]
+            line = node.get('data', {}).get('startLine', 0)
+            found.append(Vulnerability('infinite-loop', line, node['id']))
+        return found
+
+    def _exit_can_be_taken(self, nodes: List[Dict], edge: Dict, graph: CompactGraph) -> bool:
+        """
+        False for the false edge of a constant-true loop condition whose body
+        has no break, return or revert; any other exit edge may be taken
+        """
+        if edge.get('label') != 'false':
+            return True
+        span = self._condition_span(nodes[graph.index[edge['source']]])
+        if span is None or not _CONSTANT_TRUE_LOOP.match(span.header):
+            return True
+        return self._loop_can_escape(span)
+
+    def _condition_span(self, node: Dict) -> Optional[Span]:
+        """Source loop behind a While/For condition node, when the source index has it"""
+        data = node.get('data') or {}
+        label = data.get('label', '')
+        if self.source_index is None or label not in ('While condition', 'For condition'):
+            return None
+        kind = label.split()[0].lower()
+        for span in self.source_index.loops_starting_at(data.get('startLine')):
+            if span.kind == kind:
+                return span
+        return None
+
+    def _loop_can_escape(self, span: Span) -> bool:
+        """A return/revert anywhere in the body, or a break outside its nested loops"""
+        index = self.source_index
+        body = index.masked[span.body_start:span.end + 1]
+        if _LOOP_ESCAPE.search(body):
+            return True
+        nested = [inner for inner in index.loops if span.body_start < inner.start and inner.end <= span.end]
+        for m in _BREAK.finditer(body):
+            offset = span.body_start + m.start()
+            if not any(inner.body_start <= offset <= inner.end for inner in nested):
+                return True
+        return False
     
-    def _map_vulnerabilities_to_nodes(self, nodes: List[Dict], code: str):
-        """Map detected vulnerabilities to CFG nodes"""
-        for vuln in self.vulnerabilities:
-            if vuln.node_id:
+    def _check_reentrancy(self, nodes: List[Dict], edges: List[Dict],
+                          graph: CompactGraph = None) -> List[Vulnerability]:
+        """Value-carrying external calls that may be followed by a storage write on some path"""
+        graph = graph or CompactGraph(nodes, edges, skip_hidden=True)
+        facts = self._facts(nodes)
+        calls = facts.nodes_with('value_call')
+        if not calls:
+            return []
+        writes = facts.nodes_with('state_write')
+
+        # Forward may-analysis, one bit per call line: "this call may already have happened"
+        call_lines = sorted(line for lines in calls.values() for line in lines)
+        bit = {line: k for k, line in enumerate(call_lines)}
+        gen = [0] * graph.size
+        for v, lines in calls.items():
+            for line in lines:
+                gen[v] |= 1 << bit[line]
+        flow = solve(graph, gen, [0] * graph.size)
+
+        # Storage written after the call: the writes each call reaches
+        reached: Dict[int, List[int]] = {}
+        for v, write_lines in writes.items():
+            pending = flow.entry[v]
+            # A multi-line statement may write after its own call
+            for line in calls.get(v, ()):
+                if any(w > line for w in write_lines):
+                    pending |= 1 << bit[line]
+            for k in iter_bits(pending):
+                reached.setdefault(call_lines[k], []).extend(write_lines)
+
+        found = []
+        for call_line in sorted(reached):
+            lines = reached[call_line]
+            later = [w for w in lines if w > call_line]
+            found.append(reentrancy_finding(call_line, min(later) if later else min(lines)))
+        return found
+
+    def _check_dos_loops(self, nodes: List[Dict], edges: List[Dict],
+                         graph: CompactGraph = None) -> List[Vulnerability]:
+        """Natural loops whose body contains an external call"""
+        graph = graph or CompactGraph(nodes, edges, skip_hidden=True)
+        calls = self._facts(nodes).nodes_with('external_call')
+        if not calls:
+            return []
+        found = []
+        reported = set()
+        for header, body in loop_bodies(graph):
+            if not any(v in calls for v in body):
                 continue
-            
-            # Find node that corresponds to vulnerability line
-            for node in nodes:
-                start_line = node.get('data', {}).get('startLine', 0)
-                end_line = node.get('data', {}).get('endLine', 999999)
-                
-                if start_line <= vuln.line <= end_line:
-                    vuln.node_id = node['id']
-                    break
+            line = first_line(nodes, self._loop_condition(nodes, header, body))
+            if line is not None and line not in reported:
+                reported.add(line)
+                found.append(loop_call_finding(line))
+        found.sort(key=lambda v: v.line)
+        return found
+
+    @staticmethod
+    def _loop_condition(nodes: List[Dict], header: int, members: List[int]) -> int:
+        """The loop's while/for condition node when there is one, else its header"""
+        for i in members:
+            label = nodes[i].get('data', {}).get('label', '').lower()
+            if 'while' in label or 'for' in label:
+                return i
+        return header
+
+    def _facts(self, nodes: List[Dict]) -> LineFacts:
+        """Call and storage-write lines per statement node, shared by the dataflow checks"""
+        if self._line_facts is None or self._line_facts_nodes is not nodes:
+            index = self.source_index
+            self._line_facts = LineFacts(nodes, index, {
+                'value_call': lambda text: bool(VALUE_CALL.search(text)),
+                'external_call': lambda text: bool(EXTERNAL_CALL.search(text)),
+                'state_write': state_write_predicate(index, is_state_change),
+            })
+            self._line_facts_nodes = nodes
+        return self._line_facts
+
+    def _map_vulnerabilities_to_nodes(self, nodes: List[Dict], vulnerabilities: List[Vulnerability]):
+        """Map detected vulnerabilities to the innermost CFG node spanning their line"""
+        if self._node_index is None or self._node_index_nodes is not nodes:
+            self._node_index = NodeSpanIndex(nodes)
+            self._node_index_nodes = nodes
+        for vuln in vulnerabilities:
+            if not vuln.node_id:
+                vuln.node_id = self._node_index.node_at(vuln.line)
     
     def _generate_summary(self) -> Dict[str, Any]:
         """Generate vulnerability summary statistics"""
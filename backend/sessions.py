@@ -0,0 +1,419 @@
+"""
+Incremental per-function analysis for editor sessions
+A session keeps one unit per function, keyed by its signature: its
+fingerprint (normalized source plus the state variables it mentions),
+CFG nodes/edges and findings. On each update only functions whose
+fingerprint changed are re-parsed through the Node helper and re-checked;
+unchanged functions keep their node ids and positions and are only moved
+when lines above them were inserted or removed. Changed functions whose
+body was analyzed before, in any source, come from the function cache.
+"""
+import bisect
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from cfg_graph import CompactGraph, NodeSpanIndex
+from function_cache import fragment_key, load_fragment, mentioned_state, store_fragment
+from layout import layered_layout
+from metrics import stage
+from node_pool import get_parser
+from pipeline import annotate_cfg
+from rule_engine import DEFAULT_ENGINE, RuleEngine
+from security_analyzer import CFG_RULES, SecurityAnalyzer
+from source_index import SourceIndex, Span, normalize_lines
+from vulnerability import Vulnerability
+
+
+CFG_DETECTORS = ('unreachable-code', 'infinite-loop')
+
+Finding = Tuple[str, Vulnerability]
+# What check_functions needs of a function: key, first and last line, CFG nodes and edges
+CheckUnit = Tuple[str, int, int, List[Dict[str, Any]], List[Dict[str, Any]]]
+
+
+class SessionError(ValueError):
+    """Raised for malformed session updates"""
+
+
+class VersionConflict(Exception):
+    """Raised when an edit targets a version other than the session's current one"""
+
+
+class FunctionUnit:
+    """One function of the session source and everything derived from it"""
+
+    __slots__ = ('key', 'fingerprint', 'start_line', 'end_line', 'slot',
+                 'nodes', 'edges', 'findings', 'error')
+
+    def __init__(self, key: str, fingerprint: str, span: Span, slot: int):
+        self.key = key
+        self.fingerprint = fingerprint
+        self.start_line = span.start_line
+        self.end_line = span.end_line
+        self.slot = slot
+        self.nodes: List[Dict[str, Any]] = []
+        self.edges: List[Dict[str, Any]] = []
+        self.findings: List[Finding] = []
+        self.error: Optional[str] = None
+
+    def move_to(self, start_line: int):
+        """Shift node lines and findings after lines above the function changed"""
+        delta = start_line - self.start_line
+        if not delta:
+            return
+        for node in self.nodes:
+            data = node.get('data') or {}
+            for field in ('startLine', 'endLine'):
+                if isinstance(data.get(field), int):
+                    data[field] += delta
+        for _, vuln in self.findings:
+            vuln.shift(delta)
+        self.start_line += delta
+        self.end_line += delta
+
+
+def _split_rules(engine: RuleEngine) -> Tuple[RuleEngine, RuleEngine]:
+    local = [r for r in engine.rules if not r.file_scope]
+    whole = [r for r in engine.rules if r.file_scope]
+    return RuleEngine(local), RuleEngine(whole)
+
+
+_LOCAL_RULES, _FILE_RULES = _split_rules(DEFAULT_ENGINE)
+
+
+def check_functions(source, units: List[CheckUnit], local_rules: RuleEngine = None) -> Dict[str, List[Finding]]:
+    """
+    Findings of each function in units (source is the code or its SourceIndex)
+
+    One rule pass covers all of them, split back per function; functions
+    with a CFG get the CFG_RULES from dataflow and the CFG passes too.
+    Depends only on its arguments, so it can run in a worker process.
+    """
+    index = source if isinstance(source, SourceIndex) else SourceIndex(source)
+    local_rules = local_rules or _LOCAL_RULES
+    flow_rules = local_rules.only(tuple(r.id for r in local_rules.rules if r.id in CFG_RULES))
+    ordered = sorted(units, key=lambda u: u[1])
+    starts = [start for _, start, _, _, _ in ordered]
+    per_unit: Dict[str, List[Finding]] = {key: [] for key, _, _, _, _ in units}
+    ranges = [(start, end) for _, start, end, _, _ in ordered]
+    without_cfg = [(start, end) for _, start, end, nodes, _ in ordered if not nodes]
+    grouped = local_rules.without(CFG_RULES).run_grouped(index, ranges=ranges)
+    if without_cfg:
+        grouped += flow_rules.run_grouped(index, ranges=without_cfg)
+    for rule_id, found in grouped:
+        for v in found:
+            key = ordered[bisect.bisect_right(starts, v.line) - 1][0]
+            per_unit[key].append((rule_id, v))
+
+    analyzer = SecurityAnalyzer()
+    analyzer.source_index = index
+    checks = analyzer.cfg_rule_checks()
+    for key, _, _, nodes, edges in units:
+        if not nodes:
+            continue
+        findings = per_unit[key]
+        graph = CompactGraph(nodes, edges, skip_hidden=True)
+        for rule in flow_rules.rules:
+            for v in checks[rule.id](nodes, edges, graph):
+                findings.append((rule.id, v))
+        for detector, found in analyzer._analyze_cfg(nodes, edges, graph):
+            findings.extend((detector, v) for v in found)
+        node_index = NodeSpanIndex(nodes)
+        for _, v in findings:
+            if not v.node_id:
+                v.node_id = node_index.node_at(v.line)
+    return per_unit
+
+
+def function_units(index: SourceIndex) -> List[Tuple[str, str, Span]]:
+    """
+    (key, fingerprint, span) for every function with a body, in source order
+
+    Keys are signatures, so adding an overload leaves the other overloads'
+    keys alone; the ordinal only separates equal signatures (e.g. the same
+    function in two contracts of one file).
+    """
+    seen: Dict[str, int] = {}
+    units = []
+    for span in index.functions:
+        if span.kind == 'modifier':
+            continue
+        signature = span.signature
+        ordinal = seen.get(signature, 0)
+        seen[signature] = ordinal + 1
+        text = normalize_lines(index.code[span.start:span.end + 1])
+        # CFG rules treat writes to state differently, so declaring or removing one re-checks its users
+        text += '\0' + ' '.join(mentioned_state(index, text))
+        units.append((f"{signature}#{ordinal}", hashlib.sha256(text.encode('utf-8')).hexdigest(), span))
+    return units
+
+
+def apply_edits(code: str, edits: List[Dict[str, Any]]) -> str:
+    """Apply [{"start", "end", "text"}] character-offset replacements in order"""
+    for i, edit in enumerate(edits):
+        if not isinstance(edit, dict):
+            raise SessionError(f"Edit #{i} must be an object")
+        start, end, text = edit.get('start'), edit.get('end', edit.get('start')), edit.get('text', '')
+        if not isinstance(start, int) or not isinstance(end, int) or not isinstance(text, str):
+            raise SessionError(f"Edit #{i} needs integer 'start'/'end' and string 'text'")
+        if not 0 <= start <= end <= len(code):
+            raise SessionError(f"Edit #{i} range {start}-{end} is outside the source")
+        code = code[:start] + text + code[end:]
+    return code
+
+
+class Session:
+    """Per-editor state: the current source and its function units"""
+
+    def __init__(self, session_id: str, engine: RuleEngine = None, layered: bool = False):
+        self.id = session_id
+        # Serve layout.layered_layout positions; unchanged functions hit its per-function cache
+        self.layered = layered
+        self.code = ''
+        self.version = 0
+        self.units: Dict[str, FunctionUnit] = {}
+        self.order: List[str] = []
+        # Keys of the last update's changed functions served from the function cache
+        self.reused: List[str] = []
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+        self._local_rules, self._file_rules = _split_rules(engine) if engine else (_LOCAL_RULES, _FILE_RULES)
+        self._detector_order = {r.id: i for i, r in enumerate((engine or DEFAULT_ENGINE).rules)}
+        for detector in CFG_DETECTORS:
+            self._detector_order[detector] = len(self._detector_order)
+
+    def update(self, code: str, run_checks: Callable[..., Dict[str, List[Finding]]] = None) -> Dict[str, Any]:
+        """
+        Bring the session to code and return the analysis with the changed function keys
+
+        run_checks(code, units) replaces the in-process check_functions call
+        (e.g. to run it on the process pool); it only sees the default rules.
+        """
+        with stage('session.index'):
+            index = SourceIndex(code)
+            units = function_units(index)
+
+        changed: List[Tuple[FunctionUnit, Span]] = []
+        kept: Dict[str, FunctionUnit] = {}
+        # Surviving functions keep their layout slot; new ones take the lowest free slot
+        used = {self.units[key].slot for key, _, _ in units if key in self.units}
+        next_slot = 0
+        for key, fingerprint, span in units:
+            unit = self.units.get(key)
+            if unit is not None and unit.fingerprint == fingerprint:
+                unit.move_to(span.start_line)
+            else:
+                if unit is not None:
+                    slot = unit.slot
+                else:
+                    while next_slot in used:
+                        next_slot += 1
+                    slot = next_slot
+                    used.add(slot)
+                unit = FunctionUnit(key, fingerprint, span, slot)
+                changed.append((unit, span))
+            kept[key] = unit
+
+        self.units = kept
+        self.order = [key for key, _, _ in units]
+        self.code = code
+        self.version += 1
+
+        self.reused = []
+        if changed:
+            self._rebuild(index, changed, run_checks)
+        return self._result(index, [unit.key for unit, _ in changed])
+
+    def edit(self, edits: List[Dict[str, Any]], base_version: int) -> Dict[str, Any]:
+        """Apply character edits made against base_version, then update"""
+        if base_version != self.version:
+            raise VersionConflict(f"Session is at version {self.version}, edits target {base_version}")
+        return self.update(apply_edits(self.code, edits))
+
+    def _rebuild(self, index: SourceIndex, changed: List[Tuple[FunctionUnit, Span]],
+                 run_checks: Callable[..., Dict[str, List[Finding]]] = None):
+        """Parse, build and check only the changed functions not in the function cache"""
+        keys = {unit.key: fragment_key(index, span) for unit, span in changed}
+        missing = []
+        for unit, span in changed:
+            fragment = load_fragment(keys[unit.key], f"{unit.key}/", unit.slot, unit.start_line)
+            if fragment is None:
+                missing.append((unit, span))
+                continue
+            unit.nodes, unit.edges, unit.findings = fragment
+            self.reused.append(unit.key)
+        changed = missing
+        if not changed:
+            return
+
+        snippets = []
+        for unit, span in changed:
+            # Pad so the snippet's line numbers match the full source
+            text = index.code[span.start:span.end + 1]
+            snippet = '\n' * (span.start_line - 1) + 'contract __Session { ' + text + '\n}\n'
+            snippets.append({"key": unit.key, "prefix": f"{unit.key}/", "slot": unit.slot, "code": snippet})
+
+        with stage('session.parse'):
+            try:
+                parsed = get_parser().parse({"functions": snippets})
+                results = {r['key']: r for r in json.loads(parsed).get('results', [])}
+            except Exception as e:
+                results = {unit.key: {"error": str(e)} for unit, _ in changed}
+
+        for unit, _ in changed:
+            entry = results.get(unit.key) or {"error": "Parse failed"}
+            unit.error = entry.get('error')
+            unit.nodes = entry.get('nodes', [])
+            unit.edges = entry.get('edges', [])
+
+        units = [(unit.key, span.start_line, span.end_line, unit.nodes, unit.edges) for unit, span in changed]
+        with stage('session.check'):
+            if run_checks is not None:
+                per_unit = run_checks(index.code, units)
+            else:
+                per_unit = check_functions(index, units, self._local_rules)
+        for unit, _ in changed:
+            unit.findings = per_unit[unit.key]
+            if unit.nodes:
+                store_fragment(keys[unit.key], f"{unit.key}/", unit.slot, unit.start_line,
+                               unit.nodes, unit.edges, unit.findings)
+
+    def _outside_ranges(self, index: SourceIndex) -> List[Tuple[int, int]]:
+        """Line ranges not covered by any function unit (state, modifiers, pragmas)"""
+        ranges = []
+        line = 1
+        for key in self.order:
+            unit = self.units[key]
+            if unit.start_line > line:
+                ranges.append((line, unit.start_line - 1))
+            line = max(line, unit.end_line + 1)
+        if line <= len(index.lines):
+            ranges.append((line, len(index.lines)))
+        return ranges
+
+    def _result(self, index: SourceIndex, changed: List[str]) -> Dict[str, Any]:
+        units = [self.units[key] for key in self.order]
+        nodes = [node for unit in units for node in unit.nodes]
+        edges = [edge for unit in units for edge in unit.edges]
+
+        # Lines outside functions and whole-file rules are cheap and always rechecked
+        findings: List[Finding] = [f for unit in units for f in unit.findings]
+        extra: List[Finding] = []
+        for rule_id, found in self._local_rules.run_grouped(index, ranges=self._outside_ranges(index)):
+            extra.extend((rule_id, v) for v in found)
+        for rule_id, found in self._file_rules.run_grouped(index):
+            extra.extend((rule_id, v) for v in found)
+        if extra and nodes:
+            node_index = NodeSpanIndex(nodes)
+            for _, v in extra:
+                v.node_id = node_index.node_at(v.line)
+        findings.extend(extra)
+        findings.sort(key=lambda f: (self._detector_order.get(f[0], len(self._detector_order)), f[1].line))
+
+        analyzer = SecurityAnalyzer()
+        analyzer.vulnerabilities = [v for _, v in findings]
+        result = analyzer.result()
+
+        # Annotate copies so the stored units stay clean for the next update
+        vulnerable = {v['nodeId'] for v in result['vulnerabilities'] if v.get('nodeId')}
+        shown = [dict(n, data=dict(n.get('data') or {}), style=dict(n.get('style') or {}))
+                 if n['id'] in vulnerable else n for n in nodes]
+        if self.layered:
+            # Positions are replaced, so the stored units must not be laid out in place
+            shown = [dict(n) for n in shown]
+        cfg = {"nodes": shown, "edges": edges}
+        if self.layered:
+            with stage('cfg.layout'):
+                # Columns follow layout slots, so edits leave other functions where they were
+                layered_layout(cfg, {unit.nodes[0]['id']: unit.slot for unit in units if unit.nodes})
+        with stage('cfg.annotate'):
+            annotate_cfg(cfg, result['vulnerabilities'])
+
+        result['cfg'] = cfg
+        result['sessionId'] = self.id
+        result['version'] = self.version
+        result['changed'] = changed
+        result['reused'] = self.reused
+        errors = {unit.key: unit.error for unit in units if unit.error}
+        if errors:
+            result['errors'] = errors
+        return result
+
+
+def analyze_by_function(code: str, run_checks: Callable[..., Dict[str, List[Finding]]] = None) -> Dict[str, Any]:
+    """
+    One-off analysis assembled per function, so functions seen in other
+    sources come from the function cache instead of being parsed again
+    (run_checks as for Session.update)
+    """
+    session = Session('scan')
+    result = session.update(code, run_checks)
+    for field in ('sessionId', 'version', 'changed'):
+        result.pop(field, None)
+    return result
+
+
+class SessionStore:
+    """Bounded, expiring map of session id -> Session"""
+
+    def __init__(self, ttl: float = 1800, max_sessions: int = 200):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions: 'OrderedDict[str, Session]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, layered: bool = False) -> Session:
+        session = Session(uuid.uuid4().hex, layered=layered)
+        with self._lock:
+            self._reap()
+            self._sessions[session.id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            self._reap()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_used = time.monotonic()
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def _reap(self):
+        cutoff = time.monotonic() - self.ttl
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_used >= cutoff:
+                break
+            del self._sessions[session_id]
+
+
+_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """Return the process-wide session store configured from the environment"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SessionStore(
+                ttl=float(os.environ.get('SESSION_TTL', '1800')),
+                max_sessions=int(os.environ.get('SESSION_MAX', '200')),
+            )
+        return _store
@@ -0,0 +1,276 @@
+"""
+Preprocessed view of a Solidity source shared by every detector
+Built once per analysis in O(n): comment/string-masked text, a line-start
+offset table, brace-matched function/modifier/loop spans, a
+line -> enclosing function lookup and, on demand, state variable names.
+"""
+import bisect
+import re
+from typing import Dict, FrozenSet, List, Optional
+
+
+_HEADER = re.compile(r'\b(function|modifier|constructor|fallback|receive|for|while|do)\b')
+_NAME = re.compile(r'\s*(\w+)')
+_CONTRACT = re.compile(r'\b(?:contract|library)\s+\w+[^{;]*\{')
+_NOT_STATE = re.compile(
+    r'^\s*(?:using|event|error|function|modifier|constructor|fallback|receive|struct|enum|type)\b'
+    r'|\b(?:constant|immutable)\b'
+)
+_INITIALIZER = re.compile(r'(?<![=!<>])=(?![=>])')
+_LAST_NAME = re.compile(r'(\w+)\s*$')
+_DATA_LOCATION = re.compile(r'\b(?:memory|storage|calldata|indexed)\b')
+_TYPE_ALIASES = {'uint': 'uint256', 'int': 'int256', 'byte': 'bytes1'}
+_COMMENT_OR_STRING = re.compile(
+    r'//[^\n]*|/\*.*?(?:\*/|\Z)|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'',
+    re.DOTALL,
+)
+
+FUNCTION_KINDS = ('function', 'modifier', 'constructor', 'fallback', 'receive')
+LOOP_KINDS = ('for', 'while', 'do')
+
+
+def _blank(m: re.Match) -> str:
+    text = m.group()
+    if text[0] in '"\'':
+        return text[0] + ' ' * (len(text) - 2) + text[-1]
+    return re.sub(r'[^\n]', ' ', text)
+
+
+def mask_source(code: str) -> str:
+    """Blank out comments and string contents, keeping offsets and newlines intact"""
+    return _COMMENT_OR_STRING.sub(_blank, code)
+
+
+def _blank_comment(m: re.Match) -> str:
+    text = m.group()
+    return text if text[0] in '"\'' else re.sub(r'[^\n]', ' ', text)
+
+
+def parameter_types(params: str) -> List[str]:
+    """Canonical types of a (masked) parameter list: names and data locations dropped, aliases expanded"""
+    types, pieces, depth, start = [], [], 0, 0
+    for i, ch in enumerate(params):
+        if ch in '([':
+            depth += 1
+        elif ch in ')]':
+            depth -= 1
+        elif ch == ',' and depth == 0:
+            pieces.append(params[start:i])
+            start = i + 1
+    pieces.append(params[start:])
+    for piece in pieces:
+        piece = ' '.join(_DATA_LOCATION.sub(' ', piece).split())
+        if not piece:
+            continue
+        words = piece.split(' ')
+        # A trailing identifier after the type is the parameter name
+        if len(words) > 1 and re.fullmatch(r'\w+', words[-1]) and words[-1] != 'payable':
+            words.pop()
+        typ = re.sub(r'\s*([()\[\],])\s*', r'\1', ' '.join(words))
+        types.append(re.sub(r'\b(uint|int|byte)\b', lambda m: _TYPE_ALIASES[m.group(1)], typ))
+    return types
+
+
+def normalize_lines(code: str) -> str:
+    """
+    Source with comments removed and each line's whitespace trimmed
+
+    Line structure is kept, so two texts normalize equally only when their
+    code (strings included) sits on the same relative lines.
+    """
+    stripped = _COMMENT_OR_STRING.sub(_blank_comment, code)
+    return '\n'.join(line.strip() for line in stripped.split('\n'))
+
+
+class Span:
+    """A brace-delimited region of the source (function, modifier or loop)"""
+
+    __slots__ = ('kind', 'name', 'start', 'end', 'body_start', 'start_line', 'end_line',
+                 'body_start_line', 'header', 'params')
+
+    def __init__(self, kind: str, name: str, start: int, body_start: int, end: int, header: str,
+                 params: str = ''):
+        self.kind = kind
+        self.name = name
+        self.start = start
+        self.body_start = body_start
+        self.end = end
+        self.header = header
+        # Masked text between the parameter parentheses (functions and modifiers only)
+        self.params = params
+        self.start_line = 0
+        self.body_start_line = 0
+        self.end_line = 0
+
+    def contains_line(self, line: int) -> bool:
+        return self.start_line <= line <= self.end_line
+
+    @property
+    def signature(self) -> str:
+        """name(type,...) as in an ABI signature; tells overloads apart"""
+        return f"{self.name}({','.join(parameter_types(self.params))})"
+
+    def __repr__(self) -> str:
+        return f"Span({self.kind} {self.name!r} {self.start_line}-{self.end_line})"
+
+
+class SourceIndex:
+    """Masked text, line offsets and structural spans for one source"""
+
+    def __init__(self, code: str):
+        self.code = code
+        self.masked = mask_source(code)
+        self.lines = code.split('\n')
+        self.masked_lines = self.masked.split('\n')
+        self.line_starts = [0]
+        for m in re.finditer('\n', code):
+            self.line_starts.append(m.end())
+
+        self._match = self._match_brackets()
+        self.functions: List[Span] = []
+        self.loops: List[Span] = []
+        self._scan_spans()
+
+        self._function_by_line: List[int] = [-1] * (len(self.lines) + 2)
+        for idx, span in enumerate(self.functions):
+            for line in range(span.start_line, span.end_line + 1):
+                self._function_by_line[line] = idx
+        self._loops_by_start: Dict[int, List[Span]] = {}
+        for span in self.loops:
+            self._loops_by_start.setdefault(span.start_line, []).append(span)
+        self._state_variables: Optional[FrozenSet[str]] = None
+
+    def line_of(self, offset: int) -> int:
+        """1-based line number of a character offset"""
+        return bisect.bisect_right(self.line_starts, offset)
+
+    def function_at(self, line: int) -> Optional[Span]:
+        """Function, modifier or constructor enclosing a 1-based line"""
+        if 0 < line < len(self._function_by_line):
+            idx = self._function_by_line[line]
+            if idx >= 0:
+                return self.functions[idx]
+        return None
+
+    def loops_starting_at(self, line: int) -> List[Span]:
+        return self._loops_by_start.get(line, [])
+
+    def state_variables(self) -> FrozenSet[str]:
+        """Names of mutable state variables declared at contract level (computed on first use)"""
+        if self._state_variables is None:
+            names = set()
+            text = self.masked
+            for m in _CONTRACT.finditer(text):
+                open_at = m.end() - 1
+                end = self._match.get(open_at)
+                if end is None:
+                    continue
+                # Declarations are the `;`-terminated items between top-level blocks
+                item_start = i = open_at + 1
+                while i < end:
+                    ch = text[i]
+                    if ch == '{':
+                        i = self._match.get(i, end) + 1
+                        item_start = i
+                        continue
+                    if ch == ';':
+                        item = text[item_start:i]
+                        if not _NOT_STATE.search(item):
+                            declaration = _INITIALIZER.split(item, 1)[0]
+                            name = _LAST_NAME.search(declaration)
+                            if name and not name.group(1).isdigit():
+                                names.add(name.group(1))
+                        item_start = i + 1
+                    i += 1
+            self._state_variables = frozenset(names)
+        return self._state_variables
+
+    def _match_brackets(self) -> Dict[int, int]:
+        match: Dict[int, int] = {}
+        stacks = {'{': [], '(': []}
+        closers = {'}': '{', ')': '('}
+        for m in re.finditer(r'[{}()]', self.masked):
+            ch = m.group()
+            if ch in stacks:
+                stacks[ch].append(m.start())
+            elif stacks[closers[ch]]:
+                match[stacks[closers[ch]].pop()] = m.start()
+        return match
+
+    def _skip_ws(self, i: int) -> int:
+        n = len(self.masked)
+        while i < n and self.masked[i].isspace():
+            i += 1
+        return i
+
+    def _scan_spans(self):
+        text = self.masked
+        for m in _HEADER.finditer(text):
+            kind = m.group(1)
+            span = self._function_span(m) if kind in FUNCTION_KINDS else self._loop_span(m)
+            if span is None:
+                continue
+            span.start_line = self.line_of(span.start)
+            span.body_start_line = self.line_of(span.body_start)
+            span.end_line = self.line_of(span.end)
+            (self.functions if kind in FUNCTION_KINDS else self.loops).append(span)
+
+    def _function_span(self, m: re.Match) -> Optional[Span]:
+        text = self.masked
+        kind = m.group(1)
+        name = kind
+        i = m.end()
+        if kind in ('function', 'modifier'):
+            name_match = _NAME.match(text, i)
+            if name_match and name_match.group(1) not in ('external', 'internal', 'public', 'private'):
+                name = name_match.group(1)
+                i = name_match.end()
+        i = self._skip_ws(i)
+        params_start = params_end = i
+        if i < len(text) and text[i] == '(':
+            if i not in self._match:
+                return None
+            params_start, params_end = i + 1, self._match[i] + 1
+        elif kind != 'modifier':
+            # `fallback`/`receive` used as identifiers, not definitions
+            return None
+
+        # Walk modifiers/returns to the body, skipping nested parentheses
+        j = params_end
+        while j < len(text):
+            ch = text[j]
+            if ch == '(':
+                if j not in self._match:
+                    return None
+                j = self._match[j] + 1
+                continue
+            if ch == '{':
+                if j not in self._match:
+                    return None
+                return Span(kind, name, m.start(), j, self._match[j], text[params_end:j],
+                            text[params_start:params_end - 1])
+            if ch in ';)}=':
+                # Declaration without body, or a function type
+                return None
+            j += 1
+        return None
+
+    def _loop_span(self, m: re.Match) -> Optional[Span]:
+        text = self.masked
+        kind = m.group(1)
+        i = self._skip_ws(m.end())
+        if kind != 'do':
+            if i >= len(text) or text[i] != '(' or i not in self._match:
+                return None
+            i = self._skip_ws(self._match[i] + 1)
+            if kind == 'while' and i < len(text) and text[i] == ';':
+                # Tail of a do-while loop
+                return None
+        if i < len(text) and text[i] == '{':
+            if i not in self._match:
+                return None
+            return Span(kind, kind, m.start(), i, self._match[i], text[m.start():i])
+        end = text.find(';', i)
+        if end == -1:
+            return None
+        return Span(kind, kind, m.start(), i, end, text[m.start():i])
@@ -0,0 +1,63 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+EXAMPLES = os.path.join(os.path.dirname(BACKEND), 'vulnerable_contract_examples.sol')
+# Speaks the helper protocol with coarse per-function CFGs (see its docstring)
+STUB_PARSER = os.path.join(BACKEND, 'benchmarks', 'stub_parser.py')
+
+
+@pytest.fixture
+def examples_source() -> str:
+    with open(EXAMPLES, encoding='utf-8') as f:
+        return f.read()
+
+
+def real_parser_installed() -> bool:
+    from node_pool import node_helper_dir
+    package = os.path.join(node_helper_dir(), 'node_modules', '@solidity-parser', 'parser', 'package.json')
+    return shutil.which('node') is not None and os.path.isfile(package)
+
+
+def use_helper(monkeypatch, command):
+    """Route parses to command (None = the real Node helper) with a fresh parser and version tag"""
+    import node_pool
+    monkeypatch.setattr(node_pool, 'NODE_HELPER_COMMAND', command or [])
+    monkeypatch.setattr(node_pool, '_parser', None)
+    node_pool.parser_version.cache_clear()
+
+
+def close_helper():
+    import node_pool
+    if node_pool._parser is not None and node_pool._parser.pool is not None:
+        node_pool._parser.pool.close()
+    node_pool.parser_version.cache_clear()
+
+
+@pytest.fixture
+def node_helper(monkeypatch):
+    """The real Node helper; skips when node or @solidity-parser/parser is not installed"""
+    if not real_parser_installed():
+        pytest.skip("Node helper not installed (cd backend/node_helper && npm ci)")
+    use_helper(monkeypatch, None)
+    yield
+    close_helper()
+
+
+@pytest.fixture
+def stub_helper(monkeypatch):
+    """benchmarks/stub_parser.py in place of the Node helper, for tests that only need some CFG"""
+    use_helper(monkeypatch, [sys.executable, STUB_PARSER, '--latency', '0'])
+    yield
+    close_helper()
+
+
+@pytest.fixture(params=['node', 'stub'])
+def helper(request):
+    """Each test runs against the real helper (when installed) and the stub"""
+    return request.getfixturevalue('node_helper' if request.param == 'node' else 'stub_helper')
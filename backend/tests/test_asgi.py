@@ -0,0 +1,93 @@
+import asyncio
+import json
+
+import pytest
+
+import asgi
+
+
+@pytest.fixture(autouse=True)
+def fresh_slots(monkeypatch):
+    # The semaphore belongs to one event loop; each test runs its own
+    monkeypatch.setattr(asgi, '_slots', None)
+
+
+def call(method, path, messages, query=b'', headers=()):
+    messages = list(messages)
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query, 'root_path': '',
+             'headers': [(b'content-type', b'application/json'), *headers], 'http_version': '1.1', 'scheme': 'http',
+             'server': ('test', 80), 'client': ('test', 1234)}
+    asyncio.run(asgi.app(scope, receive, send))
+    return sent
+
+
+def body_messages(body, parts=1):
+    data = json.dumps(body).encode('utf-8')
+    size = -(-len(data) // parts)
+    chunks = [data[i:i + size] for i in range(0, len(data), size)]
+    return [{'type': 'http.request', 'body': chunk, 'more_body': i < len(chunks) - 1}
+            for i, chunk in enumerate(chunks)]
+
+
+def status(sent):
+    return next(m['status'] for m in sent if m['type'] == 'http.response.start')
+
+
+def test_chunked_body_is_analyzed():
+    code = 'contract A { function f() public { require(tx.origin == msg.sender); } }'
+    sent = call('POST', '/api/v1/analyze', body_messages({"code": code}, parts=3), b'rules=tx-origin')
+    assert status(sent) == 200
+    result = json.loads(sent[-1]['body'])
+    assert [v['line'] for v in result['vulnerabilities']] == [1]
+
+
+def response_headers(sent):
+    start = next(m for m in sent if m['type'] == 'http.response.start')
+    return {name.decode('latin-1'): value.decode('latin-1') for name, value in start['headers']}
+
+
+def test_async_routes_apply_the_cors_policy():
+    code = 'contract A { function f() public { require(tx.origin == msg.sender); } }'
+    origin = 'http://localhost:3000'
+    expected = asgi.flask_app.test_client().get('/health', headers={'Origin': origin}).headers
+    ok = call('POST', '/api/v1/analyze', body_messages({"code": code}), b'rules=tx-origin',
+              [(b'origin', origin.encode())])
+    missing = call('POST', '/api/v1/analyze', body_messages({}), headers=[(b'origin', origin.encode())])
+    assert (status(ok), status(missing)) == (200, 400)
+    for sent in (ok, missing):
+        assert response_headers(sent)['access-control-allow-origin'] == expected['Access-Control-Allow-Origin']
+    # Headers the encoder set are kept
+    assert 'Accept-Encoding' in response_headers(ok)['vary']
+
+
+def test_disconnect_mid_body_is_not_analyzed(monkeypatch):
+    handled = []
+
+    async def analyze(code):
+        handled.append(code)
+        return 200, {}
+    monkeypatch.setattr(asgi, '_analyze', analyze)
+    messages = body_messages({"code": "contract A {}"}, parts=2)[:1] + [{'type': 'http.disconnect'}]
+    assert call('POST', '/api/v1/analyze', messages) == []
+    assert handled == []
+
+
+def test_flask_routes_need_asgiref(monkeypatch):
+    monkeypatch.setattr(asgi, '_wsgi', None)
+    sent = call('GET', '/api/v1/rules', [{'type': 'http.request', 'body': b''}])
+    assert status(sent) == 501
+    assert 'asgiref' in json.loads(sent[-1]['body'])['error']
+
+
+def test_flask_routes_through_asgiref():
+    pytest.importorskip('asgiref')
+    sent = call('GET', '/api/v1/rules', [{'type': 'http.request', 'body': b''}])
+    assert status(sent) == 200
@@ -0,0 +1,36 @@
+import pytest
+
+import batch
+from batch import BatchInputError, iter_batch, sources_from_json
+from benchmarks.generate import ContractShape, generate_contract
+
+
+def findings(record):
+    return sorted((v['line'], v['rule'], v['description']) for v in record['vulnerabilities'])
+
+
+def test_sources_from_json_limits(monkeypatch):
+    assert sources_from_json({"sources": {"a.sol": "contract A {}"}}) == [("a.sol", "contract A {}")]
+    with pytest.raises(BatchInputError):
+        sources_from_json({"files": [{"path": "a.sol"}]})
+    monkeypatch.setattr(batch, 'MAX_FILES', 1)
+    with pytest.raises(BatchInputError):
+        sources_from_json({"files": [{"code": "a"}, {"code": "b"}]})
+
+
+def test_dedup_matches_whole_file_analysis(helper, examples_source, monkeypatch):
+    sources = [("examples.sol", examples_source)] + [
+        (f"gen{seed}.sol", generate_contract(ContractShape(functions=8, seed=seed))) for seed in (1, 2)]
+    # The copy shares every function with the first file
+    sources.append(("copy.sol", examples_source))
+    checked = []
+    submit = batch.submit
+    monkeypatch.setattr(batch, 'submit', lambda fn, *args: checked.append(fn.__name__) or submit(fn, *args))
+
+    plain = {r['path']: r for r in iter_batch(sources) if 'path' in r}
+    dedup = {r['path']: r for r in iter_batch(sources, dedup=True) if 'path' in r}
+    assert 'check_functions' in checked
+    for path, _ in sources:
+        assert dedup[path]['status'] == plain[path]['status'] == 'ok'
+        assert findings(dedup[path]) == findings(plain[path])
+        assert dedup[path]['score'] == plain[path]['score']
@@ -0,0 +1,61 @@
+from cfg_graph import CompactGraph
+
+
+def graph(n, pairs, hidden=()):
+    nodes = [{'id': f'n{i}'} for i in range(n)]
+    edges = [{'source': f'n{s}', 'target': f'n{t}', 'hidden': (s, t) in hidden} for s, t in pairs]
+    return CompactGraph(nodes, edges, skip_hidden=True)
+
+
+# 0 -> 1 -> 2 -> 3, with 2 -> 1 (loop 1..2) and 3 -> 3 (self-loop); 4 is unreachable
+LOOPY = [(0, 1), (1, 2), (2, 1), (2, 3), (3, 3), (4, 0)]
+
+
+def test_csr_adjacency_and_predecessors():
+    g = graph(5, LOOPY)
+    assert list(g.successors(2)) == [1, 3]
+    assert sorted(g.predecessors(1)) == [0, 2]
+    assert list(g.predecessors(4)) == []
+
+
+def test_hidden_and_dangling_edges_are_skipped():
+    nodes = [{'id': 'a'}, {'id': 'b'}]
+    edges = [{'source': 'a', 'target': 'b', 'hidden': True}, {'source': 'a', 'target': 'missing'}]
+    assert list(CompactGraph(nodes, edges, skip_hidden=True).successors(0)) == []
+    assert list(CompactGraph(nodes, edges).successors(0)) == [1]
+
+
+def test_reachable():
+    g = graph(5, LOOPY)
+    assert list(g.reachable([0])) == [1, 1, 1, 1, 0]
+    assert list(g.reachable([3])) == [0, 0, 0, 1, 0]
+
+
+def test_sccs_in_reverse_topological_order():
+    g = graph(5, LOOPY)
+    components = [sorted(c) for c in g.sccs()]
+    assert sorted(components) == [[0], [1, 2], [3], [4]]
+    position = {tuple(c): i for i, c in enumerate(components)}
+    # Sinks come first: every edge goes from a later component to an earlier (or the same) one
+    assert position[(3,)] < position[(1, 2)] < position[(0,)] < position[(4,)]
+
+
+def test_sccs_handle_deep_chains_without_recursion():
+    n = 20000
+    g = graph(n, [(i, i + 1) for i in range(n - 1)] + [(n - 1, 0)])
+    assert [len(c) for c in g.sccs()] == [n]
+
+
+def test_loops_headers_members_and_exits():
+    g = graph(5, LOOPY)
+    loops = sorted(g.loops(), key=lambda loop: loop.header)
+    assert [(loop.header, loop.members) for loop in loops] == [(1, [1, 2]), (3, [3])]
+    # Exit edge 2 -> 3 is edge index 3 in LOOPY
+    assert loops[0].exits == [3]
+    assert loops[1].exits == []
+
+
+def test_back_edges_and_natural_loop():
+    g = graph(5, LOOPY)
+    assert sorted(g.back_edges()) == [(2, 1), (3, 3)]
+    assert g.natural_loop(1, [2]) == [1, 2]
@@ -0,0 +1,54 @@
+from cfg_graph import CompactGraph
+from dataflow import iter_bits, loop_bodies, solve
+
+
+def graph(n, pairs):
+    return CompactGraph([{'id': str(i)} for i in range(n)],
+                        [{'source': str(s), 'target': str(t)} for s, t in pairs])
+
+
+# 0 -> 1 -> {2, 3} -> 4: a diamond
+DIAMOND = [(0, 1), (1, 2), (1, 3), (2, 4), (3, 4)]
+A, B, C = 1, 2, 4
+
+
+def test_forward_may_and_must():
+    g = graph(5, DIAMOND)
+    gen = [A, 0, B, C, 0]
+    kill = [0, 0, A, 0, 0]
+    may = solve(g, gen, kill)
+    assert may.entry[4] == A | B | C
+    assert may.exit[2] == B
+    must = solve(g, gen, kill, may=False, universe=A | B | C)
+    # A is killed on one branch only; B and C each reach along one branch
+    assert must.entry[4] == 0
+    assert must.entry[3] == A
+    assert must.exit[3] == A | C
+
+
+def test_backward_liveness():
+    g = graph(5, DIAMOND)
+    # Node 4 uses A, node 2 defines it
+    gen = [0, 0, 0, 0, A]
+    kill = [0, 0, A, 0, 0]
+    live = solve(g, gen, kill, forward=False)
+    assert live.exit[2] == A
+    assert live.entry[2] == 0
+    assert live.entry[1] == A
+    assert live.entry[0] == A
+
+
+def test_boundary_and_loop_fixpoint():
+    # 0 -> 1 <-> 2, 1 -> 3: the fact generated in the loop body reaches the header
+    g = graph(4, [(0, 1), (1, 2), (2, 1), (1, 3)])
+    solution = solve(g, [0, 0, B, 0], [0, 0, 0, 0], boundary=A)
+    assert solution.entry[0] == A
+    assert solution.entry[1] == A | B
+    assert solution.entry[3] == A | B
+    assert loop_bodies(g) == [(1, [1, 2])]
+
+
+def test_iter_bits():
+    assert list(iter_bits(0)) == []
+    assert list(iter_bits(0b101001)) == [0, 3, 5]
+    assert list(iter_bits(1 << 200)) == [200]
@@ -0,0 +1,91 @@
+import os
+
+import dependencies
+from dependencies import Resolver, import_paths, resolve_imports
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def test_resolver_reads_only_inside_its_roots(tmp_path):
+    root = tmp_path / 'lib'
+    write(str(root / 'token' / 'ERC20.sol'), 'contract ERC20 {}')
+    write(str(tmp_path / 'secret.sol'), 'contract Secret {}')
+    resolver = Resolver(roots=[str(root)])
+
+    assert resolver.read(resolver.name('token/ERC20.sol', None)) == 'contract ERC20 {}'
+    assert resolver.read(resolver.name('./ERC20.sol', 'token/Vault.sol')) == 'contract ERC20 {}'
+    # Traversal out of the root, relative or through the importer, resolves to nothing
+    assert resolver.read(resolver.name('../secret.sol', None)) is None
+    assert resolver.read(resolver.name('../../secret.sol', 'token/Vault.sol')) is None
+    # Absolute paths are taken relative to the root
+    assert resolver.name(str(tmp_path / 'secret.sol'), None).startswith(str(tmp_path).lstrip('/'))
+    assert resolver.read(resolver.name(str(tmp_path / 'secret.sol'), None)) is None
+
+
+def test_resolver_does_not_follow_symlinks_out_of_root(tmp_path):
+    root = tmp_path / 'lib'
+    write(str(tmp_path / 'outside' / 'Secret.sol'), 'contract Secret {}')
+    os.makedirs(str(root))
+    os.symlink(str(tmp_path / 'outside' / 'Secret.sol'), str(root / 'Link.sol'))
+    os.symlink(str(tmp_path / 'outside'), str(root / 'dir'))
+    resolver = Resolver(roots=[str(root)])
+    assert resolver.read('Link.sol') is None
+    assert resolver.read('dir/Secret.sol') is None
+
+
+def test_request_sources_and_remappings_come_first(tmp_path):
+    root = tmp_path / 'lib'
+    write(str(root / 'oz' / 'Ownable.sol'), 'contract FromDisk {}')
+    resolver = Resolver(sources={'/oz/Ownable.sol': 'contract FromRequest {}'},
+                        remappings=[('@openzeppelin/', 'oz/')], roots=[str(root)])
+    assert resolver.name('@openzeppelin/Ownable.sol', None) == 'oz/Ownable.sol'
+    assert resolver.read('oz/Ownable.sol') == 'contract FromRequest {}'
+
+
+class CountingResolver(Resolver):
+    __slots__ = ('reads',)
+
+    def read(self, name):
+        self.reads.append(name)
+        return super().read(name)
+
+
+def test_unit_cap_stops_before_reading(monkeypatch):
+    monkeypatch.setattr(dependencies, 'IMPORT_MAX_UNITS', 2)
+    monkeypatch.setattr(dependencies, 'analyze_unit', lambda code: (
+        {"summary": {}, "score": 100, "vulnerabilities": [], "imports": import_paths(code)}, False))
+    sources = {f'U{i}.sol': f'import "./U{i + 1}.sol"; contract U{i} {{}}' for i in range(10)}
+    resolver = CountingResolver(sources=sources, roots=[])
+    resolver.reads = []
+
+    resolved = resolve_imports('import "./U0.sol";', 'Main.sol', resolver)
+    assert [unit['path'] for unit in resolved['imports']] == ['U0.sol', 'U1.sol']
+    assert resolved['truncated'] is True
+    assert resolver.reads == ['U0.sol', 'U1.sol']
+
+
+def test_lean_imports_response_is_leaned_once(stub_helper, monkeypatch):
+    from api import routes
+    from app import create_app
+    from vulnerability import Vulnerability
+
+    # The file's body is lean when it comes out of the cache; only the imports need the lean step
+    relean = []
+    monkeypatch.setattr(routes, 'lean_analysis', lambda *args: relean.append(args))
+    lib = 'contract Lib {\n    function f() public { require(tx.origin == msg.sender); }\n}\n'
+    code = 'import "./Lib.sol";\ncontract Main {\n    function g() public { require(tx.origin == msg.sender); }\n}\n'
+    client = create_app().test_client()
+    full, lean = [client.post(f'/api/v1/analyze?imports=1{query}',
+                              json={"code": code, "sources": {"Lib.sol": lib}}).get_json()
+                  for query in ('', '&findings=lean')]
+    assert relean == []
+
+    def render(records):
+        return [Vulnerability.from_record(r).to_dict() for r in records]
+    assert lean['vulnerabilities'] and render(lean['vulnerabilities']) == full['vulnerabilities']
+    assert lean['imports'][0]['vulnerabilities']
+    assert [render(u['vulnerabilities']) for u in lean['imports']] == [u['vulnerabilities'] for u in full['imports']]
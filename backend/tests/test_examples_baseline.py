@@ -0,0 +1,49 @@
+import json
+import os
+
+from security_analyzer import SecurityAnalyzer
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'fixtures', 'vulnerable_contract_examples.baseline.json')
+
+# Intended departures from the baseline since rules were scoped with the
+# source index: matches inside comments and across function boundaries
+# were dropped, and loop DoS now inspects the loop body.
+DROPPED = {
+    ('Reentrancy', 34, 'critical'),       # no state change follows in sendFunds
+    ('Reentrancy', 75, 'critical'),       # no state change follows in the loop
+    ('Reentrancy', 142, 'critical'),      # secure contract: effects come first
+    ('Reentrancy', 192, 'critical'),
+    ('tx.origin Authentication', 37, 'medium'),   # comment
+    ('tx.origin Authentication', 39, 'medium'),   # comment
+    ('Uninitialized Storage Pointer', 90, 'high'),  # commented-out code
+    ('Missing Access Control', 89, 'high'),         # commented-out code
+    ('Missing Access Control', 141, 'high'),        # guarded by onlyOwner
+    ('Missing Access Control', 147, 'high'),
+    ('Missing Access Control', 165, 'high'),
+    ('Missing Access Control', 172, 'high'),
+    ('Missing Access Control', 181, 'high'),
+    ('Missing Access Control', 197, 'high'),
+}
+ADDED = {
+    ('DoS with Block Gas Limit', 73, 'medium'),     # external call in the loop body
+}
+
+
+def baseline():
+    with open(BASELINE) as f:
+        return [(v['title'], v['line'], v['severity']) for v in json.load(f)]
+
+
+def test_examples_match_baseline(examples_source):
+    found = [(v['type'], v['line'], v['severity'])
+             for v in SecurityAnalyzer().analyze(examples_source)['vulnerabilities']]
+    expected = set(baseline()) - DROPPED | ADDED
+    assert len(found) == len(set(found))
+    assert set(found) == expected
+
+
+def test_baseline_deltas_are_real():
+    """Every listed departure must still differ from the stored baseline"""
+    recorded = set(baseline())
+    assert DROPPED <= recorded
+    assert not ADDED & recorded
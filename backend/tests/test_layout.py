@@ -0,0 +1,61 @@
+from layout import FUNCTION_GAP, FUNCTION_STRIDE, NODE_WIDTH, layered_layout
+
+
+def function(name, branches=1):
+    """Label node, entry, `branches` parallel statements and an exit"""
+    nodes = [{'id': f'{name}/label', 'type': 'default', 'data': {'label': f'Function: {name}'}},
+             {'id': f'{name}/entry', 'type': 'entry', 'data': {'label': 'Entry'}}]
+    edges = []
+    for b in range(branches):
+        nodes.append({'id': f'{name}/s{b}', 'type': 'default', 'data': {'label': f'x = {b}'}})
+        edges.append({'source': f'{name}/entry', 'target': f'{name}/s{b}'})
+        edges.append({'source': f'{name}/s{b}', 'target': f'{name}/exit'})
+    nodes.append({'id': f'{name}/exit', 'type': 'exit', 'data': {'label': 'Exit'}})
+    return nodes, edges
+
+
+def cfg(*functions):
+    return {"nodes": [n for nodes, _ in functions for n in nodes],
+            "edges": [e for _, edges in functions for e in edges]}
+
+
+def positions(graph, name):
+    return {n['id']: (n['position']['x'], n['position']['y']) for n in graph['nodes']
+            if n['id'].startswith(name + '/')}
+
+
+def bounds(graph, name):
+    return next(n['data']['bounds'] for n in graph['nodes'] if n['id'] == f'{name}/label')
+
+
+def test_functions_start_at_fixed_stride():
+    graph = layered_layout(cfg(function('a'), function('b'), function('c')))
+    assert [bounds(graph, f)['x'] for f in 'abc'] == [0.0, FUNCTION_STRIDE, 2 * FUNCTION_STRIDE]
+    assert bounds(graph, 'a')['width'] == NODE_WIDTH
+
+
+def test_growing_one_function_leaves_the_others_in_place():
+    before = layered_layout(cfg(function('a'), function('b'), function('c')))
+    after = layered_layout(cfg(function('a', branches=3), function('b'), function('c')))
+    assert bounds(after, 'a')['width'] > bounds(before, 'a')['width']
+    for name in 'bc':
+        assert positions(after, name) == positions(before, name)
+
+
+def test_overflow_pushes_only_later_columns():
+    wide = layered_layout(cfg(function('a'), function('b', branches=6), function('c'), function('d')))
+    b = bounds(wide, 'b')
+    assert b['width'] > FUNCTION_STRIDE
+    assert bounds(wide, 'a')['x'] == 0.0
+    assert bounds(wide, 'c')['x'] == b['x'] + b['width'] + FUNCTION_GAP
+    assert bounds(wide, 'd')['x'] == 3 * FUNCTION_STRIDE
+
+
+def test_columns_keep_origins_when_functions_are_inserted():
+    columns = {'a/label': 0, 'c/label': 1}
+    before = layered_layout(cfg(function('a'), function('c')), columns)
+    # A function inserted between them takes a new column; the others do not move
+    after = layered_layout(cfg(function('a'), function('b'), function('c')), dict(columns, **{'b/label': 2}))
+    assert positions(after, 'a') == positions(before, 'a')
+    assert positions(after, 'c') == positions(before, 'c')
+    assert bounds(after, 'b')['x'] == 2 * FUNCTION_STRIDE
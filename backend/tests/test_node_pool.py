@@ -0,0 +1,67 @@
+import asyncio
+import json
+import sys
+import time
+
+import pytest
+
+from conftest import STUB_PARSER, use_helper
+from node_pool import AsyncNodeWorker, NodeHelperTimeout
+
+CODE = 'contract A { function f() public {} }'
+
+
+@pytest.fixture
+def slow_helper(monkeypatch):
+    """The stub parser, answering each parse after 200 ms"""
+    use_helper(monkeypatch, [sys.executable, STUB_PARSER, '--latency', '200'])
+
+
+def run(worker, coroutine):
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await worker.stop(kill=True)
+    return asyncio.run(main())
+
+
+def test_requests_beyond_the_pipeline_wait_in_python(slow_helper):
+    worker = AsyncNodeWorker(max_in_flight=2)
+    most = []
+
+    async def scenario():
+        async def watch():
+            while True:
+                most.append(len(worker.pending))
+                await asyncio.sleep(0.01)
+        watcher = asyncio.ensure_future(watch())
+        requests = [asyncio.ensure_future(worker.request({"code": CODE}, timeout=0.5)) for _ in range(6)]
+        await asyncio.sleep(0)
+        assert worker.load == 6
+        try:
+            return await asyncio.gather(*requests)
+        finally:
+            watcher.cancel()
+
+    started = time.monotonic()
+    bodies = run(worker, scenario())
+    # 1.2 s of parsing behind a 0.5 s timeout: the clock starts when the helper starts on each one
+    assert time.monotonic() - started >= 1.2
+    assert all(json.loads(body)['nodes'] for body in bodies)
+    assert max(most) == 2
+    assert worker.load == 0
+
+
+def test_timeout_only_fails_the_slow_request(slow_helper):
+    worker = AsyncNodeWorker(max_in_flight=3)
+
+    async def scenario():
+        slow = worker.request({"code": CODE}, timeout=0.1)
+        behind = [worker.request({"code": CODE}, timeout=1) for _ in range(2)]
+        return await asyncio.gather(slow, *behind, return_exceptions=True)
+
+    slow, *behind = run(worker, scenario())
+    assert isinstance(slow, NodeHelperTimeout)
+    # Written behind the stuck request, then sent again to the restarted worker
+    assert all(isinstance(body, str) and json.loads(body)['nodes'] for body in behind)
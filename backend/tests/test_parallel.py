@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+import parallel
+import pipeline
+from benchmarks.generate import ContractShape, generate_contract
+from budget import Budget
+from parallel import function_chunks
+from pipeline import analyze
+from test_security_analyzer import TEMPLATE, loop_cfg
+
+
+def sources(examples_source):
+    yield examples_source
+    for seed, functions, depth in ((1, 12, 2), (2, 30, 3), (3, 6, 4)):
+        yield generate_contract(ContractShape(functions=functions, depth=depth, seed=seed))
+
+
+def parity_view(result):
+    return result['vulnerabilities'], result['summary'], result['score']
+
+
+@pytest.fixture
+def pool_env(monkeypatch):
+    monkeypatch.setenv('ANALYSIS_WORKERS', '2')
+
+
+def test_process_pool_matches_serial(helper, pool_env, examples_source, monkeypatch):
+    for code in sources(examples_source):
+        monkeypatch.setattr(pipeline, 'PARALLEL_MIN_LINES', 0)
+        serial, _ = analyze(code)
+        monkeypatch.setattr(pipeline, 'PARALLEL_MIN_LINES', 1)
+        pooled, _ = analyze(code)
+        assert serial['vulnerabilities']
+        assert parity_view(pooled) == parity_view(serial)
+    assert parallel._executor is not None
+
+
+def test_process_pool_matches_serial_without_cfg(pool_env, examples_source, monkeypatch):
+    # A failed parse leaves only the line rules, which still run on the pool
+    for code in sources(examples_source):
+        monkeypatch.setattr(pipeline, 'PARALLEL_MIN_LINES', 0)
+        serial, _ = analyze(code, parsed=(None, 'no parser'))
+        monkeypatch.setattr(pipeline, 'PARALLEL_MIN_LINES', 1)
+        pooled, _ = analyze(code, parsed=(None, 'no parser'))
+        assert parity_view(pooled) == parity_view(serial)
+
+
+def test_function_chunks_keep_functions_whole(helper, examples_source):
+    cfg = pipeline.get_cfg(examples_source)
+    chunks = function_chunks(cfg, 3)
+    assert sum(len(nodes) for nodes, _ in chunks) == len(cfg['nodes'])
+    owner = {node['id']: i for i, (nodes, _) in enumerate(chunks) for node in nodes}
+    for i, (_, edges) in enumerate(chunks):
+        assert all(owner[e['source']] == owner[e['target']] == i for e in edges)
+
+
+def test_pooled_cfg_passes_read_the_source(pool_env):
+    code = TEMPLATE.format(header='while (true)', body='x += 1;')
+    pooled = parallel.analyze_parallel(code, loop_cfg('While'))
+    assert [v['line'] for v in pooled['vulnerabilities'] if v['rule'] == 'infinite-loop'] == [5]
+
+
+def slow_passes(code, nodes, edges, passes, budget):
+    # Runs in a pool worker; ignores the deadline like a long dataflow check would
+    time.sleep(3)
+    return [], []
+
+
+def test_overrunning_task_is_dropped_and_its_pool_retired(pool_env, monkeypatch):
+    code = TEMPLATE.format(header='while (true)', body='x += 1;')
+    parallel.submit(abs, 0).result()  # start the workers outside the timed part
+    pool = parallel._executor
+    monkeypatch.setattr(parallel, '_passes_task', slow_passes)
+    monkeypatch.setattr(parallel, 'PARALLEL_TASK_TIMEOUT', 1.0)
+
+    started = time.monotonic()
+    budget = Budget(seconds=1.0)
+    parallel.analyze_parallel(code, loop_cfg('While'), budget=budget)
+    assert time.monotonic() - started < 2.5
+    assert budget.skipped == ['unreachable-code', 'infinite-loop']
+    assert parallel._executor is None or parallel._executor is not pool
+
+    # Without a budget the wait is bounded too, and the result says what was cut
+    result = parallel.analyze_parallel(code, loop_cfg('While'))
+    assert result['partial'] and result['skipped'] == ['unreachable-code', 'infinite-loop']
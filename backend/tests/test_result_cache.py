@@ -0,0 +1,70 @@
+from result_cache import ResultCache, cache_key
+
+
+def test_lru_eviction_by_bytes():
+    cache = ResultCache(max_bytes=10)
+    cache.put('a', 'xxxx')
+    cache.put('b', 'yyyy')
+    assert cache.get('a') == 'xxxx'  # a is now most recent
+    cache.put('c', 'zzzz')
+    assert cache.get('b') is None
+    assert cache.get('a') == 'xxxx' and cache.get('c') == 'zzzz'
+    stats = cache.stats()
+    assert stats['evictions'] == 1 and stats['bytes'] == 8 and stats['entries'] == 2
+
+
+def test_oversized_values_are_not_kept():
+    cache = ResultCache(max_bytes=4)
+    cache.put('a', 'xx')
+    cache.put('big', 'x' * 5)
+    assert cache.get('big') is None and cache.get('a') == 'xx'
+
+
+def test_replacing_a_key_keeps_the_size_right():
+    cache = ResultCache(max_bytes=10)
+    cache.put('a', 'x' * 6)
+    cache.put('a', 'x' * 2)
+    cache.put('b', 'y' * 8)
+    assert cache.get('a') == 'xx' and cache.stats()['bytes'] == 10
+
+
+def test_sqlite_tier_survives_eviction_and_invalidate(tmp_path):
+    db = str(tmp_path / 'cache.db')
+    cache = ResultCache(max_bytes=4, db_path=db)
+    cache.put('a', 'xxxx')
+    cache.put('b', 'yyyy')
+    assert cache.get('a') == 'xxxx'
+    assert cache.stats()['diskHits'] == 1
+    assert ResultCache(db_path=db).get('b') == 'yyyy'
+    assert cache.invalidate(['a', 'missing']) == 1
+    assert ResultCache(db_path=db).get('a') is None
+
+
+def test_sqlite_tier_evicts_least_recently_used_rows(tmp_path):
+    db = str(tmp_path / 'cache.db')
+    cache = ResultCache(max_bytes=0, db_path=db, db_max_bytes=10)
+    cache.put('a', 'xxxx')
+    cache.put('b', 'yyyy')
+    assert cache.get('a') == 'xxxx'  # a is now the most recently used row
+    cache.put('c', 'zzzz')
+    assert cache.get('b') is None
+    assert cache.get('a') == 'xxxx' and cache.get('c') == 'zzzz'
+    stats = cache.stats()
+    assert stats['diskEvictions'] == 1 and stats['diskBytes'] == 8
+    assert cache.invalidate(['c']) == 1 and cache.stats()['diskBytes'] == 4
+    # The bound also applies to a table reopened with a smaller limit
+    assert ResultCache(db_path=db, db_max_bytes=3).stats()['diskBytes'] == 0
+
+
+def test_memory_hits_do_not_wait_for_disk_writes(tmp_path):
+    cache = ResultCache(db_path=str(tmp_path / 'cache.db'))
+    cache.put('a', 'xxxx')
+    with cache._db_lock:
+        # A disk write in progress holds the SQLite lock
+        assert cache.get('a') == 'xxxx'
+
+
+def test_cache_key_separates_kind_version_and_code():
+    keys = {cache_key('cfg', '1', 'x'), cache_key('analyze', '1', 'x'), cache_key('cfg', '2', 'x'),
+            cache_key('cfg', '1', 'y'), cache_key('cfg', '1x', '')}
+    assert len(keys) == 5
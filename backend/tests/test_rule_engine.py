@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from benchmarks.generate import ContractShape, generate_contract
+from budget import Budget
+from rule_engine import DEFAULT_ENGINE, LineContext, PATTERN_RULES, PatternRule, RuleEngine
+from source_index import SourceIndex
+from vulnerability import Vulnerability
+
+
+def scan_each_rule(code):
+    """Reference: every rule scans every line on its own, in rule order"""
+    ctx = LineContext(SourceIndex(code))
+    found = []
+    for r in PATTERN_RULES:
+        if not r.applies(ctx):
+            continue
+        hits = []
+        for i, line in enumerate(ctx.lines, 1):
+            if r.once and hits:
+                break
+            if r.trigger.search(line):
+                vuln = r.check(ctx, i, line)
+                if vuln is not None:
+                    hits.append(vuln)
+        found.extend(hits)
+    return [v.to_dict() for v in found]
+
+
+def generated_sources():
+    return [generate_contract(ContractShape(functions=n, depth=d, seed=seed))
+            for n, d, seed in ((5, 1, 1), (20, 2, 2), (40, 3, 3))]
+
+
+def test_single_pass_matches_per_rule_scan(examples_source):
+    for code in [examples_source] + generated_sources():
+        assert [v.to_dict() for v in DEFAULT_ENGINE.run(code)] == scan_each_rule(code)
+
+
+def test_examples_report_every_pattern_rule(examples_source):
+    rules = {v.rule for v in DEFAULT_ENGINE.run(examples_source)}
+    assert {'reentrancy', 'unchecked-call', 'tx-origin', 'unprotected-selfdestruct', 'delegatecall'} <= rules
+
+
+@pytest.mark.parametrize('line', [
+    '// victim.call{value: 1}("");',
+    'string s = "tx.origin";',
+    '/* target.delegatecall(data); */',
+])
+def test_comments_and_strings_do_not_trigger(line):
+    code = f"contract C {{\n    function f() internal {{\n        {line}\n    }}\n}}\n"
+    assert DEFAULT_ENGINE.run(code) == []
+
+
+def hit(rule_id, delay=0.0):
+    def check(ctx, i, line):
+        time.sleep(delay)
+        return Vulnerability(rule_id, i)
+    return check
+
+
+BUDGET_SOURCE = '\n'.join('slow(); fast();' for _ in range(200))
+
+
+def test_rule_over_its_time_slice_stops_on_the_next_line():
+    engine = RuleEngine([PatternRule('slow', r'slow', hit('slow', 0.02)), PatternRule('fast', r'fast', hit('fast'))])
+    budget = Budget(seconds=0, detector_slice=0.05)
+    found = dict(engine.run_grouped(BUDGET_SOURCE, budget=budget))
+    assert budget.skipped == ['slow']
+    # At least 0.02s per line: over 0.05s by the third line, with no batch of lines scanned past it
+    assert 2 <= len(found['slow']) <= 3
+    assert len(found['fast']) == 200
+
+
+def test_deadline_is_checked_after_every_rule():
+    engine = RuleEngine([PatternRule('slow', r'slow', hit('slow', 0.05)), PatternRule('fast', r'fast', hit('fast'))])
+    budget = Budget(seconds=0.12, detector_slice=0)
+    started = time.monotonic()
+    found = dict(engine.run_grouped(BUDGET_SOURCE, budget=budget))
+    assert time.monotonic() - started < 0.3
+    assert budget.skipped == ['slow', 'fast']
+    assert 2 <= len(found['slow']) <= 3
+    assert len(found['fast']) == len(found['slow']) - 1
+
+
+def test_expired_budget_skips_every_rule():
+    budget = Budget(seconds=0.001)
+    time.sleep(0.01)
+    found = dict(DEFAULT_ENGINE.run_grouped(BUDGET_SOURCE, budget=budget))
+    assert not any(found.values())
+    assert budget.skipped
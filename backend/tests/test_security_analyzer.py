@@ -0,0 +1,72 @@
+from budget import Budget
+from rule_engine import DEFAULT_ENGINE
+from security_analyzer import SecurityAnalyzer
+from source_index import SourceIndex
+
+TEMPLATE = """pragma solidity ^0.8.0;
+contract Loops {{
+    uint256 public x;
+    function spin(uint256 n) public {{
+        {header} {{
+            {body}
+        }}
+    }}
+}}
+"""
+
+
+def loop_cfg(label):
+    """The CFG node_helper/index.js draws for spin(): entry, loop over one statement, exit"""
+    def node(i, node_type, text, start, end=None):
+        return {'id': str(i), 'type': node_type, 'data': {'label': text, 'startLine': start, 'endLine': end or start}}
+
+    nodes = [node(0, 'entry', 'Entry: spin', 4), node(1, 'exit', 'Exit: spin', 8),
+             node(2, 'default', f'{label} condition', 5), node(3, 'default', 'Loop body', 5, 7),
+             node(4, 'default', 'Expression', 6), node(5, 'default', 'Exit loop', 7)]
+    edges = [('0', '2', None), ('2', '3', 'true'), ('3', '4', None), ('4', '2', None),
+             ('2', '5', 'false'), ('5', '1', None)]
+    return {'nodes': nodes,
+            'edges': [{'id': f'{s}-{t}', 'source': s, 'target': t, 'label': lab} for s, t, lab in edges]}
+
+
+def infinite_loops(header, body):
+    code = TEMPLATE.format(header=header, body=body)
+    label = 'While' if header.startswith('while') else 'For'
+    result = SecurityAnalyzer().analyze(code, cfg_data=loop_cfg(label))
+    return [v['line'] for v in result['vulnerabilities'] if v['rule'] == 'infinite-loop']
+
+
+def test_constant_true_loops_without_escape_are_reported():
+    assert infinite_loops('while (true)', 'x += 1;') == [5]
+    assert infinite_loops('for (;;)', 'x += 1;') == [5]
+
+
+def test_bounded_loops_are_not_reported():
+    assert infinite_loops('for (uint256 i = 0; i < n; i++)', 'x += 1;') == []
+    assert infinite_loops('while (x < n)', 'x += 1;') == []
+
+
+def test_break_return_or_revert_escapes_a_constant_true_loop():
+    assert infinite_loops('while (true)', 'if (x > n) break;') == []
+    assert infinite_loops('while (true)', 'if (x > n) return;') == []
+    assert infinite_loops('while (true)', 'require(x < n);') == []
+    # A break that only leaves a nested loop does not end the outer one
+    assert infinite_loops('while (true)', 'for (;;) { break; }') == [5]
+
+
+def test_flow_and_cfg_detectors_past_their_slice_are_skipped():
+    code = TEMPLATE.format(header='while (true)', body='x += 1;')
+    cfg = loop_cfg('While')
+    analyzer = SecurityAnalyzer()
+    analyzer.source_index = SourceIndex(code)
+
+    # Time already spent on a rule's line heuristics counts against its slice
+    budget = Budget(seconds=0, detector_slice=0.5)
+    timings = {'reentrancy': 0.6, 'dos-loop': 0.1}
+    found = analyzer.flow_findings(DEFAULT_ENGINE, cfg['nodes'], cfg['edges'], timings=timings, budget=budget)
+    assert sorted(found) == ['dos-loop'] and budget.skipped == ['reentrancy']
+
+    timings = {'infinite-loop': 0.6}
+    passes = dict(analyzer._analyze_cfg(cfg['nodes'], cfg['edges'], budget=budget, timings=timings))
+    assert sorted(passes) == ['unreachable-code'] and budget.skipped == ['reentrancy', 'infinite-loop']
+    assert 'unreachable-code' in timings
@@ -0,0 +1,117 @@
+from pipeline import analyze
+from sessions import Session, apply_edits, function_units
+from source_index import SourceIndex
+
+CODE = '''contract Vault {
+    mapping(address => uint256) balances;
+
+    function deposit() public payable {
+        balances[msg.sender] += msg.value;
+    }
+
+    function pay(address to, uint amount) public {
+        require(msg.sender == to);
+        balances[to] -= amount;
+    }
+}
+'''
+
+OVERLOAD = '''    function pay(address to) public {
+        balances[to] = 0;
+    }
+
+'''
+
+
+def node_ids(result, key):
+    return sorted(n['id'] for n in result['cfg']['nodes'] if n['id'].startswith(key + '/'))
+
+
+def node_lines(result, key):
+    return sorted((n['data'].get('startLine'), n['data'].get('label')) for n in result['cfg']['nodes']
+                  if n['id'].startswith(key + '/'))
+
+
+def test_units_are_keyed_by_signature():
+    keys = [key for key, _, _ in function_units(SourceIndex(CODE))]
+    assert keys == ['deposit()#0', 'pay(address,uint256)#0']
+    with_overload = CODE.replace('    function pay(address to, uint', OVERLOAD + '    function pay(address to, uint')
+    keys = [key for key, _, _ in function_units(SourceIndex(with_overload))]
+    assert keys == ['deposit()#0', 'pay(address)#0', 'pay(address,uint256)#0']
+
+
+def test_update_rechecks_only_changed_functions(helper):
+    session = Session('test')
+    first = session.update(CODE)
+    assert first['changed'] == ['deposit()#0', 'pay(address,uint256)#0']
+    assert session.update(CODE)['changed'] == []
+
+    edited = CODE.replace('balances[to] -= amount;', 'balances[to] -= amount / 2;')
+    result = session.update(edited)
+    assert result['changed'] == ['pay(address,uint256)#0']
+    assert node_ids(result, 'deposit()#0') == node_ids(first, 'deposit()#0')
+
+
+def test_inserted_overload_keeps_other_units(helper):
+    session = Session('test')
+    first = session.update(CODE)
+    key = 'pay(address,uint256)#0'
+    before = node_lines(first, key)
+
+    at = CODE.index('    function pay(')
+    result = session.edit([{"start": at, "end": at, "text": OVERLOAD}], first['version'])
+    # Only the new overload is parsed; the existing one moves down by four lines
+    assert result['changed'] == ['pay(address)#0']
+    assert node_ids(result, key) == node_ids(first, key)
+    assert node_lines(result, key) == [(line + 4 if line else line, label) for line, label in before]
+    assert session.code == apply_edits(CODE, [{"start": at, "end": at, "text": OVERLOAD}])
+
+
+def test_session_matches_whole_file_analysis(helper, examples_source):
+    session = Session('test')
+    result = session.update(examples_source)
+    full, _ = analyze(examples_source)
+    assert sorted((v['line'], v['type']) for v in result['vulnerabilities']) == \
+        sorted((v['line'], v['type']) for v in full['vulnerabilities'])
+
+
+WRITE_AFTER_CALL = '''contract Pool {
+    uint256 public total;
+
+    function withdraw(uint256 amount) public {
+        (bool ok, ) = msg.sender.call{value: amount}("");
+        require(ok);
+        total -= amount;
+    }
+}
+'''
+
+
+def rules(result):
+    return sorted((v['line'], v['type']) for v in result['vulnerabilities'])
+
+
+def test_state_variable_changes_recheck_functions_that_mention_them(helper):
+    session = Session('test')
+    first = session.update(WRITE_AFTER_CALL)
+    assert 'Reentrancy' in {v['type'] for v in first['vulnerabilities']}
+
+    # Without the declaration, `total` is no longer contract state and the write is not a reentrancy
+    start = WRITE_AFTER_CALL.index('    uint256 public total;')
+    end = WRITE_AFTER_CALL.index('\n', start) + 1
+    result = session.edit([{"start": start, "end": end, "text": ""}], first['version'])
+    assert result['changed'] == ['withdraw(uint256)#0']
+    assert rules(result) == rules(analyze(session.code)[0])
+    assert 'Reentrancy' not in {v['type'] for v in result['vulnerabilities']}
+
+
+def test_layered_session_keeps_other_functions_in_place(helper):
+    session = Session('test', layered=True)
+    first = session.update(CODE)
+    key = 'deposit()#0'
+    before = {n['id']: n['position'] for n in first['cfg']['nodes'] if n['id'].startswith(key + '/')}
+    edited = CODE.replace('        balances[to] -= amount;\n',
+                          '        if (amount > 1) { balances[to] -= amount; } else { balances[to] = 0; }\n')
+    result = session.update(edited)
+    assert result['changed'] == ['pay(address,uint256)#0']
+    assert {n['id']: n['position'] for n in result['cfg']['nodes'] if n['id'].startswith(key + '/')} == before
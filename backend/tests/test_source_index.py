@@ -0,0 +1,65 @@
+from source_index import SourceIndex, mask_source, normalize_lines, parameter_types
+
+CODE = '''contract Bank {
+    mapping(address => uint256) balances; // tx.origin in a comment
+    uint256 public total = 1;
+    uint256 constant LIMIT = 10;
+    string name = "a { b";
+
+    /* function hidden() public {
+    } */
+    function withdraw(uint256 amount) public {
+        for (uint i = 0; i < 3; i++) {
+            total -= amount;
+        }
+        balances[msg.sender] = 0;
+    }
+
+    modifier onlyOwner() { _; }
+}
+'''
+
+
+def test_mask_keeps_offsets_and_newlines():
+    masked = mask_source(CODE)
+    assert len(masked) == len(CODE)
+    assert [i for i, c in enumerate(masked) if c == '\n'] == [i for i, c in enumerate(CODE) if c == '\n']
+    assert 'tx.origin' not in masked
+    assert 'hidden' not in masked
+    assert '"     "' in masked
+
+
+def test_masked_braces_do_not_affect_spans():
+    index = SourceIndex(CODE)
+    assert [(s.kind, s.name, s.start_line, s.end_line) for s in index.functions] == [
+        ('function', 'withdraw', 9, 14),
+        ('modifier', 'onlyOwner', 16, 16),
+    ]
+    assert [(s.kind, s.start_line, s.end_line) for s in index.loops] == [('for', 10, 12)]
+
+
+def test_function_at_and_line_of():
+    index = SourceIndex(CODE)
+    assert index.function_at(11).name == 'withdraw'
+    assert index.function_at(3) is None
+    assert index.line_of(CODE.index('balances[msg.sender]')) == 13
+
+
+def test_state_variables_skip_constants():
+    assert SourceIndex(CODE).state_variables() == frozenset({'balances', 'total', 'name'})
+
+
+def test_normalize_lines_ignores_comments_and_indentation():
+    a = "function f() public {\n    x = 1; // set\n}"
+    b = "function f() public {\n        x = 1;\n}"
+    assert normalize_lines(a) == normalize_lines(b)
+    assert normalize_lines(a) != normalize_lines("function f() public {\n    x = 2;\n}")
+
+
+def test_parameter_types_and_signature():
+    assert parameter_types('address payable to, uint[] memory amounts, bytes32') == \
+        ['address payable', 'uint256[]', 'bytes32']
+    assert parameter_types('mapping(uint => bool) storage m, function(uint) external cb') == \
+        ['mapping(uint256 => bool)', 'function(uint256)external']
+    assert parameter_types('  ') == []
+    assert SourceIndex(CODE).functions[0].signature == 'withdraw(uint256)'
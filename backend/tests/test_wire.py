@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+import pipeline
+from benchmarks.generate import ContractShape, generate_contract
+from pipeline import analysis_json, cache_keys, variant
+from result_cache import get_cache
+from rule_engine import rule_catalog
+from vulnerability import Vulnerability
+from wire import compact_cfg, expand_analysis, lean_analysis
+
+
+def sources(examples_source):
+    yield examples_source
+    for seed in (1, 2):
+        yield generate_contract(ContractShape(functions=10, depth=3, seed=seed))
+
+
+@pytest.mark.parametrize('blocks', [False, True])
+def test_lean_round_trips_to_the_full_shape(helper, examples_source, blocks):
+    for code in sources(examples_source):
+        full = json.loads(analysis_json(code, blocks=blocks))
+        lean = json.loads(analysis_json(code, blocks=blocks, lean=True))
+        assert lean['catalog'] == rule_catalog()['version']
+        assert [Vulnerability.from_record(r).to_dict() for r in lean['vulnerabilities']] == full['vulnerabilities']
+        assert expand_analysis(lean) == full
+        assert lean_analysis(full, lean['catalog']) == lean
+
+
+def test_cache_holds_the_lean_shape(helper, examples_source):
+    analysis_json(examples_source)
+    stored = json.loads(get_cache().get(cache_keys(examples_source)[variant('analyze')]))
+    assert stored['vulnerabilities']
+    assert not any('description' in v for v in stored['vulnerabilities'])
+    annotated = [n['data'] for n in stored['cfg']['nodes'] if n['data'].get('vulnerable')]
+    assert annotated
+    assert all('vulnerabilities' not in data and data['findings'] for data in annotated)
+
+
+def test_compact_lean_expands_findings_only(helper, examples_source):
+    full = json.loads(analysis_json(examples_source, compact=True))
+    lean = json.loads(analysis_json(examples_source, compact=True, lean=True))
+    assert lean['cfg'] == full['cfg'] == compact_cfg(json.loads(analysis_json(examples_source))['cfg'])
+    assert expand_analysis(lean) == full
+
+
+def test_full_shape_is_rendered_once(helper, examples_source, monkeypatch):
+    first = analysis_json(examples_source)
+    assert get_cache().get(cache_keys(examples_source)[variant('rendered')]) == first
+    monkeypatch.setattr(pipeline, 'expand_analysis', lambda lean: pytest.fail("full hit re-rendered"))
+    assert analysis_json(examples_source) == first
@@ -0,0 +1,118 @@
+"""
+Finding record shared by the text and CFG detectors
+A finding is a rule id, a line, a node and the parameters of its message.
+Titles, severities, message templates and recommendations live once in
+the rule catalog (rule_engine.RULES), and the text is rendered from it
+only when a finding is serialized.
+"""
+from typing import Any, Dict, List, Tuple
+
+
+def _rule(rule_id: str):
+    from rule_engine import RULES  # the registry imports this module
+    return RULES[rule_id]
+
+
+class Vulnerability:
+    """A detected security vulnerability: rule id, line, node and message parameters"""
+
+    __slots__ = ('rule', 'line', 'node_id', 'variant', 'params')
+
+    SEVERITY_CRITICAL = "critical"
+    SEVERITY_HIGH = "high"
+    SEVERITY_MEDIUM = "medium"
+    SEVERITY_LOW = "low"
+    SEVERITY_INFO = "info"
+    
+    # Lower rank = more severe
+    SEVERITY_RANK = {
+        SEVERITY_CRITICAL: 0,
+        SEVERITY_HIGH: 1,
+        SEVERITY_MEDIUM: 2,
+        SEVERITY_LOW: 3,
+        SEVERITY_INFO: 4,
+    }
+    
+    def __init__(self, rule_id: str, line: int, node_id: str = None, variant: str = None, **params: int):
+        self.rule = rule_id
+        self.line = line
+        self.node_id = node_id
+        # Catalog message/recommendation pair other than the rule's default
+        self.variant = variant
+        # Extra template values; names ending in 'line' are line numbers
+        self.params = params or None
+
+    @property
+    def type(self) -> str:
+        return _rule(self.rule).title
+
+    @property
+    def severity(self) -> str:
+        return _rule(self.rule).severity
+
+    @property
+    def description(self) -> str:
+        return _rule(self.rule).message(self.variant).format(line=self.line, **(self.params or {}))
+
+    @property
+    def recommendation(self) -> str:
+        return _rule(self.rule).recommendation(self.variant)
+
+    def shift(self, delta: int):
+        """Move the finding by delta lines, including the line parameters of its message"""
+        if not delta:
+            return
+        self.line += delta
+        if self.params:
+            self.params = {name: value + delta if name.endswith('line') else value
+                           for name, value in self.params.items()}
+
+    def to_record(self) -> Dict[str, Any]:
+        """Lean form: the rule id, position and message parameters, without text"""
+        record = {"rule": self.rule, "line": self.line, "nodeId": self.node_id}
+        if self.variant:
+            record['variant'] = self.variant
+        if self.params:
+            record['params'] = self.params
+        return record
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> 'Vulnerability':
+        """Inverse of to_record (also accepts to_dict output)"""
+        return cls(record['rule'], record['line'], record.get('nodeId'), record.get('variant'),
+                   **(record.get('params') or {}))
+
+    def to_dict(self) -> Dict[str, Any]:
+        info = _rule(self.rule)
+        found = self.to_record()
+        found.update({
+            "type": info.title,
+            "severity": info.severity,
+            "description": info.message(self.variant).format(line=self.line, **(self.params or {})),
+            "recommendation": info.recommendation(self.variant),
+        })
+        return found
+
+
+def lean_findings(vulnerabilities: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """to_record form of finding dicts from to_dict"""
+    return [{k: v[k] for k in ('rule', 'line', 'nodeId', 'variant', 'params') if k in v} for v in vulnerabilities]
+
+
+def group_by_node(vulnerabilities: List[Dict[str, Any]]) -> Dict[str, Tuple[str, List[Dict[str, Any]]]]:
+    """Single pass: node id -> (highest severity, findings on that node)"""
+    rank = Vulnerability.SEVERITY_RANK
+    groups: Dict[str, Tuple[str, List[Dict[str, Any]]]] = {}
+    for vuln in vulnerabilities:
+        node_id = vuln.get('nodeId')
+        if not node_id:
+            continue
+        group = groups.get(node_id)
+        if group is None:
+            groups[node_id] = (vuln['severity'], [vuln])
+            continue
+        severity, found = group
+        found.append(vuln)
+        if rank.get(vuln['severity'], len(rank)) < rank.get(severity, len(rank)):
+            groups[node_id] = (vuln['severity'], found)
+    return groups
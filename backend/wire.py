@@ -0,0 +1,213 @@
+"""
+Compact CFG wire format and response encoding
+The compact format replaces React Flow objects with columnar arrays: node
+ids are array positions, labels go through a shared string table and styles
+are derived on the client. The Node helper emits the same structure for
+`{"format": "compact"}`, so unannotated CFGs are forwarded as-is.
+Lean results (lean_analysis) send findings as references into the rule
+catalog instead of text, whatever the CFG format; analyses are stored in
+that shape and expand_analysis renders the text for full responses.
+Bodies are MessagePack when the client accepts it (and msgpack is
+installed), and brotli or gzip compressed per Accept-Encoding.
+"""
+import gzip
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from vulnerability import Vulnerability, lean_findings
+
+
+COMPACT_VERSION = 1
+COMPACT_KINDS = ('default', 'entry', 'exit')
+COMPACT_EDGE_LABELS = (None, 'true', 'false')
+EDGE_HIDDEN = 1
+EDGE_ANIMATED = 2
+
+JSON_TYPE = 'application/json'
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+
+# Smaller bodies are sent uncompressed; the framing overhead is not worth it
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', '1024'))
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 5
+
+
+def compact_cfg(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """React Flow {"nodes", "edges"} -> compact columns (same output as the Node helper)"""
+    index: Dict[str, int] = {}
+    strings: List[str] = []
+    string_index: Dict[str, int] = {}
+
+    def intern(label: str) -> int:
+        k = string_index.get(label)
+        if k is None:
+            k = string_index[label] = len(strings)
+            strings.append(label)
+        return k
+
+    kinds, labels, lines, xs, ys = [], [], [], [], []
+    # Basic blocks: statements of node i are offsets[i]..offsets[i + 1]
+    offsets, statement_labels, statement_lines = [0], [], []
+    for i, node in enumerate(cfg.get('nodes', [])):
+        index[node['id']] = i
+        data = node.get('data') or {}
+        kinds.append(COMPACT_KINDS.index(node['type']) if node.get('type') in COMPACT_KINDS else 0)
+        labels.append(intern(data.get('label') or ''))
+        lines.append(data.get('startLine') or 0)
+        lines.append(data.get('endLine') or 0)
+        position = node.get('position') or {}
+        xs.append(position.get('x', 0))
+        ys.append(position.get('y', 0))
+        for statement in data.get('statements') or ():
+            statement_labels.append(intern(statement.get('label') or ''))
+            statement_lines.append(statement.get('startLine') or 0)
+            statement_lines.append(statement.get('endLine') or 0)
+        offsets.append(len(statement_labels))
+
+    sources, targets, edge_labels, flags = [], [], [], []
+    for edge in cfg.get('edges', []):
+        source, target = index.get(edge.get('source')), index.get(edge.get('target'))
+        if source is None or target is None:
+            continue
+        sources.append(source)
+        targets.append(target)
+        label = edge.get('label')
+        edge_labels.append(COMPACT_EDGE_LABELS.index(label) if label in COMPACT_EDGE_LABELS else 0)
+        flags.append((EDGE_HIDDEN if edge.get('hidden') else 0) | (EDGE_ANIMATED if edge.get('animated') else 0))
+
+    compact = {
+        "format": "compact",
+        "version": COMPACT_VERSION,
+        "strings": strings,
+        "nodes": {"kind": kinds, "label": labels, "lines": lines, "x": xs, "y": ys},
+        "edges": {"source": sources, "target": targets, "label": edge_labels, "flags": flags},
+    }
+    if statement_labels:
+        compact["statements"] = {"offsets": offsets, "label": statement_labels, "lines": statement_lines}
+    return compact
+
+
+def compact_analysis(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Analysis result with a compact CFG and findings pointing at node positions"""
+    compact = dict(result)
+    cfg = result.get('cfg')
+    positions = {node['id']: i for i, node in enumerate(cfg.get('nodes', []))} if cfg else {}
+    compact['vulnerabilities'] = [dict(v, nodeId=positions.get(v.get('nodeId')))
+                                  for v in result.get('vulnerabilities', [])]
+    if cfg:
+        # Annotation (vulnerable flag, severity styling) is rebuilt by the client
+        compact['cfg'] = compact_cfg(cfg)
+    return compact
+
+
+def lean_units(units: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Imported unit records (see dependencies.resolve_imports) with their findings as rule references"""
+    return [dict(unit, vulnerabilities=lean_findings(unit.get('vulnerabilities', []))) for unit in units]
+
+
+def lean_analysis(result: Dict[str, Any], catalog: str) -> Dict[str, Any]:
+    """
+    Analysis result with findings as rule references (see
+    Vulnerability.to_record) and node annotations as indices into them
+
+    Titles, severities and text come from the rule catalog (GET /rules)
+    whose version is catalog. Annotated nodes are copied, the rest shared.
+    """
+    lean = dict(result, catalog=catalog)
+    found = result.get('vulnerabilities', [])
+    lean['vulnerabilities'] = lean_findings(found)
+    if result.get('imports'):
+        lean['imports'] = lean_units(result['imports'])
+    cfg = result.get('cfg')
+    # Compact CFGs carry no annotations, so only React Flow node lists need rewriting
+    if cfg and isinstance(cfg.get('nodes'), list) and any('vulnerabilities' in (n.get('data') or {})
+                                                          for n in cfg['nodes']):
+        by_node: Dict[Any, List[int]] = {}
+        for i, v in enumerate(found):
+            if v.get('nodeId') is not None:
+                by_node.setdefault(v['nodeId'], []).append(i)
+        nodes = []
+        for node in cfg['nodes']:
+            data = node.get('data') or {}
+            if 'vulnerabilities' in data:
+                data = {k: v for k, v in data.items() if k != 'vulnerabilities'}
+                data['findings'] = by_node.get(node['id'], [])
+                node = dict(node, data=data)
+            nodes.append(node)
+        lean['cfg'] = dict(cfg, nodes=nodes)
+    return lean
+
+
+def expand_analysis(lean: Dict[str, Any]) -> Dict[str, Any]:
+    """Inverse of lean_analysis: findings rendered from the catalog, annotated nodes given them again"""
+    result = {k: v for k, v in lean.items() if k != 'catalog'}
+    found = result['vulnerabilities'] = [Vulnerability.from_record(r).to_dict()
+                                         for r in lean.get('vulnerabilities', [])]
+    if lean.get('imports'):
+        result['imports'] = [dict(unit, vulnerabilities=[Vulnerability.from_record(r).to_dict()
+                                                         for r in unit.get('vulnerabilities', [])])
+                             for unit in lean['imports']]
+    cfg = lean.get('cfg')
+    if cfg and isinstance(cfg.get('nodes'), list):
+        nodes = []
+        for node in cfg['nodes']:
+            data = node.get('data') or {}
+            if 'findings' in data:
+                indices = data['findings']
+                data = {k: v for k, v in data.items() if k != 'findings'}
+                data['vulnerabilities'] = [found[i] for i in indices]
+                node = dict(node, data=data)
+            nodes.append(node)
+        result['cfg'] = dict(cfg, nodes=nodes)
+    return result
+
+
+def accepts_msgpack(accept) -> bool:
+    """Whether a werkzeug MIMEAccept prefers MessagePack over JSON"""
+    if msgpack is None:
+        return False
+    best = accept.best_match((JSON_TYPE,) + MSGPACK_TYPES)
+    return best in MSGPACK_TYPES
+
+
+def choose_encoding(accept_encoding) -> Optional[str]:
+    """'br', 'gzip' or None for a werkzeug Accept-Encoding header"""
+    offered = ('br', 'gzip') if brotli is not None else ('gzip',)
+    return accept_encoding.best_match(offered)
+
+
+def encode_body(body: Union[str, Dict[str, Any]], as_msgpack: bool = False,
+                encoding: Optional[str] = None) -> Tuple[bytes, str, Dict[str, str]]:
+    """
+    Serialize and compress a response body
+
+    body is JSON text (forwarded without re-encoding) or an object.
+    Returns (bytes, mimetype, extra headers).
+    """
+    if as_msgpack:
+        data = msgpack.packb(json.loads(body) if isinstance(body, str) else body, use_bin_type=True)
+        mimetype = MSGPACK_TYPES[0]
+    else:
+        text = body if isinstance(body, str) else json.dumps(body)
+        data = text.encode('utf-8')
+        mimetype = JSON_TYPE
+
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if encoding and len(data) >= COMPRESS_MIN_BYTES:
+        if encoding == 'br':
+            data = brotli.compress(data, quality=BROTLI_QUALITY)
+        else:
+            data = gzip.compress(data, compresslevel=GZIP_LEVEL)
+        headers["Content-Encoding"] = encoding
+    return data, mimetype, headers
@@ -3,6 +3,29 @@ import './App.css';
 import CodeEditor from './components/CodeEditor';
 import CFGVisualizer from './components/CFGVisualizer';
 import { parseSolidityCode } from './utils/parser';
+import { decodeCompactAnalysis } from './utils/compactCfg';
+
+const API_BASE = 'http://localhost:5000/api/v1';
+
+// The rule catalog is fetched once per page load, and again when a result
+// refers to a newer one (the backend was upgraded)
+let ruleCatalog = null;
+function loadRuleCatalog(refresh = false) {
+  if (!ruleCatalog || refresh) {
+    ruleCatalog = fetch(`${API_BASE}/rules`)
+      .then((response) => {
+        if (!response.ok) {
+          throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        return response.json();
+      })
+      .catch((err) => {
+        ruleCatalog = null;
+        throw err;
+      });
+  }
+  return ruleCatalog;
+}
 
 const SAMPLE_CODE = `// SPDX-License-Identifier: MIT
 pragma solidity ^0.8.0;
@@ -106,7 +129,8 @@ function App() {
     setSecurityAnalysis(null);
     
     try {
-      const response = await fetch('http://localhost:5000/api/v1/analyze', {
+      const catalogRequest = loadRuleCatalog();
+      const response = await fetch(`${API_BASE}/analyze?format=compact&findings=lean`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -118,7 +142,12 @@ function App() {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
       
-      const result = await response.json();
+      const lean = await response.json();
+      let catalog = await catalogRequest;
+      if (lean.catalog && lean.catalog !== catalog.version) {
+        catalog = await loadRuleCatalog(true);
+      }
+      const result = decodeCompactAnalysis(lean, catalog);
       setSecurityAnalysis(result);
       setShowVulnerabilities(true);
       
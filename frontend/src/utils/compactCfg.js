@@ -0,0 +1,181 @@
+// Decoder for the backend's compact CFG wire format (`?format=compact`).
+// Node ids are array positions and styles are not sent, so they are rebuilt
+// here from the node label and the edge label/flags.
+
+const KINDS = ['default', 'entry', 'exit'];
+const EDGE_LABELS = [undefined, 'true', 'false'];
+const EDGE_HIDDEN = 1;
+const EDGE_ANIMATED = 2;
+
+const SEVERITY_COLORS = {
+  critical: '#d32f2f',
+  high: '#f57c00',
+  medium: '#fbc02d',
+  low: '#7cb342',
+  info: '#0288d1',
+};
+
+const SEVERITY_RANK = { info: 0, low: 1, medium: 2, high: 3, critical: 4 };
+
+function nodeStyle(fullLabel) {
+  // Basic-block mode appends the statement count to marker labels
+  const label = fullLabel.replace(/ \(\d+ statements?\)$/, '');
+  if (label === 'If condition') {
+    return { background: '#4caf50', border: '2px solid #388e3c', color: 'white' };
+  }
+  if (label === 'While condition' || label === 'For condition') {
+    return { background: '#2196f3', border: '2px solid #1976d2', color: 'white' };
+  }
+  if (label === 'True') {
+    return { background: '#e8f5e9' };
+  }
+  if (label === 'False') {
+    return { background: '#ffebee' };
+  }
+  if (label === 'Return') {
+    return { background: '#ffc107', border: '2px solid #ff9800' };
+  }
+  if (label.startsWith('Function: ')) {
+    return { background: '#667eea', color: 'white', border: '2px solid #764ba2', fontWeight: 'bold', padding: '10px' };
+  }
+  return undefined;
+}
+
+function edgeStyle(label) {
+  if (label === 'true') {
+    return { stroke: '#4caf50' };
+  }
+  if (label === 'false') {
+    return { stroke: '#f44336' };
+  }
+  return undefined;
+}
+
+// Indices of the block statements spanning any of the given lines
+function statementsAt(statements, lines) {
+  const found = [];
+  statements.forEach((s, i) => {
+    const start = s.startLine || 0;
+    const end = s.endLine || start;
+    if (lines.some((line) => start <= line && line <= end)) {
+      found.push(i);
+    }
+  });
+  return found;
+}
+
+export function isCompactCfg(cfg) {
+  return Boolean(cfg && cfg.format === 'compact');
+}
+
+export function decodeCompactCfg(compact) {
+  const { strings, nodes: columns, edges: edgeColumns, statements } = compact;
+  const nodes = columns.kind.map((kind, i) => {
+    const label = strings[columns.label[i]];
+    const node = {
+      id: String(i),
+      type: KINDS[kind] || 'default',
+      data: {
+        label,
+        startLine: columns.lines[2 * i] || undefined,
+        endLine: columns.lines[2 * i + 1] || undefined,
+      },
+      position: { x: columns.x[i], y: columns.y[i] },
+    };
+    if (statements && statements.offsets[i + 1] > statements.offsets[i]) {
+      node.data.statements = [];
+      for (let k = statements.offsets[i]; k < statements.offsets[i + 1]; k++) {
+        node.data.statements.push({
+          label: strings[statements.label[k]],
+          startLine: statements.lines[2 * k] || undefined,
+          endLine: statements.lines[2 * k + 1] || undefined,
+        });
+      }
+    }
+    const style = nodeStyle(label);
+    if (style) {
+      node.style = style;
+    }
+    return node;
+  });
+
+  const edges = edgeColumns.source.map((source, i) => {
+    const label = EDGE_LABELS[edgeColumns.label[i]];
+    const flags = edgeColumns.flags[i];
+    const edge = { id: `e${i}`, source: String(source), target: String(edgeColumns.target[i]), type: 'smoothstep' };
+    if (label) {
+      edge.label = label;
+      edge.style = edgeStyle(label);
+    }
+    if (flags & EDGE_HIDDEN) {
+      edge.hidden = true;
+    }
+    if (flags & EDGE_ANIMATED) {
+      edge.animated = true;
+    }
+    return edge;
+  });
+  return { nodes, edges };
+}
+
+// Lean findings (`?findings=lean`) name their rule in the catalog served by
+// /api/v1/rules; this fills in the title, severity and rendered text.
+export function expandFindings(vulnerabilities, catalog) {
+  const rules = new Map(catalog.rules.map((rule) => [rule.id, rule]));
+  return vulnerabilities.map((v) => {
+    const rule = rules.get(v.rule);
+    if (!rule || v.description !== undefined) {
+      return v;
+    }
+    const text = (v.variant && rule.variants && rule.variants[v.variant]) || rule;
+    const values = { line: v.line, ...(v.params || {}) };
+    return {
+      ...v,
+      type: rule.title,
+      severity: rule.severity,
+      description: text.message.replace(/\{(\w+)\}/g, (m, name) => (name in values ? String(values[name]) : m)),
+      recommendation: text.recommendation,
+    };
+  });
+}
+
+// Decodes the CFG of a compact /analyze result and marks vulnerable nodes the
+// way the full format does (data.vulnerable/severity/vulnerabilities, border).
+// Lean findings are expanded first when the rule catalog is given.
+export function decodeCompactAnalysis(result, catalog) {
+  const found = catalog ? expandFindings(result.vulnerabilities || [], catalog) : result.vulnerabilities || [];
+  const vulnerabilities = found.map((v) => ({
+    ...v,
+    nodeId: v.nodeId === null || v.nodeId === undefined ? null : String(v.nodeId),
+  }));
+  if (!isCompactCfg(result.cfg)) {
+    return { ...result, vulnerabilities };
+  }
+  const cfg = decodeCompactCfg(result.cfg);
+  const byNode = new Map();
+  vulnerabilities.forEach((v) => {
+    if (v.nodeId !== null) {
+      if (!byNode.has(v.nodeId)) {
+        byNode.set(v.nodeId, []);
+      }
+      byNode.get(v.nodeId).push(v);
+    }
+  });
+  cfg.nodes.forEach((node) => {
+    const found = byNode.get(node.id);
+    if (!found) {
+      return;
+    }
+    const severity = found.reduce(
+      (best, v) => ((SEVERITY_RANK[v.severity] ?? -1) > (SEVERITY_RANK[best] ?? -1) ? v.severity : best),
+      found[0].severity,
+    );
+    const color = SEVERITY_COLORS[severity] || '#999';
+    node.data = { ...node.data, vulnerable: true, severity, vulnerabilities: found };
+    if (node.data.statements) {
+      node.data.vulnerableStatements = statementsAt(node.data.statements, found.map((v) => v.line));
+    }
+    node.style = { ...(node.style || {}), border: `3px solid ${color}`, boxShadow: `0 0 10px ${color}` };
+  });
+  return { ...result, vulnerabilities, cfg };
+}